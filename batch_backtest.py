@@ -0,0 +1,20 @@
+import sys
+import time
+
+from binance_trade_bot.config import Config
+from binance_trade_bot.batch_backtest import run_batch
+
+
+def batch_backtest():
+    start = time.time()
+    config = Config()
+    # python batch_backtest.py FTM OMG ETH, or BATCH_TARGET_SYMBOLS config.
+    per_symbol, aggregate = run_batch(sys.argv[1:] or config.BATCH_TARGET_SYMBOLS)
+    per_symbol.to_csv(config.BACKTEST_BATCH_REPORT_PATH)
+    print(per_symbol.to_string())
+    print(aggregate.to_string())
+    print("Batch time: %s сек." % (time.time() - start))
+
+
+if __name__ == "__main__":
+    batch_backtest()
@@ -0,0 +1,30 @@
+import json
+import sys
+import time
+
+from binance_trade_bot.benchmark import benchmark_table, compare_benchmarks, run_benchmark
+from binance_trade_bot.config import Config
+
+
+def benchmark(previous_path: str = None):
+    start = time.time()
+    config = Config()
+    previous = None
+    if previous_path is not None:
+        # Read it before run, new result can be saved to the same file.
+        with open(previous_path) as f:
+            previous = json.load(f)
+
+    result = run_benchmark()
+    with open(config.BENCHMARK_REPORT_PATH.format(commit=result["commit"] or "unknown"), "w") as f:
+        json.dump(result, f, indent=2)
+    print(benchmark_table(result).to_string())
+
+    if previous is not None:
+        print("Compared with commit %s:" % previous["commit"])
+        print(compare_benchmarks(previous, result).to_string())
+    print("Benchmark time: %s сек." % (time.time() - start))
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else None)
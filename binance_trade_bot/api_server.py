@@ -1,8 +1,36 @@
-from flask import Flask
+from flask import Flask, jsonify
 from flask_socketio import SocketIO
 
+from .control_channel import TASK_NAMES, push_task
+from db.connections import RedisConnection
+
 app = Flask(__name__)
 sock = SocketIO(app)
+db = RedisConnection()
+
+
+def send_task(task_name: str) -> dict:
+    """
+    Hand task to the bot through its control channel.
+    :param task_name: one of TASK_NAMES, in any case.
+    :return: dict with task name and id, or with error.
+    """
+    task_name = task_name.upper()
+    if task_name not in TASK_NAMES:
+        return {"error": f"Unknown task {task_name}. Use one of {', '.join(TASK_NAMES)}."}
+    return {"task": task_name, "id": push_task(db, task_name)}
+
+
+@app.route("/tasks/<task_name>", methods=["POST"])
+def create_task(task_name: str):
+    response = send_task(task_name)
+    return jsonify(response), 400 if "error" in response else 202
+
+
+@sock.on("task")
+def task_event(task_name: str) -> dict:
+    # Socket.IO clients get the same dict as acknowledgement.
+    return send_task(task_name)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,13 @@
-import csv
 from decimal import Decimal
+import json
 import os
+import numpy as np
 import pandas as pd
 import typing as t
 
 from .binance_api_manager import BinanceAPIManager
+from .clock import SimulatedClock
+from .candle_cache import candle_cache_path, candle_to_kline, load_candles
 from .trader import GlobalStrategy
 from .config import Config
 from .logger import Logger
@@ -15,7 +18,15 @@ class MockAPIManager(BinanceAPIManager):
     Imitate binance api response for backtests of spot trading.
     """
     def __init__(self, config: Config, logger: Logger, global_strategy: GlobalStrategy, history_period: int = 6):
-        super().__init__(config, logger)
+        if config.BACKTEST_OFFLINE:
+            # Offline backtest works only with local data and never creates binance client.
+            self.config = config
+            self.logger = logger
+            self.binance_client = None
+        else:
+            super().__init__(config, logger)
+        # Trader sleeps don't take real time in backtest.
+        self.clock = SimulatedClock()
         # How old would be data.
         self.global_strategy = global_strategy
         self.HISTORY_MONTH_PERIOD = history_period
@@ -29,12 +40,21 @@ class MockAPIManager(BinanceAPIManager):
         self.period_candle_data_path = self.config.BACKTEST_PERIOD_CANDLE_DATA_PATH.format(
             target_symbol=self.global_strategy.target_coin, bridge_symbol=self.global_strategy.bridge_coin
                                                                                            )
+        self.symbol_info_path = self.config.BACKTEST_SYMBOL_INFO_PATH.format(
+            target_symbol=self.global_strategy.target_coin, bridge_symbol=self.global_strategy.bridge_coin
+                                                                             )
+        if not os.path.exists(self.symbol_info_path):
+            self._check_online(self.symbol_info_path)
         self.historical_hour_candles = self._get_historical_interval_candles_fo_period(
             self.global_strategy.target_coin + self.global_strategy.bridge_coin
                                                                                        )
         self.historical_minute_candles = self._get_historical_minute_candles_fo_half_year(
             self.global_strategy.target_coin + self.global_strategy.bridge_coin
                                                                                        )
+        self.minute_candle_time = self.historical_minute_candles["time"]
+        self.minute_candle_open = self.historical_minute_candles["open"]
+        self.minute_candle_index = 0
+        self.period_candle_index = 0
         self.current_price = 0
         self.init_done = False
 
@@ -60,17 +80,46 @@ class MockAPIManager(BinanceAPIManager):
         :param symbol: pair symbol. For example: 'BTCUSDT'.
         :return: generator with list of candle data.
         """
-        kline = next(self.historical_hour_candles)
+        if self.period_candle_index >= len(self.historical_hour_candles):
+            raise StopIteration
+        kline = candle_to_kline(self.historical_hour_candles[self.period_candle_index])
+        self.period_candle_index += 1
 
         return kline
 
     def get_server_time(self):
         """
-        Make request to the binance server and get it time.
-        :return:
+        Imitate binance server time: the end of local minute candle data.
+        :return: dict {"serverTime": unix time in ms}.
+        """
+        if len(self.minute_candle_time) == 0:
+            return {"serverTime": 0}
+        return {"serverTime": int(self.minute_candle_time[-1]) + 60000}
+
+    def get_symbol_info(self, symbol: str) -> dict:
+        """
+        Return symbol info from local .json file. Request it from binance and save, if file doesn't exist.
+        :param symbol:  target + bridge assets.
+        :return: dict.
+        """
+        if not os.path.exists(self.symbol_info_path):
+            self._check_online(self.symbol_info_path)
+            symbol_info = super().get_symbol_info(symbol)
+            with open(self.symbol_info_path, "w") as f:
+                json.dump(symbol_info, f)
+            return symbol_info
+
+        with open(self.symbol_info_path) as f:
+            return json.load(f)
+
+    def _check_online(self, path: str):
+        """
+        Fail fast in offline backtest, if local data is missing.
+        :param path: path of the missing data file.
         """
-        time = self.binance_client.get_server_time()
-        return time
+        if self.config.BACKTEST_OFFLINE:
+            raise FileNotFoundError(f"Offline backtest needs local data, but {path} doesn't exist. "
+                                    f"Run backtest online once to download it.")
 
     def get_last_minute_candle(self):
         """
@@ -79,11 +128,14 @@ class MockAPIManager(BinanceAPIManager):
         :return:
         """
         if self.init_done is False:
-            for _ in range(self.config.SMA_PERIOD*60):
-                next(self.historical_minute_candles)
+            self.minute_candle_index = self.config.SMA_PERIOD * 60
             self.init_done = True
-        raw_candle = next(self.historical_minute_candles)
-        candle = {"kline_start_time": raw_candle[0], "open_price": raw_candle[1]}
+        if self.minute_candle_index >= len(self.minute_candle_time):
+            raise StopIteration
+        candle = {"kline_start_time": int(self.minute_candle_time[self.minute_candle_index]),
+                  "open_price": repr(float(self.minute_candle_open[self.minute_candle_index]))}
+        self.minute_candle_index += 1
+        self.clock.set_time(candle["kline_start_time"] / 1000)
         self.current_price = Decimal(candle["open_price"])
         self._update_balance()
         return candle
@@ -99,13 +151,14 @@ class MockAPIManager(BinanceAPIManager):
         klines_list = (self.get_last_candle(symbol, interval) for _ in range(period))
         return klines_list
 
-    def _get_historical_minute_candles_fo_half_year(self, symbol: str) -> t.Generator:
+    def _get_historical_minute_candles_fo_half_year(self, symbol: str) -> np.ndarray:
         """
         Get minute trade candles for specified month period and save in in .csv file, ig it doesn't exist.
         :param symbol: target + bridge symbols.
-        :return: Candles generator.
+        :return: Memory-mapped candles array.
         """
-        if not os.path.exists(self.minute_candle_data_path):
+        if not os.path.exists(self.minute_candle_data_path) and not os.path.exists(candle_cache_path(self.minute_candle_data_path)):
+            self._check_online(self.minute_candle_data_path)
             klines_generator = self.binance_client.get_historical_klines_generator(symbol,
                                                                         self.binance_client.KLINE_INTERVAL_1MINUTE,
                                                                         f"{self.HISTORY_MONTH_PERIOD} month ago UTC")
@@ -113,20 +166,17 @@ class MockAPIManager(BinanceAPIManager):
             kline_df = pd.DataFrame([candle for candle in klines_generator])
             kline_df.to_csv(self.minute_candle_data_path, header=False, index=False)
 
-        with open(self.minute_candle_data_path) as f:
-            csv_reader = csv.reader(f, delimiter=",")
-            for candle in csv_reader:
-                candle[0] = int(candle[0])
-                yield candle
+        return load_candles(self.minute_candle_data_path)
 
-    def _get_historical_interval_candles_fo_period(self, symbol: str) -> t.Generator:
+    def _get_historical_interval_candles_fo_period(self, symbol: str) -> np.ndarray:
         """
         Get specified time interval trade candles for specified month period and
         save in in .csv file, ig it doesn't exist.
         :param symbol: target + bridge symbols.
-        :return: Candles generator.
+        :return: Memory-mapped candles array.
         """
-        if not os.path.exists(self.period_candle_data_path):
+        if not os.path.exists(self.period_candle_data_path) and not os.path.exists(candle_cache_path(self.period_candle_data_path)):
+            self._check_online(self.period_candle_data_path)
             klines_generator = self.binance_client.get_historical_klines_generator(symbol,
                                                                         self.config.KLINE_INTERVAL,
                                                                         f"{self.HISTORY_MONTH_PERIOD} month ago UTC")
@@ -134,19 +184,17 @@ class MockAPIManager(BinanceAPIManager):
             kline_df = pd.DataFrame([candle for candle in klines_generator])
             kline_df.to_csv(self.period_candle_data_path, header=False, index=False)
 
-        with open(self.period_candle_data_path) as f:
-            csv_reader = csv.reader(f, delimiter=",")
-            for candle in csv_reader:
-                candle[0] = int(candle[0])
-                yield candle
+        return load_candles(self.period_candle_data_path)
 
-    def buy(self, symbol: str, quantity: Decimal, lot_size: Decimal, margin: bool = False) -> dict:
+    def buy(self, symbol: str, quantity: Decimal, lot_size: Decimal, margin: bool = False,
+            client_order_id: t.Optional[str] = None) -> dict:
         """
         Imitate buying coin.
         :param symbol: target_coin+bridge_coin.
         :param quantity: amount of buying coin.
         :param lot_size: minimum of quantity.
         :param margin: is margin trade, or not.
+        :param client_order_id: not used in backtest.
         :return: imitation dict of order.
         """
         extra = quantity % lot_size
@@ -168,13 +216,15 @@ class MockAPIManager(BinanceAPIManager):
 
         return order
 
-    def sell(self, symbol: str, quantity: Decimal, lot_size: Decimal, margin: bool = False) -> dict:
+    def sell(self, symbol: str, quantity: Decimal, lot_size: Decimal, margin: bool = False,
+             client_order_id: t.Optional[str] = None) -> dict:
         """
         Imitate selling coin.
         :param symbol: target_coin+bridge_coin.
         :param quantity: amount of selling coin.
         :param lot_size: minimum of quantity.
         :param margin: is margin trade, or not.
+        :param client_order_id: not used in backtest.
         :return: imitation dict of order.
         """
         extra = quantity % lot_size
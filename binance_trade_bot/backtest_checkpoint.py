@@ -0,0 +1,81 @@
+import os
+import pickle
+import typing as t
+
+from .backtest import MockAPIManager
+from .config import Config
+from .trader import Trader, generate_strategy
+
+
+# Indicators are saved with pipeline and registry, balance ledger with portfolio in one pickle, so they stay shared
+# after restore.
+TRADER_STATE_FIELDS = ("portfolio", "minute_candle_price", "past_minute_candle_price", "period_candle_price",
+                       "indicators", "period_pipeline", "period_average", "period_max", "period_min",
+                       "period_candle_price_updated", "moving_average", "max_period_price", "min_period_price",
+                       "lot_size", "min_notional", "current_strategy", "current_time", "minute_candle_ticks",
+                       "past_minute_candle_ticks", "period_candle_aggregator",
+                       "balance_ledger")
+MOCK_STATE_FIELDS = ("minute_candle_index", "period_candle_index", "init_done", "current_price",
+                     "BACKTEST_BRIDGE_BALANCE", "BACKTEST_TARGET_BALANCE", "BACKTEST_PORTFOLIO_PRICE",
+                     "CREDIT_BALANCE")
+
+
+def checkpoint_fingerprint(config: Config, mock_manager: MockAPIManager) -> tuple:
+    """
+    Values that must be the same for backtest which writes checkpoint and backtest which resumes from it.
+    """
+    minute_candles = mock_manager.historical_minute_candles
+    period_candles = mock_manager.historical_hour_candles
+    return (config.MARKET_PLACE, mock_manager.global_strategy.bid_symbol, config.SMA_PERIOD, config.SPOT_STOP_LOSS,
+            config.MARGIN_STOP_LOSS, config.WORKING_BALANCE, config.MIN_PORTFOLIO_PRICE, config.FIXED_POINT,
+            config.BACKTEST_ENGINE,
+            int(minute_candles["time"][0]) if len(minute_candles) else None,
+            int(period_candles["time"][0]) if len(period_candles) else None)
+
+
+def trader_state(trader: Trader, mock_manager: MockAPIManager) -> dict:
+    """
+    Collect trader and mock manager state. Strategy generator isn't saved, it is restored from current strategy.
+    """
+    return {"trader": {field: getattr(trader, field) for field in TRADER_STATE_FIELDS},
+            "mock_manager": {field: getattr(mock_manager, field) for field in MOCK_STATE_FIELDS
+                             if hasattr(mock_manager, field)},
+            "clock": (mock_manager.clock.current_time, mock_manager.clock.slept)}
+
+
+def restore_trader_state(trader: Trader, mock_manager: MockAPIManager, state: dict):
+    """
+    Put saved state back into trader and mock manager.
+    """
+    for field, value in state["trader"].items():
+        setattr(trader, field, value)
+    for field, value in state["mock_manager"].items():
+        setattr(mock_manager, field, value)
+    mock_manager.clock.current_time, mock_manager.clock.slept = state["clock"]
+
+    # Generator is on the first strategy after reboot, or right after the current strategy.
+    trader.strategy_generator = generate_strategy(trader.config.STRATEGY_DICT)
+    if trader.current_strategy in trader.config.STRATEGY_DICT:
+        while next(trader.strategy_generator) != trader.current_strategy:
+            pass
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    """
+    Write checkpoint atomically, so crash while saving doesn't break the previous one.
+    """
+    # Sweep and batch workers can share checkpoint folder, so tmp file is of this process.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str) -> t.Optional[dict]:
+    """
+    Read checkpoint if it exists.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,203 @@
+from dataclasses import dataclass, field
+from decimal import Decimal
+import os
+import numpy as np
+import pandas as pd
+import typing as t
+
+
+REPORT_COLUMNS = ("date", "symbol", "minute_price", "period_max_price", "period_min_price", "moving_average",
+                  "target_price", "target_amount", "stop_loss", "side", "executedQty", "origQty", "price", "qty",
+                  "status", "order_price", "bridge_coin", "target_coin", "portfolio_balance")
+INDICATOR_COLUMNS = ("period_max_price", "period_min_price", "moving_average")
+
+
+@dataclass(frozen=True, eq=True)
+class BacktestTrade:
+    candle_index: int
+    kline_start_time: int
+    side: str
+    price: Decimal
+    quantity: Decimal
+
+
+@dataclass
+class BacktestResult:
+    bridge_balance: Decimal
+    target_balance: Decimal
+    portfolio_price: Decimal
+    total_profit: Decimal
+    candles: int
+    trades: t.List[BacktestTrade] = field(default_factory=list)
+    stop_reason: str = "END_OF_DATA"
+    # The biggest fall of portfolio price from its previous peak, part of the peak price.
+    max_drawdown: float = 0.0
+
+
+def max_drawdown(portfolio_prices: np.ndarray) -> float:
+    """
+    Calculate max drawdown of portfolio price series.
+    :param portfolio_prices: portfolio price for every candle.
+    :return: the biggest fall from previous peak as a part of the peak price.
+    """
+    if len(portfolio_prices) == 0:
+        return 0.0
+    peaks = np.maximum.accumulate(portfolio_prices)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdowns = np.where(peaks > 0, (peaks - portfolio_prices) / peaks, 0.0)
+    return float(drawdowns.max())
+
+
+class BacktestReportWriter:
+    """
+    Report sink for backtests. Collect rows in preallocated column buffers and write them to the file by chunks,
+    so memory is bounded by chunk size for any backtest length.
+    """
+    def __init__(self, path: str, columns: t.Sequence[str] = REPORT_COLUMNS, chunk_size: int = 10000,
+                 file_format: str = "csv", only_changes: bool = False):
+        """
+        :param path: report file path. For parquet format extension is replaced with .parquet.
+        :param columns: report columns. Rows are dicts with this keys.
+        :param chunk_size: how many rows are kept in memory before flush.
+        :param file_format: csv or parquet.
+        :param only_changes: record only rows with an order or changed period indicators.
+        """
+        self.columns = tuple(columns)
+        self.chunk_size = chunk_size
+        self.file_format = file_format
+        self.only_changes = only_changes
+        if self.file_format == "parquet":
+            self.path = os.path.splitext(path)[0] + ".parquet"
+        else:
+            self.path = path
+        self.buffers: t.Dict[str, list] = {column: [None] * self.chunk_size for column in self.columns}
+        self.size = 0
+        self.rows_written = 0
+        self.rows_skipped = 0
+        self._last_indicators: t.Optional[tuple] = None
+        self._parquet_writer = None
+        # Report of a new backtest replaces the old file, resumed report is continued.
+        self._resumed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _is_changed(self, row: dict) -> bool:
+        """
+        Check that row has an order or period indicators are changed since the last added row.
+        """
+        indicators = tuple(row.get(column) for column in INDICATOR_COLUMNS)
+        changed = indicators != self._last_indicators
+        self._last_indicators = indicators
+        return changed or row.get("side", "-") != "-"
+
+    def add_row(self, row: dict):
+        """
+        Put row values into column buffers. Flush buffers if they are full.
+        :param row: dict {column: value}. Missing columns are saved as empty values.
+        """
+        if self.only_changes and not self._is_changed(row):
+            self.rows_skipped += 1
+            return
+        for column in self.columns:
+            self.buffers[column][self.size] = row.get(column)
+        self.size += 1
+        if self.size == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write buffered rows to the report file.
+        """
+        if self.size == 0:
+            return
+        report_df = pd.DataFrame({column: self.buffers[column][:self.size] for column in self.columns},
+                                 index=range(self.rows_written, self.rows_written + self.size))
+        if self.file_format == "parquet":
+            self._write_parquet(report_df)
+        else:
+            with open(self.path, "a" if self.rows_written or self._resumed else "w") as f:
+                report_df.to_csv(f, header=f.tell() == 0)
+        self.rows_written += self.size
+        self.size = 0
+
+    def _write_parquet(self, report_df: pd.DataFrame):
+        """
+        Write chunk as a parquet row group. Values are saved as strings to keep Decimal precision.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(report_df.astype(str), preserve_index=False)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+        self._parquet_writer.write_table(table)
+
+    def _restore_parquet(self, rows: int):
+        """
+        Copy the first rows of the previous parquet file to the new one by row groups. Report isn't resumed, if
+        previous file can't be read, for example after crash it has no footer.
+        :param rows: number of rows written before checkpoint.
+        """
+        import pyarrow.parquet as pq
+
+        try:
+            saved_rows = pq.ParquetFile(self.path).metadata.num_rows
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Parquet report {self.path} can't be resumed, previous file can't be read ({e}). "
+                             f"Remove the checkpoint to run backtest from the start or use csv report format.") from e
+        if saved_rows < rows:
+            raise ValueError(f"Parquet report {self.path} has {saved_rows} rows, checkpoint needs {rows}. Remove the "
+                             f"checkpoint to run backtest from the start.")
+
+        previous_path = self.path + ".previous"
+        os.replace(self.path, previous_path)
+        copied = 0
+        with pq.ParquetFile(previous_path) as previous_file:
+            for index in range(previous_file.num_row_groups):
+                if copied == rows:
+                    break
+                table = previous_file.read_row_group(index).slice(0, rows - copied)
+                if self._parquet_writer is None:
+                    self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+                self._parquet_writer.write_table(table)
+                copied += table.num_rows
+        os.remove(previous_path)
+
+    def state(self) -> dict:
+        """
+        Flush buffered rows and return report position for backtest checkpoint.
+        """
+        self.flush()
+        offset = 0
+        if self.file_format == "csv" and os.path.exists(self.path):
+            offset = os.path.getsize(self.path)
+        return {"rows_written": self.rows_written, "rows_skipped": self.rows_skipped,
+                "last_indicators": self._last_indicators, "offset": offset}
+
+    def restore(self, state: dict):
+        """
+        Continue report from checkpoint position. Rows written after checkpoint are cut from .csv file.
+        Parquet file can't be continued, so rows before checkpoint are copied to the new file.
+        """
+        if self.file_format == "csv" and os.path.exists(self.path) and os.path.getsize(self.path) > state["offset"]:
+            with open(self.path, "r+") as f:
+                f.truncate(state["offset"])
+        if self.file_format == "parquet" and state["rows_written"] > 0:
+            self._restore_parquet(state["rows_written"])
+        self._resumed = True
+        self.rows_written = state["rows_written"]
+        self.rows_skipped = state["rows_skipped"]
+        self._last_indicators = state["last_indicators"]
+
+    def close(self):
+        """
+        Flush the rest of rows and close the report file.
+        """
+        self.flush()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
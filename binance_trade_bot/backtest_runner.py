@@ -0,0 +1,170 @@
+from datetime import datetime
+from decimal import Decimal
+import typing as t
+
+from .backtest import MockAPIManager, MockMarginAPIManager
+from .backtest_checkpoint import (checkpoint_fingerprint, load_checkpoint, restore_trader_state, save_checkpoint,
+                                  trader_state)
+from .backtest_report import BacktestReportWriter, BacktestResult, BacktestTrade
+from .config import Config
+from .exchange_info import get_lot_size, get_min_notional
+from .logger import Logger
+from .strategy.margin_strategy import MarginTrader
+from .strategy.spot_strategy import SpotTrader
+from .trader import GlobalStrategy
+from .vectorized_backtest import VectorizedSpotBacktest
+
+
+STRATEGY_FOR_BACKTEST = {
+    "SPOT": (MockAPIManager, SpotTrader),
+    "MARGIN": (MockMarginAPIManager, MarginTrader)
+}
+
+
+def get_backtest_strategy(config: Config) -> GlobalStrategy:
+    """
+    Take target and bridge coins of config market place.
+    :param config: Config instance.
+    :return: GlobalStrategy for backtest.
+    """
+    if config.MARKET_PLACE == "SPOT":
+        return GlobalStrategy(bridge_coin=config.BRIDGE_SPOT_SYMBOL, target_coin=config.TARGET_SPOT_SYMBOL)
+    return GlobalStrategy(bridge_coin=config.BRIDGE_MARGIN_SYMBOL, target_coin=config.TARGET_MARGIN_SYMBOL)
+
+
+def run_event_backtest(config: Config, logger: Logger, global_strategy: t.Optional[GlobalStrategy] = None,
+                       report_writer: t.Optional[BacktestReportWriter] = None,
+                       checkpoint_path: t.Optional[str] = None, resume: bool = False,
+                       strategy: t.Optional[t.Tuple[type, type]] = None) -> BacktestResult:
+    """
+    Step through minute candles with mock API manager and trader of config market place.
+    :param config: Config instance.
+    :param logger: Logger instance.
+    :param global_strategy: coins for backtest. Taken from config if None.
+    :param report_writer: sink for per-minute report rows. Report isn't saved if None.
+    :param checkpoint_path: file for checkpoints, saved every BACKTEST_CHECKPOINT_INTERVAL candles.
+                            No checkpoints if None.
+    :param resume: continue from checkpoint_path, if it was saved with the same config and data.
+    :param strategy: (mock manager class, trader class). Taken from STRATEGY_FOR_BACKTEST by market place if None.
+    :return: BacktestResult.
+    """
+    if global_strategy is None:
+        global_strategy = get_backtest_strategy(config)
+    manager, mock_trader = strategy or STRATEGY_FOR_BACKTEST[config.MARKET_PLACE]
+    mock_manager = manager(config, logger, global_strategy, history_period=config.HISTORY_PERIOD_FOR_BACKTEST)
+    trader = mock_trader(mock_manager, None, global_strategy, config, logger)
+    trader.initialization()
+
+    current_time = mock_manager.get_server_time()["serverTime"]
+    candle_time = 0
+    candles = 0
+    trades = []
+    stop_reason = "END_OF_DATA"
+    peak_price = 0.0
+    drawdown = 0.0
+
+    fingerprint = checkpoint_fingerprint(config, mock_manager)
+    checkpoint = load_checkpoint(checkpoint_path) if checkpoint_path and resume else None
+    if checkpoint is not None and checkpoint["fingerprint"] != fingerprint:
+        logger.warning("Checkpoint was saved for another config or data. Starting backtest from the beginning.")
+        checkpoint = None
+    if checkpoint is not None:
+        restore_trader_state(trader, mock_manager, checkpoint["state"])
+        candle_time, candles, trades, peak_price, drawdown = checkpoint["loop"]
+        if report_writer is not None and checkpoint["report"] is not None:
+            report_writer.restore(checkpoint["report"])
+        logger.info("Backtest resumed from candle %s." % candles)
+
+    try:
+        while candle_time < current_time:
+            data = mock_manager.get_last_minute_candle()
+            candle_time = data["kline_start_time"]
+
+            if report_writer is not None:
+                report_row = {
+                    "date": datetime.utcfromtimestamp(data["kline_start_time"] / 1000).strftime(config.TIME_FORMAT),
+                    "symbol": trader.global_strategy.bid_symbol,
+                    "minute_price": data["open_price"],
+                    "period_max_price": trader.max_period_price,
+                    "period_min_price": trader.min_period_price,
+                    "moving_average": trader.moving_average,
+                    "target_price": trader.portfolio.target_order[0],
+                    "target_amount": trader.portfolio.target_order[1],
+                    "stop_loss": trader.portfolio.stop_loss
+                }
+
+            trader.check_for_hour_kline_update(candle_time)
+            order = trader.use_strategy(data, candle_time)
+            if order is False:
+                stop_reason = "MIN_NOTIONAL"
+                break
+            candles += 1
+            if order["side"] != "-":
+                trades.append(BacktestTrade(candles - 1, candle_time, order["side"],
+                                            Decimal(order["fills"][0]["price"]), Decimal(order["executedQty"])))
+
+            portfolio_price = float(mock_manager.BACKTEST_PORTFOLIO_PRICE)
+            peak_price = max(peak_price, portfolio_price)
+            if peak_price > 0:
+                drawdown = max(drawdown, (peak_price - portfolio_price) / peak_price)
+
+            trader.make_report(order)
+            if report_writer is not None:
+                for key, value in order.items():
+                    if key == "fills":
+                        report_row.update(value[0])
+                    else:
+                        report_row[key] = value
+                report_row["bridge_coin"] = mock_manager.BACKTEST_BRIDGE_BALANCE
+                report_row["target_coin"] = mock_manager.BACKTEST_TARGET_BALANCE
+                report_row["portfolio_balance"] = mock_manager.BACKTEST_PORTFOLIO_PRICE
+                report_writer.add_row(report_row)
+
+            if checkpoint_path and config.BACKTEST_CHECKPOINT_INTERVAL and \
+                    candles % config.BACKTEST_CHECKPOINT_INTERVAL == 0:
+                save_checkpoint(checkpoint_path, {
+                    "fingerprint": fingerprint,
+                    "state": trader_state(trader, mock_manager),
+                    "loop": (candle_time, candles, trades, peak_price, drawdown),
+                    "report": report_writer.state() if report_writer is not None else None
+                })
+
+    except KeyboardInterrupt:
+        stop_reason = "INTERRUPTED"
+    except StopIteration:
+        pass
+    finally:
+        if report_writer is not None:
+            report_writer.close()
+
+    return BacktestResult(bridge_balance=mock_manager.BACKTEST_BRIDGE_BALANCE,
+                          target_balance=mock_manager.BACKTEST_TARGET_BALANCE,
+                          portfolio_price=mock_manager.BACKTEST_PORTFOLIO_PRICE,
+                          total_profit=trader.portfolio.total_profit,
+                          candles=candles,
+                          trades=trades,
+                          stop_reason=stop_reason,
+                          max_drawdown=drawdown)
+
+
+def run_vectorized_backtest(config: Config, logger: Logger, global_strategy: t.Optional[GlobalStrategy] = None,
+                            symbol_info: t.Optional[dict] = None) -> BacktestResult:
+    """
+    Run SPOT rules on whole candle arrays with VectorizedSpotBacktest.
+    :param config: Config instance.
+    :param logger: Logger instance.
+    :param global_strategy: coins for backtest. Taken from config if None.
+    :param symbol_info: binance symbol info with lot size and min notional filters. Requested if None.
+    :return: BacktestResult.
+    """
+    if global_strategy is None:
+        global_strategy = GlobalStrategy(bridge_coin=config.BRIDGE_SPOT_SYMBOL, target_coin=config.TARGET_SPOT_SYMBOL)
+    mock_manager = MockAPIManager(config, logger, global_strategy, history_period=config.HISTORY_PERIOD_FOR_BACKTEST)
+    if symbol_info is None:
+        symbol_info = mock_manager.get_symbol_info(global_strategy.bid_symbol)
+
+    engine = VectorizedSpotBacktest(config,
+                                    lot_size=get_lot_size(symbol_info),
+                                    min_notional=get_min_notional(symbol_info),
+                                    bridge_balance=mock_manager.BACKTEST_BRIDGE_BALANCE)
+    return engine.run(mock_manager.historical_minute_candles, mock_manager.historical_hour_candles)
@@ -0,0 +1,106 @@
+from decimal import Decimal
+import typing as t
+
+
+class BalanceLedger:
+    """
+    Local free balances of trader coins. They are changed by fills of our orders and by user data stream events,
+    full account is requested from REST only every reconcile_interval seconds, at start and after unclear orders.
+    """
+    def __init__(self, assets: t.Tuple[str, ...], reconcile_interval: float):
+        self.assets = assets
+        self.reconcile_interval = reconcile_interval
+        # {coin: {"free": Decimal}}, the same dict as check_balance returns.
+        self.balance: t.Dict[str, t.Dict[str, Decimal]] = {}
+        # Clock time of the last REST balance. None - ledger can't be trusted and needs REST.
+        self.reconcile_time: t.Optional[float] = None
+        # Unix time in ms of the last applied change. Older stream events are skipped.
+        self.update_time = 0
+        # Client order IDs of orders, which fills are already applied from order response.
+        self.applied_orders: t.Set[str] = set()
+
+    def needs_reconcile(self, now: float) -> bool:
+        """
+        :param now: clock time in seconds.
+        """
+        return self.reconcile_time is None or now - self.reconcile_time >= self.reconcile_interval
+
+    def reconcile(self, balance: t.Dict[str, t.Dict[str, Decimal]], now: float):
+        """
+        Replace local balances with balances from REST.
+        :param balance: check_balance result.
+        :param now: clock time in seconds.
+        """
+        self.balance = balance
+        self.reconcile_time = now
+        self.update_time = max(self.update_time, int(now * 1000))
+        self.applied_orders.clear()
+
+    def invalidate(self):
+        """
+        Take balances from REST on the next update.
+        """
+        self.reconcile_time = None
+
+    def _add(self, asset: str, amount: Decimal):
+        if asset in self.assets:
+            self.balance.setdefault(asset, {"free": Decimal(0)})["free"] += amount
+
+    def apply_order(self, order: dict, bridge_coin: str, target_coin: str):
+        """
+        Apply fills of order response. Not filled order invalidates ledger, we can't know what is left of it.
+        :param order: place_order response.
+        :param bridge_coin: quote asset of order symbol.
+        :param target_coin: base asset of order symbol.
+        """
+        if order["status"] != "FILLED":
+            self.invalidate()
+            return
+        quantity = Decimal(order["executedQty"])
+        if "cummulativeQuoteQty" in order:
+            quote_quantity = Decimal(order["cummulativeQuoteQty"])
+        else:
+            quote_quantity = sum((Decimal(fill["price"]) * Decimal(fill["qty"]) for fill in order["fills"]),
+                                 Decimal(0))
+        sign = 1 if order["side"] == "BUY" else -1
+        self._add(target_coin, sign * quantity)
+        self._add(bridge_coin, -sign * quote_quantity)
+        for fill in order["fills"]:
+            if "commission" in fill:
+                self._add(fill["commissionAsset"], -Decimal(fill["commission"]))
+
+        if "transactTime" in order:
+            self.update_time = max(self.update_time, int(order["transactTime"]))
+        if "clientOrderId" in order:
+            self.applied_orders.add(order["clientOrderId"])
+
+    def apply_account_position(self, event: dict):
+        """
+        Set balances from outboundAccountPosition event. It has full free balance of changed assets.
+        :param event: UnicornFy user data stream event.
+        """
+        if event["last_update_time"] < self.update_time:
+            return
+        self.update_time = event["last_update_time"]
+        for asset in event["balances"]:
+            if asset["asset"] in self.assets:
+                self.balance[asset["asset"]] = {"free": Decimal(asset["free"])}
+
+    def apply_execution_report(self, event: dict, bridge_coin: str, target_coin: str):
+        """
+        Apply trade of order, which wasn't placed by trader (manual order for example). Balance event of this trade
+        comes later and sets the same balances.
+        :param event: UnicornFy user data stream event.
+        :param bridge_coin: quote asset of trader symbol.
+        :param target_coin: base asset of trader symbol.
+        """
+        if (event["current_execution_type"] != "TRADE" or event["client_order_id"] in self.applied_orders or
+                event["transaction_time"] <= self.update_time):
+            return
+        self.update_time = event["transaction_time"]
+        quantity = Decimal(event["last_executed_quantity"])
+        sign = 1 if event["side"] == "BUY" else -1
+        self._add(target_coin, sign * quantity)
+        self._add(bridge_coin, -sign * quantity * Decimal(event["last_executed_price"]))
+        if event.get("commission_asset"):
+            self._add(event["commission_asset"], -Decimal(event["commission_amount"]))
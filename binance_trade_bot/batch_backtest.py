@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+import pandas as pd
+import typing as t
+
+from .backtest import MockAPIManager
+from .backtest_runner import run_event_backtest, run_vectorized_backtest
+from .config import Config
+from .logger import Logger
+from .trader import GlobalStrategy
+
+
+BATCH_MARKET_PLACES = ("SPOT", "MARGIN")
+
+# Worker process state, set by _init_worker once per process.
+_worker_logger: t.Optional[Logger] = None
+_worker_symbol_info: t.Dict[str, dict] = {}
+
+
+def _init_worker(symbol_info: t.Dict[str, dict]):
+    global _worker_logger, _worker_symbol_info
+    _worker_logger = Logger("batch_backtest", enable_notifications=False)
+    _worker_symbol_info = symbol_info
+
+
+def _case_strategy(config: Config, market_place: str, target_coin: str) -> GlobalStrategy:
+    if market_place == "SPOT":
+        return GlobalStrategy(bridge_coin=config.BRIDGE_SPOT_SYMBOL, target_coin=target_coin)
+    return GlobalStrategy(bridge_coin=config.BRIDGE_MARGIN_SYMBOL, target_coin=target_coin)
+
+
+def _run_case(case: t.Tuple[str, str]) -> dict:
+    """
+    Run backtest of one market place for one target coin. Bridge coin is taken from config.
+    """
+    market_place, target_coin = case
+    config = Config()
+    config.MARKET_PLACE = market_place
+    global_strategy = _case_strategy(config, market_place, target_coin)
+
+    if config.BACKTEST_ENGINE == "VECTORIZED" and market_place == "SPOT":
+        result = run_vectorized_backtest(config, _worker_logger, global_strategy,
+                                         symbol_info=_worker_symbol_info.get(global_strategy.bid_symbol))
+    else:
+        result = run_event_backtest(config, _worker_logger, global_strategy)
+
+    return {"symbol": global_strategy.bid_symbol,
+            "market_place": market_place,
+            "final_balance": float(result.portfolio_price),
+            "total_profit": float(result.total_profit),
+            "trades": len(result.trades),
+            "max_drawdown": result.max_drawdown,
+            "candles": result.candles,
+            "stop_reason": result.stop_reason}
+
+
+def run_batch(target_coins: t.Sequence[str], market_places: t.Sequence[str] = BATCH_MARKET_PLACES,
+              processes: t.Optional[int] = None) -> t.Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Run SPOT and MARGIN backtests for all target coins on the process pool, one process per core by default.
+    :param target_coins: list of target coins. For example: ['FTM', 'OMG'].
+    :param market_places: which traders to test for every coin.
+    :param processes: number of worker processes.
+    :return: tuple(per symbol results, aggregate results per market place).
+    """
+    cases = [(market_place, target_coin) for target_coin in target_coins for market_place in market_places]
+
+    # SPOT and MARGIN cases of a coin use the same files. Mock downloads data, converts .csv files to .npy cache and
+    # saves symbol info once here, before workers read them.
+    config = Config()
+    logger = Logger("batch_backtest", enable_notifications=False)
+    symbol_info = {}
+    for market_place, target_coin in cases:
+        global_strategy = _case_strategy(config, market_place, target_coin)
+        if global_strategy.bid_symbol not in symbol_info:
+            mock_manager = MockAPIManager(config, logger, global_strategy,
+                                          history_period=config.HISTORY_PERIOD_FOR_BACKTEST)
+            symbol_info[global_strategy.bid_symbol] = mock_manager.get_symbol_info(global_strategy.bid_symbol)
+
+    processes = max(1, min(processes or os.cpu_count(), len(cases)))
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(symbol_info,)) as pool:
+        rows = pool.map(_run_case, cases)
+
+    per_symbol = pd.DataFrame(rows)
+    aggregate = per_symbol.groupby("market_place").agg(symbols=("symbol", "count"),
+                                                       final_balance=("final_balance", "sum"),
+                                                       total_profit=("total_profit", "sum"),
+                                                       mean_profit=("total_profit", "mean"),
+                                                       trades=("trades", "sum"),
+                                                       max_drawdown=("max_drawdown", "max"))
+    return per_symbol, aggregate
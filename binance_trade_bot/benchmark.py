@@ -0,0 +1,285 @@
+from datetime import datetime
+from decimal import Decimal
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import time
+import pandas as pd
+import typing as t
+
+from .backtest import MockAPIManager, MockMarginAPIManager
+from .backtest_report import BacktestReportWriter
+from .backtest_runner import run_event_backtest
+from .candle_cache import load_candles
+from .config import Config
+from .logger import Logger
+from .strategy.margin_strategy import MarginTrader
+from .strategy.new_max_min_strategy import NewMinMaxMarginTrader
+from .strategy.spot_strategy import SpotTrader
+from .trader import GlobalStrategy
+
+
+BENCHMARK_DATA_DIR = "backtest_data/benchmark"
+# Stream dumps checked in to the repo root: kline_{symbol}_data.csv.
+BENCHMARK_KLINE_DUMP_PATH = "kline_{symbol}_data.csv"
+BENCHMARK_BRIDGE_COIN = "USDT"
+BENCHMARK_TARGET_COINS = ("FTM", "OMG")
+# name: (mock manager, trader, market place).
+BENCHMARK_TRADERS = {
+    "SPOT": (MockAPIManager, SpotTrader, "SPOT"),
+    "MARGIN": (MockMarginAPIManager, MarginTrader, "MARGIN"),
+    "NEW_MIN_MAX": (MockAPIManager, NewMinMaxMarginTrader, "SPOT"),
+}
+# Fixed strategy params, so results don't depend on user.cfg.
+BENCHMARK_PARAMETERS = {
+    "SMA_PERIOD": 7,
+    "SPOT_STOP_LOSS": Decimal("0.99"),
+    "MARGIN_STOP_LOSS": Decimal("1.01"),
+    "WORKING_BALANCE": Decimal("0.5"),
+    "MIN_PORTFOLIO_PRICE": Decimal(10),
+}
+# Filters in binance order: PRICE_FILTER, PERCENT_PRICE, LOT_SIZE, MIN_NOTIONAL.
+BENCHMARK_SYMBOL_FILTERS = {
+    "FTMUSDT": ("0.00010000", "1.00000000", "10.00000000"),
+    "OMGUSDT": ("0.00100000", "0.01000000", "10.00000000"),
+}
+BENCHMARK_PHASES = ("loading", "indicators", "decisions", "reporting")
+
+
+def kline_dump_to_history(dump_path: str, minute_path: str, period_path: str, interval: int = 3600000):
+    """
+    Make backtest candle files from stream dump. Stream sends the same minute kline many times,
+    the last message of every minute is taken. Period candles are made from minute candles.
+    :param dump_path: kline_{symbol}_data.csv.
+    :param minute_path: minute candles .csv for MockAPIManager.
+    :param period_path: period candles .csv for MockAPIManager.
+    :param interval: period candle interval in ms.
+    """
+    dump = pd.read_csv(dump_path, dtype=str)
+    dump["kline_start_time"] = dump["kline_start_time"].astype("int64")
+    minutes = dump.groupby("kline_start_time").last().reset_index().sort_values("kline_start_time")
+    columns = ["kline_start_time", "open_price", "high_price", "low_price", "close_price"]
+    minutes[columns].to_csv(minute_path, header=False, index=False)
+
+    minutes["period"] = minutes["kline_start_time"] // interval * interval
+    periods = minutes.groupby("period").agg(
+        open_price=("open_price", "first"),
+        high_price=("high_price", lambda prices: prices.iloc[prices.astype(float).argmax()]),
+        low_price=("low_price", lambda prices: prices.iloc[prices.astype(float).argmin()]),
+        close_price=("close_price", "last")
+    ).reset_index()
+    periods.to_csv(period_path, header=False, index=False)
+
+
+def benchmark_config() -> Config:
+    """
+    Config for offline backtests on benchmark data with fixed strategy params.
+    """
+    config = Config()
+    config.BACKTEST_OFFLINE = True
+    config.BACKTEST_CHECKPOINT_INTERVAL = 0
+    for name in ("BACKTEST_MINUTE_CANDLE_DATA_PATH", "BACKTEST_PERIOD_CANDLE_DATA_PATH", "BACKTEST_SYMBOL_INFO_PATH"):
+        setattr(config, name, os.path.join(BENCHMARK_DATA_DIR, os.path.basename(getattr(config, name))))
+    for name, value in BENCHMARK_PARAMETERS.items():
+        setattr(config, name, value)
+    return config
+
+
+def prepare_benchmark_data(config: Config):
+    """
+    Convert stream dumps to candle files, .npy cache and symbol info. Done once, so loading phase measures
+    the same work for every run.
+    """
+    os.makedirs(BENCHMARK_DATA_DIR, exist_ok=True)
+    for target_coin in BENCHMARK_TARGET_COINS:
+        symbol = target_coin + BENCHMARK_BRIDGE_COIN
+        paths = {"target_symbol": target_coin, "bridge_symbol": BENCHMARK_BRIDGE_COIN}
+        minute_path = config.BACKTEST_MINUTE_CANDLE_DATA_PATH.format(**paths)
+        period_path = config.BACKTEST_PERIOD_CANDLE_DATA_PATH.format(**paths)
+        dump_path = BENCHMARK_KLINE_DUMP_PATH.format(symbol=symbol)
+        if not os.path.exists(minute_path) or os.path.getmtime(minute_path) < os.path.getmtime(dump_path):
+            kline_dump_to_history(dump_path, minute_path, period_path, int(config.UNIX_TIME_INTERVAL))
+        load_candles(minute_path)
+        load_candles(period_path)
+
+        tick_size, step_size, min_notional = BENCHMARK_SYMBOL_FILTERS[symbol]
+        symbol_info = {"symbol": symbol,
+                       "filters": [{"filterType": "PRICE_FILTER", "tickSize": tick_size},
+                                   {"filterType": "PERCENT_PRICE"},
+                                   {"filterType": "LOT_SIZE", "stepSize": step_size},
+                                   {"filterType": "MIN_NOTIONAL", "minNotional": min_notional}]}
+        with open(config.BACKTEST_SYMBOL_INFO_PATH.format(**paths), "w") as f:
+            json.dump(symbol_info, f)
+
+
+def timed_strategy(manager: type, trader: type, phases: t.Dict[str, float]) -> t.Tuple[type, type]:
+    """
+    Subclasses of mock manager and trader which add time of their calls to phases.
+    Loading - candle data and initialization, indicators - period candle updates,
+    decisions - use_strategy without indicators and reports, reporting - trader reports.
+    """
+    class TimedManager(manager):
+        def __init__(self, *args, **kwargs):
+            start = time.perf_counter()
+            super().__init__(*args, **kwargs)
+            phases["loading"] += time.perf_counter() - start
+
+        def get_last_minute_candle(self):
+            start = time.perf_counter()
+            candle = super().get_last_minute_candle()
+            phases["loading"] += time.perf_counter() - start
+            return candle
+
+    class TimedTrader(trader):
+        def initialization(self):
+            start = time.perf_counter()
+            super().initialization()
+            phases["loading"] += time.perf_counter() - start
+
+        def check_for_hour_kline_update(self, unix_time: int):
+            start = time.perf_counter()
+            super().check_for_hour_kline_update(unix_time)
+            phases["indicators"] += time.perf_counter() - start
+
+        def use_strategy(self, data: dict, current_time: int):
+            start = time.perf_counter()
+            nested = phases["indicators"] + phases["reporting"]
+            order = super().use_strategy(data, current_time)
+            nested = phases["indicators"] + phases["reporting"] - nested
+            phases["decisions"] += time.perf_counter() - start - nested
+            return order
+
+        def make_report(self, order: dict, initial: bool = False):
+            start = time.perf_counter()
+            super().make_report(order, initial)
+            phases["reporting"] += time.perf_counter() - start
+
+    return TimedManager, TimedTrader
+
+
+class TimedReportWriter(BacktestReportWriter):
+    """
+    Report writer which adds time of rows buffering and writing to reporting phase. Flush is called
+    from add_row and close, so it isn't timed itself.
+    """
+    def __init__(self, path: str, phases: t.Dict[str, float], **kwargs):
+        super().__init__(path, **kwargs)
+        self.phases = phases
+
+    def add_row(self, row: dict):
+        start = time.perf_counter()
+        super().add_row(row)
+        self.phases["reporting"] += time.perf_counter() - start
+
+    def close(self):
+        start = time.perf_counter()
+        super().close()
+        self.phases["reporting"] += time.perf_counter() - start
+
+
+def _run_benchmark_case(case: t.Tuple[str, str, int]) -> dict:
+    """
+    Run one trader on one symbol repeat times and keep the fastest run. Works in its own process,
+    so peak RSS belongs only to this case.
+    """
+    # Interpreter, numpy and pandas are already imported. Their memory is the same for all cases, so only growth
+    # of peak RSS over it is reported.
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    name, target_coin, repeat = case
+    manager, trader, market_place = BENCHMARK_TRADERS[name]
+    config = benchmark_config()
+    config.MARKET_PLACE = market_place
+    logger = Logger("benchmark", enable_notifications=False)
+    global_strategy = GlobalStrategy(bridge_coin=BENCHMARK_BRIDGE_COIN, target_coin=target_coin)
+    report_path = os.path.join(BENCHMARK_DATA_DIR, f"{name}_{global_strategy.bid_symbol}_report.csv")
+
+    best = None
+    for _ in range(repeat):
+        if os.path.exists(report_path):
+            os.remove(report_path)
+        phases = dict.fromkeys(BENCHMARK_PHASES, 0.0)
+        report_writer = TimedReportWriter(report_path, phases, chunk_size=config.BACKTEST_REPORT_CHUNK_SIZE)
+        start = time.perf_counter()
+        result = run_event_backtest(config, logger, global_strategy, report_writer,
+                                    strategy=timed_strategy(manager, trader, phases))
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best[0]:
+            best = (seconds, phases, result)
+    os.remove(report_path)
+
+    seconds, phases, result = best
+    phases["other"] = max(0.0, seconds - sum(phases.values()))
+    return {"name": name,
+            "symbol": global_strategy.bid_symbol,
+            "candles": result.candles,
+            "trades": len(result.trades),
+            "stop_reason": result.stop_reason,
+            "portfolio_price": str(result.portfolio_price),
+            "seconds": seconds,
+            "candles_per_second": result.candles / seconds if seconds else 0.0,
+            # ru_maxrss is in kilobytes on Linux.
+            "peak_rss_growth_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024,
+            "phases": phases}
+
+
+def git_commit() -> t.Optional[str]:
+    """
+    Commit of the working tree, so results of different commits can be told apart.
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(repeat: int = 3) -> dict:
+    """
+    Run SPOT, MARGIN and NewMinMax backtests on checked-in data without network.
+    Every case runs in a new process one by one, so cases don't share memory or CPU.
+    :param repeat: runs of every case, the fastest one is saved.
+    :return: dict with environment info and case results.
+    """
+    config = benchmark_config()
+    prepare_benchmark_data(config)
+
+    cases = [(name, target_coin, repeat) for target_coin in BENCHMARK_TARGET_COINS for name in BENCHMARK_TRADERS]
+    with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        results = list(pool.imap(_run_benchmark_case, cases))
+
+    return {"commit": git_commit(),
+            "created": datetime.utcnow().strftime(config.TIME_FORMAT),
+            "python": platform.python_version(),
+            "fixed_point": config.FIXED_POINT,
+            "repeat": repeat,
+            "parameters": {name: str(value) for name, value in BENCHMARK_PARAMETERS.items()},
+            "results": results}
+
+
+def benchmark_table(benchmark: dict) -> pd.DataFrame:
+    """
+    Flat table of benchmark results with phase times as columns.
+    """
+    rows = []
+    for result in benchmark["results"]:
+        row = {key: value for key, value in result.items() if key != "phases"}
+        row.update(result["phases"])
+        rows.append(row)
+    return pd.DataFrame(rows).set_index(["name", "symbol"])
+
+
+def compare_benchmarks(previous: dict, current: dict) -> pd.DataFrame:
+    """
+    Throughput and memory change of current benchmark against previous one.
+    :return: DataFrame with candles/s and peak RSS growth of both runs and speedup.
+    """
+    columns = ["candles_per_second", "peak_rss_growth_mb"]
+    previous_table = benchmark_table(previous)
+    current_table = benchmark_table(current)
+    # Results before peak_rss_growth_mb have no comparable memory column.
+    table = current_table[columns].join(previous_table.reindex(columns=columns), rsuffix="_previous")
+    table["speedup"] = table["candles_per_second"] / table["candles_per_second_previous"]
+    return table
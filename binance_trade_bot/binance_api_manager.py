@@ -1,13 +1,23 @@
+import time
 import typing as t
 from decimal import Decimal
 from requests.exceptions import ReadTimeout
 
 from binance.client import Client
 from binance.enums import *
+from binance.exceptions import BinanceAPIException
 
+from .clock import Clock
+from .exchange_info import ExchangeInfoCache
+from .latency import latency_recorder
+from .order_executor import new_client_order_id
 from .logger import Logger
 
 
+# Binance error code of cancel request for order, which is already filled, canceled or never existed.
+UNKNOWN_ORDER_CODE = -2011
+
+
 class BinanceAPIManager:
     """
     Manager of binance API. Include all possible and useful for strategy requests.
@@ -16,6 +26,10 @@ class BinanceAPIManager:
         self.config = config
         self.logger = logger
         self.binance_client = Client(self.config.BINANCE_API_KEY, self.config.BINANCE_API_SECRET_KEY)
+        self.clock = Clock()
+        # Symbol info of all symbols from one exchangeInfo request, cached on disk.
+        self.exchange_info = ExchangeInfoCache(self.config.EXCHANGE_INFO_CACHE_PATH, self.config.EXCHANGE_INFO_TTL,
+                                               self.binance_client.get_exchange_info)
 
     def get_account(self):
         """
@@ -70,52 +84,93 @@ class BinanceAPIManager:
                                                                           f"{period + 1} {interval} ago UTC")
         return klines_list
 
+    def get_stream_klines(self, symbol: str, start_time: int, limit: int = 1000) -> t.List[list]:
+        """
+        Get klines of stream interval (KLINE_TIMEFRAME) from start time with one request.
+        :param symbol: target + bridge assets.
+        :param start_time: unix time in ms of the first kline.
+        :param limit: max number of klines, 1000 is binance limit.
+        :return: list of binance klines [open time, open, high, low, close, volume, close time, ...].
+        """
+        return self.binance_client.get_klines(symbol=symbol, interval=self.config.KLINE_TIMEFRAME.split("_")[-1],
+                                              startTime=start_time, limit=limit)
+
     def get_symbol_info(self, symbol: str) -> dict:
         """
         Return dict with list of dict wich has information about symbol include lot min size and min notional.
+        It's taken from exchange info cache, symbol which isn't there yet (new listing) is requested alone.
         :param symbol:  target + bridge assets.
         :return: dict.
         """
-        return_info = self.binance_client.get_symbol_info(symbol)
+        return_info = self.exchange_info.get_symbol_info(symbol)
+        if return_info is None:
+            return_info = self.binance_client.get_symbol_info(symbol)
         return return_info
 
     def place_order(self,
                     symbol: str,
                     side: str,
                     quantity: t.Union[float, Decimal],
-                    type: str = ORDER_TYPE_MARKET) -> t.Union[dict, None]:
+                    type: str = ORDER_TYPE_MARKET,
+                    client_order_id: t.Optional[str] = None) -> t.Union[dict, None]:
         """
         Create a new order on spot place. Market order by default. If something goes wrong, return None instead.
         :param symbol: target + bridge assets.
         :param side: SELL or BUY.
         :param quantity: amount of coins.
         :param type: type of order. Could be limit, market or another. Look into API docs for detail.
+        :param client_order_id: the same ID for all retries of one order.
         :return: dict or None.
         """
+        client_order_id = client_order_id or new_client_order_id()
+        started = time.time()
         try:
             order = self.binance_client.create_order(symbol=symbol,
                                                      side=side,
                                                      quantity=float(quantity),
-                                                     type=type)
-
+                                                     type=type,
+                                                     newClientOrderId=client_order_id)
+            latency_recorder.record_since(symbol, "order", started)
             return order
         except ReadTimeout:
             self.logger.warning("We have some timout exception here.")
-            return None
+            return self.find_order(symbol, client_order_id)
         except Exception as e:
             self.logger.warning("We have an unexpected error.")
             self.logger.warning(e)
             return None
 
+    def find_order(self, symbol: str, client_order_id: str, margin: bool = False) -> t.Union[dict, None]:
+        """
+        Find order by client order ID, after request timed out. Order could be placed even if response didn't come.
+        :param symbol: target + bridge assets.
+        :param client_order_id: client order ID of placed order.
+        :param margin: order on spot or margin market.
+        :return: order dict or None, if there is no such order.
+        """
+        try:
+            if margin:
+                order = self.binance_client.get_margin_order(symbol=symbol, origClientOrderId=client_order_id)
+            else:
+                order = self.binance_client.get_order(symbol=symbol, origClientOrderId=client_order_id)
+        except Exception as e:
+            self.logger.info("Order %s wasn't found." % client_order_id)
+            self.logger.info(e)
+            return None
+        self.logger.info("Order %s was placed before timeout." % client_order_id)
+        return order
+
     def cancel_order(self, symbol: str, order_id: str) -> t.Union[dict, None]:
         """
         Cancel created order if something went wrong.
         :param symbol: target + bridge assets.
         :param order_id: id of created order.
-        :return: dict or None.
+        :return: dict or None. Order, which exchange doesn't know anymore, is done, its dict has UNKNOWN status.
         """
         try:
             order = self.binance_client.cancel_order(symbol=symbol, orderId=order_id)
+        except BinanceAPIException as e:
+            return self._cancel_error(order_id, e)
         except Exception as e:
             self.logger.info("We got an exception while canceling order.")
             self.logger.info(e.__class__.__name__)
@@ -124,41 +179,53 @@ class BinanceAPIManager:
 
         return order
 
-    def buy(self, symbol: str, quantity: Decimal, lot_size: Decimal, margin: bool = False):
+    def _cancel_error(self, order_id: str, error: BinanceAPIException) -> t.Union[dict, None]:
+        if error.code == UNKNOWN_ORDER_CODE:
+            self.logger.info("Order %s is already filled or canceled." % order_id)
+            return {"orderId": order_id, "status": "UNKNOWN"}
+        self.logger.info("We got an exception while canceling order.")
+        self.logger.info(error)
+        return None
+
+    def buy(self, symbol: str, quantity: Decimal, lot_size: Decimal, margin: bool = False,
+            client_order_id: t.Optional[str] = None):
         """
         Round amount of coin and place buy order on spot or margin trade market.
         :param symbol: target + bridge assets.
         :param quantity: amount of buying coins.
         :param lot_size: minimum amount of coins for order.
         :param margin: place on spot or margin market. Default - on spot.
+        :param client_order_id: the same ID for all retries of one order.
         :return: Response dict.
         """
         extra = quantity % lot_size
         round_quantity = quantity - extra
         self.logger.debug("Here our normalize quantity to buy: %s" % round_quantity)
         if margin:
-            order = self.place_margin_order(symbol, SIDE_BUY, round_quantity)
+            order = self.place_margin_order(symbol, SIDE_BUY, round_quantity, client_order_id=client_order_id)
         else:
-            order = self.place_order(symbol, SIDE_BUY, round_quantity)
+            order = self.place_order(symbol, SIDE_BUY, round_quantity, client_order_id=client_order_id)
 
         return order
 
-    def sell(self, symbol: str, quantity: Decimal, lot_size: Decimal, margin: bool = False):
+    def sell(self, symbol: str, quantity: Decimal, lot_size: Decimal, margin: bool = False,
+             client_order_id: t.Optional[str] = None):
         """
         Round amount of coin and place sell order on spot or margin trade market.
         :param symbol: target + bridge assets.
         :param quantity: amount of selling coins.
         :param lot_size: minimum amount of coins for order.
         :param margin: place on spot or margin market. Default - on spot.
+        :param client_order_id: the same ID for all retries of one order.
         :return: Response dict.
         """
         extra = quantity % lot_size
         round_quantity = quantity - extra
         self.logger.debug("Here our normalize quantity to sell: %s" % round_quantity)
         if margin:
-            order = self.place_margin_order(symbol, SIDE_SELL, round_quantity)
+            order = self.place_margin_order(symbol, SIDE_SELL, round_quantity, client_order_id=client_order_id)
         else:
-            order = self.place_order(symbol, SIDE_SELL, round_quantity)
+            order = self.place_order(symbol, SIDE_SELL, round_quantity, client_order_id=client_order_id)
 
         return order
 
@@ -232,25 +299,30 @@ class BinanceAPIManager:
                            symbol: str,
                            side: str,
                            quantity: t.Union[float, Decimal],
-                           type: str = ORDER_TYPE_MARKET) -> t.Union[dict, None]:
+                           type: str = ORDER_TYPE_MARKET,
+                           client_order_id: t.Optional[str] = None) -> t.Union[dict, None]:
         """
         Create a new order on spot place. Market order by default. If something goes wrong, return None instead.
         :param symbol: target + bridge assets.
         :param side: SELL or BUY.
         :param quantity: amount of coins.
         :param type: type of order. Could be limit, market or another. Look into API docs for detail.
+        :param client_order_id: the same ID for all retries of one order.
         :return: dict or None.
         """
+        client_order_id = client_order_id or new_client_order_id()
+        started = time.time()
         try:
             order = self.binance_client.create_margin_order(symbol=symbol,
                                                             side=side,
                                                             quantity=float(quantity),
-                                                            type=type)
-
+                                                            type=type,
+                                                            newClientOrderId=client_order_id)
+            latency_recorder.record_since(symbol, "order", started)
             return order
         except ReadTimeout:
             self.logger.warning("We have some timout exception here.")
-            return None
+            return self.find_order(symbol, client_order_id, margin=True)
         except Exception as e:
             self.logger.warning("We have an unexpected error.")
             self.logger.info(e.__class__.__name__)
@@ -262,10 +334,12 @@ class BinanceAPIManager:
         Cancel created order if something went wrong.
         :param symbol: target + bridge assets.
         :param order_id: id of created order.
-        :return: dict or None.
+        :return: dict or None. Order, which exchange doesn't know anymore, is done, its dict has UNKNOWN status.
         """
         try:
             order = self.binance_client.cancel_margin_order(symbol=symbol, orderId=order_id)
+        except BinanceAPIException as e:
+            return self._cancel_error(order_id, e)
         except Exception as e:
             self.logger.info("We got an exception while canceling order.")
             self.logger.info(e.__class__.__name__)
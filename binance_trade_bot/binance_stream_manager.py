@@ -1,4 +1,7 @@
-from collections import defaultdict
+import asyncio
+from collections import defaultdict, deque
+import random
+import threading
 import time
 import typing as t
 
@@ -6,105 +9,291 @@ from unicorn_binance_websocket_api import BinanceWebSocketApiManager
 
 from .binance_api_manager import BinanceAPIManager
 from .logger import Logger
-from .trader import Trader
+from .order_executor import backoff_delay
+from .stream_queue import CoalescingQueue, rest_kline_to_stream_data
 from .config import Config
+from .control_channel import ControlChannel
+from .latency import latency_recorder
+from .trader_registry import TraderRegistry
 from db.connections import RedisConnection
 from db.models import Kline, Task
-from db.schema import KlineSchema, TaskSchema
+from db.schema import KlineSchema
 
 
 class BinanceConnectionManager:
     """
     Entity for initialization websocket stream session and management inside session.
     """
-    def __init__(self, api_manager: BinanceAPIManager, config: Config, logger: Logger, trader: t.Union[Trader, None],
-                 db: RedisConnection, spot_trader: Trader = None, margin_trader: Trader = None, both=False):
+    # Name of the latency hash in Redis.
+    latency_name = "main"
+
+    def __init__(self, api_manager: BinanceAPIManager, config: Config, logger: Logger, traders: TraderRegistry,
+                 db: RedisConnection):
         self.logger = logger
         self.config = config
         self.db = db
         self.manager = api_manager
-        self.both = both
-        if self.both:
-            self.spot_trader = spot_trader
-            self.margin_trader = margin_trader
-            self.trader = None
-        else:
-            self.trader = trader
+        self.traders = traders
+        self.bw_api_manager: t.Optional[BinanceWebSocketApiManager] = None
 
-        self._connect_to_stream()
+        # Event loop of the consumer. Websocket threads and order workers hand data to it thread-safely.
+        self.loop: t.Optional[asyncio.AbstractEventLoop] = None
+        self.stream_queue: t.Optional[CoalescingQueue] = None
+        self.stopped: t.Optional[asyncio.Event] = None
+        # Cleared while missed klines are backfilled, consumer holds new stream data until then.
+        self.backfill_done: t.Optional[asyncio.Event] = None
+        # Redis tasks, which were taken by control channel and wait for event loop. Lock guards them with the loop,
+        # so task isn't left in the queue of the loop, which has just ended.
+        self.pending_tasks: t.Deque[Task] = deque()
+        self.task_lock = threading.Lock()
+        self.last_receive_time = time.time()
+        # Start time of the next closed kline by symbol. Klines from it are backfilled after reconnect.
+        self.next_kline_time: t.Dict[str, int] = {}
 
+        # Number of the next reconnect try. It's reset when stream data comes.
         self.reconnected = 1
         self.in_work = True
 
-    def _stream_processor(self):
+        self.latency = latency_recorder
+        self.latency.enabled = self.config.LATENCY_TRACKING
+
+    def run(self):
         """
-        Get info from websocket connection and transfer it to trade algoritm.
-        :return:
+        Connect to stream and process its data in event loop until shutdown.
         """
-        counter = 0
+        asyncio.run(self._run())
+
+    async def _run(self):
+        with self.task_lock:
+            self.loop = asyncio.get_running_loop()
+            # Tasks, which came while loop wasn't running.
+            self.loop.call_soon(self._execute_pending_tasks)
+        self.stream_queue = CoalescingQueue(self.config.STREAM_QUEUE_SIZE, self.loop)
+        self.stopped = asyncio.Event()
+        self.backfill_done = asyncio.Event()
+        self.backfill_done.set()
+        self.traders.set_order_notify(self._order_finished)
+        self._connect_to_stream()
+        tasks = [asyncio.create_task(coroutine) for coroutine in [self._consume()] + self._background_tasks()]
         try:
-            spot_kline_last_time = 0
-            margin_kline_last_time = 0
-            while counter < 10000:
-                if self.bw_api_manager.is_manager_stopping():
-                    return
+            await self.stopped.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            with self.task_lock:
+                self.loop = None
+                if self.pending_tasks:
+                    self.logger.warning("%s tasks wait for event loop start." % len(self.pending_tasks))
+
+    def _receive_stream_data(self, stream_data: dict, stream_buffer_name=False):
+        """
+        Websocket manager callback. It's called in websocket thread, so data is only put to the loop queue.
+        """
+        if self.loop is not None:
+            # In sharded mode ingest process has already set it.
+            stream_data.setdefault("receive_time", time.time())
+            self.stream_queue.put(stream_data)
+
+    def _order_finished(self):
+        """
+        Order executor callback from worker thread: finish trades in the loop thread.
+        """
+        loop = self.loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self.traders.dispatch_orders)
+        except RuntimeError:
+            pass
 
-                stream_data = self.bw_api_manager.pop_stream_data_from_stream_buffer()
-
-                if stream_data is not False:
-                    counter = 0
-                    kline_data = stream_data.get("kline", None)
-                    if kline_data:
-                        if (kline_data["kline_start_time"] > spot_kline_last_time or
-                                kline_data["kline_start_time"] > margin_kline_last_time):
-                            if self.both:
-                                if (stream_data["symbol"] == self.spot_trader.global_strategy.bid_symbol and
-                                        kline_data["kline_start_time"] > spot_kline_last_time):
-                                    spot_kline_last_time = kline_data["kline_start_time"]
-                                    spot_response = self.spot_trader.use_strategy(kline_data, stream_data["event_time"])
-                                    if spot_response is False:
-                                        time.sleep(60 * 10)
-                                    self.spot_trader.make_report(spot_response)
-
-                                if (stream_data["symbol"] == self.margin_trader.global_strategy.bid_symbol and
-                                        kline_data["kline_start_time"] > margin_kline_last_time):
-                                    margin_kline_last_time = kline_data["kline_start_time"]
-                                    margin_response = self.margin_trader.use_strategy(kline_data,
-                                                                                      stream_data["event_time"])
-
-                                    if margin_response is False:
-                                        time.sleep(60 * 10)
-                                    self.margin_trader.make_report(margin_response)
-                            else:
-                                if stream_data["symbol"] == self.trader.global_strategy.bid_symbol:
-                                    spot_kline_last_time = margin_kline_last_time = kline_data["kline_start_time"]
-                                    response = self.trader.use_strategy(kline_data, stream_data["event_time"])
-                                    if response is False:
-                                        time.sleep(60 * 10)
-                                    self.trader.make_report(response)
-                            self.save_kline_data(stream_data)
-                if stream_data is False:
-                    counter += 0.01
-                    time.sleep(0.01)
-                self.check_for_tasks()
+    async def _consume(self):
+        """
+        Take stream data as soon as it comes and give it to traders.
+        """
+        while True:
+            stream_data = await self.stream_queue.get()
+            await self.backfill_done.wait()
+            self.last_receive_time = time.time()
+            self.reconnected = 1
+            try:
+                kline_data = stream_data.get("kline", None)
+                if kline_data and "receive_time" in stream_data:
+                    symbol = stream_data["symbol"]
+                    self.latency.record(symbol, "exchange_to_receive",
+                                        stream_data["receive_time"] - stream_data["event_time"] / 1000)
+                    self.latency.record(symbol, "queue_wait", self.last_receive_time - stream_data["receive_time"])
+                if kline_data and kline_data["is_closed"]:
+                    self.next_kline_time[stream_data["symbol"]] = int(kline_data["kline_close_time"]) + 1
+                if self.in_work:
+                    self.process_stream_data(stream_data)
+            except Exception as e:  # pylint: disable=broad-except
+                # Consumer keeps working, one bad message doesn't stop all traders.
+                self.logger.error("Couldn't process stream data.")
+                self.logger.error(e)
+
+    def _background_tasks(self) -> list:
+        """
+        :return: coroutines, which run in event loop with the consumer.
+        """
+        return [self._watch_tasks(), self._watch_stream(), self._report_queue_stats(), self._publish_latency()]
+
+    async def _report_queue_stats(self):
+        """
+        Log number of coalesced and dropped stream messages, if it changed.
+        """
+        reported = (0, 0)
+        while True:
+            await asyncio.sleep(60)
+            stats = (self.stream_queue.coalesced, self.stream_queue.dropped)
+            if stats != reported:
+                self.logger.info("Stream queue: %s messages coalesced, %s dropped, %s waiting." %
+                                 (stats[0], stats[1], len(self.stream_queue)))
+                reported = stats
+
+    async def _publish_latency(self):
+        """
+        Write latency histograms to Redis hash latency:{latency_name}:hash every LATENCY_PUBLISH_INTERVAL seconds.
+        """
+        while self.config.LATENCY_TRACKING:
+            await asyncio.sleep(self.config.LATENCY_PUBLISH_INTERVAL)
+            try:
+                self.latency.publish(self.db, self.latency_name)
+            except Exception as e:  # pylint: disable=broad-except
+                self.logger.warning("Couldn't publish latency.")
+                self.logger.warning(e)
+
+    async def _watch_tasks(self):
+        """
+        Take Redis tasks through control channel thread while event loop works.
+        """
+        channel = ControlChannel(self.db, self.logger, self._receive_task, self.config.TASK_CHECK_INTERVAL)
+        channel.start()
+        try:
+            await asyncio.Event().wait()
         finally:
-            if self.reconnected > 15:
-                time.sleep(60)
+            channel.stop()
+
+    async def _watch_stream(self):
+        """
+        Reconnect to stream, if there is no data for STREAM_IDLE_TIMEOUT seconds. Delay before reconnect grows
+        exponentially up to RECONNECT_MAX_DELAY, with random jitter, so many bots don't reconnect at once. Klines
+        missed while stream was down are backfilled after reconnect.
+        """
+        while True:
+            await asyncio.sleep(1)
+            if not self.in_work or time.time() - self.last_receive_time < self.config.STREAM_IDLE_TIMEOUT:
+                continue
+            if self.reconnected > self.config.RECONNECT_MAX_TRIES:
+                self.logger.info("Too many tries for reconnect, stopping.")
                 self.stop()
-            elif not self.in_work:
-                self.logger.info("stopping")
-                return
-            else:
-                self.logger.info("Too many tries for reconnect, Connection was closed. reconnecting.")
-                self.close()
-                time.sleep(60 * self.reconnected)
-                self._connect_to_stream()
-                self.reconnected += 1
-                self._stream_processor()
+                continue
+            delay = backoff_delay(self.reconnected, self.config.RECONNECT_BASE_DELAY,
+                                  self.config.RECONNECT_MAX_DELAY) * random.uniform(0.5, 1)
+            self.logger.info("No stream data for %s seconds. Reconnecting in %.1f seconds." %
+                             (self.config.STREAM_IDLE_TIMEOUT, delay))
+            self.close()
+            await asyncio.sleep(delay)
+            if not self.in_work:
+                continue
+            self._connect_to_stream()
+            # New stream data waits in queue until backfill is done, so traders get klines in order.
+            self.backfill_done.clear()
+            try:
+                await self.backfill_klines()
+            finally:
+                self.backfill_done.set()
+            self.last_receive_time = time.time()
+            self.reconnected += 1
+
+    async def backfill_klines(self):
+        """
+        Take closed klines, which were missed while stream was down, from REST API with one request per symbol and
+        give them to traders in order. They go to period candles and Redis kline history, trader doesn't trade on
+        them. Requests run in thread pool at once, so event loop keeps taking tasks meanwhile.
+        """
+        now = int(time.time() * 1000)
+        interval = self.config.KLINE_TIMEFRAME.split("_")[-1]
+        requests = {}
+        for symbol in self.stream_symbols():
+            start_time = self.next_kline_time.get(symbol)
+            if start_time is not None:
+                requests[symbol] = self.loop.run_in_executor(None, self.manager.get_stream_klines, symbol, start_time)
+        for symbol, request in requests.items():
+            try:
+                klines = await request
+            except Exception as e:  # pylint: disable=broad-except
+                self.logger.warning("Couldn't backfill %s klines." % symbol)
+                self.logger.warning(e)
+                continue
+            if len(klines) == 1000:
+                self.logger.warning("Stream was down too long, only 1000 %s klines are backfilled." % symbol)
+            klines = [kline for kline in klines if int(kline[6]) < now]
+            for kline in klines:
+                self.process_stream_data(rest_kline_to_stream_data(symbol, interval, kline))
+                self.next_kline_time[symbol] = int(kline[6]) + 1
+            if klines:
+                self.logger.info("%s missed %s klines are backfilled." % (symbol, len(klines)))
+
+    def process_stream_data(self, stream_data: dict):
+        """
+        Give stream kline to traders of its symbol and user data event to all traders.
+        :param stream_data: UnicornFy stream data.
+        """
+        kline_data = stream_data.get("kline", None)
+        if kline_data:
+            traders = self.traders.get(stream_data["symbol"])
+            # Closed kline comes after the first update of the same minute, so it's taken before check.
+            if kline_data["is_closed"]:
+                for trader in traders:
+                    trader.add_stream_kline(kline_data)
+            if stream_data.get("backfill", False):
+                # Missed minute from REST API is too old to trade on it.
+                self.save_kline_data(stream_data)
+            elif self.is_new_kline(stream_data["symbol"], kline_data["kline_start_time"]):
+                symbol = stream_data["symbol"]
+                for trader in traders:
+                    if trader.is_paused():
+                        continue
+                    # Order worker of the trader can change its balance meanwhile.
+                    with trader.state_lock:
+                        started = time.time()
+                        response = trader.use_strategy(kline_data, stream_data["event_time"])
+                        decided = self.latency.record_since(symbol, "strategy", started)
+                        if "receive_time" in stream_data:
+                            self.latency.record(symbol, "receive_to_decision", decided - stream_data["receive_time"])
+                        if response is False:
+                            # Not enough money for order. Only this trader waits, event loop must not sleep.
+                            trader.pause(60 * 10)
+                            continue
+                        trader.make_report(response)
+                    self.latency.record_since(symbol, "report", decided)
+                started = time.time()
+                self.save_kline_data(stream_data)
+                self.latency.record_since(symbol, "save_kline", started)
+        elif stream_data.get("event_type") in ("outboundAccountPosition", "executionReport"):
+            self.update_user_data(stream_data)
+
+    def is_new_kline(self, symbol: str, kline_start_time: int) -> bool:
+        """
+        Check that kline is the first update of a new minute for the symbol, and there is no newer kline in queue.
+        """
+        if self.stream_queue is not None and self.stream_queue.is_stale(symbol, kline_start_time):
+            return False
+        return self.traders.is_new_kline(symbol, kline_start_time)
+
+    def update_user_data(self, stream_data: dict):
+        """
+        Give user data stream event to traders, they keep balances from it.
+        :param stream_data: UnicornFy user data event.
+        """
+        for trader in self.traders:
+            trader.update_user_data(stream_data)
 
     def _connect_to_stream(self):
         self.bw_api_manager = BinanceWebSocketApiManager(
-            output_default="UnicornFy", enable_stream_signal_buffer=True, exchange=f"binance.{self.config.BINANCE_TLD}"
+            process_stream_data=self._receive_stream_data, output_default="UnicornFy",
+            exchange=f"binance.{self.config.BINANCE_TLD}"
         )
         self.bw_api_manager.create_stream(
             ["arr"], ["!userData"], api_key=self.config.BINANCE_API_KEY, api_secret=self.config.BINANCE_API_SECRET_KEY
@@ -112,12 +301,17 @@ class BinanceConnectionManager:
 
         self.bw_api_manager.create_stream(
             channels=[self.config.KLINE_TIMEFRAME],
-            markets=[(self.config.TARGET_MARGIN_SYMBOL + self.config.BRIDGE_MARGIN_SYMBOL),
-                     (self.config.TARGET_SPOT_SYMBOL + self.config.BRIDGE_SPOT_SYMBOL)],
+            markets=self.stream_symbols(),
             api_key=self.config.BINANCE_API_KEY,
             api_secret=self.config.BINANCE_API_SECRET_KEY
         )
 
+    def stream_symbols(self) -> t.List[str]:
+        """
+        :return: symbols for kline stream subscription.
+        """
+        return self.traders.symbols()
+
     def save_kline_data(self, data):
         """Add to redis db hash websocket kline data using event time as a key."""
         kline_report = defaultdict(**data["kline"])
@@ -134,23 +328,29 @@ class BinanceConnectionManager:
         pipeline.zadd(set_key, mapping={kline.event_time: kline.event_time})
         pipeline.execute()
 
-    def check_for_tasks(self):
+    def _receive_task(self, task: Task):
         """
-        Check for tasks in db task hash. If it is, execute task.
-        :return:
+        Control channel callback. It's called in channel thread, so task is handed to event loop. Task is already
+        taken from Redis, so if loop isn't running, it waits in the process until the loop starts.
         """
-        task_list = self.db.key_schema.tasks_key()
-        task_len = self.db.redis_client.llen(task_list)
-        if task_len > 0:
-            self.logger.info("We have task.")
-
-            hash_key = int(self.db.redis_client.rpop(task_list))
-            task_hash_key = self.db.key_schema.task_hash(hash_key)
-            task_hash = self.db.redis_client.hgetall(task_hash_key)
-            self.db.redis_client.hdel(task_hash_key, *task_hash.keys())
+        with self.task_lock:
+            self.pending_tasks.append(task)
+            if self.loop is None:
+                self.logger.warning("Event loop isn't running, task %s waits for it." % task.task)
+                return
+            self.loop.call_soon_threadsafe(self._execute_pending_tasks)
 
-            task = TaskSchema().load(task_hash.decode("utf-8"))
-            self.execute_task(task)
+    def _execute_pending_tasks(self):
+        while True:
+            with self.task_lock:
+                if not self.pending_tasks:
+                    return
+                task = self.pending_tasks.popleft()
+            try:
+                self.execute_task(task)
+            except Exception as e:  # pylint: disable=broad-except
+                self.logger.error("Couldn't execute task %s." % task.task)
+                self.logger.error(e)
 
     def execute_task(self, task: Task):
         """
@@ -165,27 +365,32 @@ class BinanceConnectionManager:
             "CONTINUE": self.continue_,
             "CLOSE_POSITION": self.close_position
         }
-        task_func = execution_dict[task.task]
+        task_func = execution_dict.get(task.task)
+        if task_func is None:
+            self.logger.warning("Unknown task %s." % task.task)
+            return
+        self.logger.info("We have task %s." % task.task)
         task_func()
         return
 
     def start(self):
         """
-        Start stream and trade bot.
+        Initialize traders again and start stream. Event loop keeps taking tasks while bot is stopped.
         :return:
         """
         if self.in_work:
             self.logger.info("We already in work. Don't try to start me!")
             return
         else:
-            self.in_work = True
             self.logger.info("Starting.")
-            self.initialization()
+            for trader in self.traders:
+                trader.initialization()
+            self._resume_stream()
             return
 
     def stop(self):
         """
-        Stop trading and stream process.
+        Close positions and stop stream.
         :return:
         """
         if not self.in_work:
@@ -196,13 +401,10 @@ class BinanceConnectionManager:
             self.logger.info("Stopping.")
             self.close_position()
             self.close()
-            while not self.in_work:
-                self.check_for_tasks()
-                time.sleep(1)
 
     def pause(self):
         """
-        Pause stream process.
+        Stop stream, positions stay open.
         :return:
         """
         if not self.in_work:
@@ -212,9 +414,6 @@ class BinanceConnectionManager:
             self.in_work = False
             self.logger.info("In pause.")
             self.close()
-            while not self.in_work:
-                self.check_for_tasks()
-                time.sleep(1)
 
     def continue_(self):
         """
@@ -225,21 +424,31 @@ class BinanceConnectionManager:
             self.logger.info("We already in work. Don't try to start me!")
             return
         else:
-            self.in_work = True
             self.logger.info("Continue.")
-            self._stream_processor()
+            self._resume_stream()
             return
 
+    def _resume_stream(self):
+        self._connect_to_stream()
+        self.last_receive_time = time.time()
+        self.reconnected = 1
+        self.in_work = True
+
+    def shutdown(self):
+        """
+        End event loop, run() returns. Can be called from any thread.
+        """
+        loop = self.loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self.stopped.set)
+
     def close_position(self):
         """
         Close open position in trade.
         :return:
         """
-        if self.both:
-            self.spot_trader.close_trades()
-            self.margin_trader.close_trades()
-        else:
-            self.trader.close_trades()
+        for trader in self.traders:
+            trader.close_trades()
 
         return
 
@@ -248,17 +457,15 @@ class BinanceConnectionManager:
         Close all websocket connections and streams.
         :return:
         """
-        self.bw_api_manager.stop_manager_with_all_streams()
+        if self.bw_api_manager is not None:
+            self.bw_api_manager.stop_manager_with_all_streams()
 
     def initialization(self):
         """
-        Initialize trader and start stream.
+        Initialize traders and start stream.
         :return: None
         """
-        if self.both:
-            self.spot_trader.initialization()
-            self.margin_trader.initialization()
-        else:
-            self.trader.initialization()
+        for trader in self.traders:
+            trader.initialization()
 
-        self._stream_processor()
+        self.run()
@@ -0,0 +1,62 @@
+from decimal import Decimal
+import typing as t
+
+
+class PeriodCandleAggregator:
+    """
+    Build period candles (KLINE_INTERVAL) from closed stream klines of smaller interval. Candle is built only if all
+    klines of the period came in a row, from the start of the period to its end. Otherwise trader backfills it
+    from REST.
+    """
+    def __init__(self, interval: int):
+        """
+        :param interval: period candle interval in ms, UNIX_TIME_INTERVAL in config.
+        """
+        self.interval = int(interval)
+        # [start time, open, low, high, close] of the period, which is being built now.
+        self.current: t.Optional[list] = None
+        # Start time of the next kline, which continues current candle.
+        self.next_time = 0
+        # The last complete candle: (start time, open, low, high, close).
+        self.candle: t.Optional[t.Tuple[int, Decimal, Decimal, Decimal, Decimal]] = None
+
+    def add_kline(self, kline: dict):
+        """
+        Put stream kline to the period candle. Not closed klines and repeated ones are skipped.
+        :param kline: stream_data["kline"].
+        """
+        if not kline["is_closed"]:
+            return
+        start_time = int(kline["kline_start_time"])
+        if start_time < self.next_time:
+            return
+        period_start = start_time - start_time % self.interval
+
+        if self.current is not None and self.current[0] == period_start and start_time == self.next_time:
+            high_price = Decimal(kline["high_price"])
+            low_price = Decimal(kline["low_price"])
+            if high_price > self.current[3]:
+                self.current[3] = high_price
+            if low_price < self.current[2]:
+                self.current[2] = low_price
+            self.current[4] = Decimal(kline["close_price"])
+        elif start_time == period_start:
+            self.current = [period_start, Decimal(kline["open_price"]), Decimal(kline["low_price"]),
+                            Decimal(kline["high_price"]), Decimal(kline["close_price"])]
+        else:
+            # Bot started inside the period or some klines were missed. Wait for the next period.
+            self.current = None
+
+        self.next_time = int(kline["kline_close_time"]) + 1
+        if self.current is not None and self.next_time == period_start + self.interval:
+            self.candle = tuple(self.current)
+            self.current = None
+
+    def get_candle(self, start_time: int) -> t.Optional[t.Tuple[int, Decimal, Decimal, Decimal, Decimal]]:
+        """
+        :param start_time: start time of the period candle.
+        :return: (start time, open, low, high, close) or None, if candle of this period wasn't built.
+        """
+        if self.candle is None or self.candle[0] != start_time:
+            return None
+        return self.candle
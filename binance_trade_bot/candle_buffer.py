@@ -0,0 +1,95 @@
+from decimal import Decimal
+import numpy as np
+import typing as t
+
+
+PERIOD_CANDLE_DTYPE = np.dtype([("time", np.int64), ("open", np.float64), ("low", np.float64), ("high", np.float64),
+                                ("close", np.float64)])
+
+
+class PeriodCandle:
+    """
+    Accessor to one candle of PeriodCandleBuffer. Prices are Decimal of the float value, it gives back the
+    original price string for prices with up to 15 significant digits. Index access keeps tuple order:
+    0 - time, 1 - open, 2 - low, 3 - high, 4 - close.
+    """
+    __slots__ = ("row",)
+
+    def __init__(self, row: np.void):
+        self.row = row
+
+    @property
+    def time(self) -> int:
+        return int(self.row["time"])
+
+    @property
+    def open(self) -> Decimal:
+        return Decimal(repr(float(self.row["open"])))
+
+    @property
+    def low(self) -> Decimal:
+        return Decimal(repr(float(self.row["low"])))
+
+    @property
+    def high(self) -> Decimal:
+        return Decimal(repr(float(self.row["high"])))
+
+    @property
+    def close(self) -> Decimal:
+        return Decimal(repr(float(self.row["close"])))
+
+    def __getitem__(self, index: int) -> t.Union[int, Decimal]:
+        if index == 0:
+            return self.time
+        return Decimal(repr(float(self.row[index])))
+
+
+class PeriodCandleBuffer:
+    """
+    Fixed capacity ring buffer of period candles in preallocated structured array. Every candle is written twice:
+    to position and to position + capacity, so candles from the oldest to the newest are always one contiguous slice,
+    and window() gives it without copy.
+    """
+    __slots__ = ("capacity", "data", "head", "count", "last_time")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.data = np.zeros(capacity * 2, dtype=PERIOD_CANDLE_DTYPE)
+        # Position for the next candle.
+        self.head = 0
+        self.count = 0
+        # Start time of the newest candle. Trader checks it on every minute candle.
+        self.last_time = 0
+
+    def append(self, time: int, open_price: Decimal, low_price: Decimal, high_price: Decimal, close_price: Decimal):
+        """
+        Put new candle instead of the oldest one, if buffer is full.
+        """
+        row = (time, open_price, low_price, high_price, close_price)
+        self.data[self.head] = row
+        self.data[self.head + self.capacity] = row
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.last_time = time
+
+    def window(self) -> np.ndarray:
+        """
+        :return: view of candles from the oldest to the newest.
+        """
+        end = self.head + self.capacity
+        return self.data[end - self.count:end]
+
+    def field(self, name: str) -> np.ndarray:
+        """
+        :param name: time, open, low, high or close.
+        :return: view of one field of candles from the oldest to the newest.
+        """
+        return self.window()[name]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> PeriodCandle:
+        if not -self.count <= index < self.count:
+            raise IndexError("Period candle index out of range.")
+        return PeriodCandle(self.window()[index])
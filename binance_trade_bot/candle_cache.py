@@ -0,0 +1,73 @@
+import mmap
+import os
+import numpy as np
+
+
+CANDLE_DTYPE = np.dtype([("time", np.int64), ("open", np.float64), ("high", np.float64), ("low", np.float64),
+                         ("close", np.float64)])
+# Start of .npy file version 1.0 and the header dict, which np.save writes for CANDLE_DTYPE array.
+NPY_PREFIX = b"\x93NUMPY\x01\x00"
+CANDLE_HEADER = "{'descr': %r, 'fortran_order': False, 'shape': (%%d,), }" % np.lib.format.dtype_to_descr(CANDLE_DTYPE)
+
+
+def candle_cache_path(csv_path: str) -> str:
+    """
+    Path of binary cache for the candle .csv file.
+    """
+    return os.path.splitext(csv_path)[0] + ".npy"
+
+
+def read_candle_csv(csv_path: str) -> np.ndarray:
+    """
+    Parse backtest candle .csv file (binance kline rows) into structured array.
+    :param csv_path: path to minute or period candle data file.
+    :return: np.ndarray with CANDLE_DTYPE fields: time, open, high, low, close.
+    """
+    return np.loadtxt(csv_path, delimiter=",", usecols=(0, 1, 2, 3, 4), dtype=CANDLE_DTYPE, ndmin=1)
+
+
+def load_candles(csv_path: str) -> np.ndarray:
+    """
+    Return memory-mapped candle array for the .csv file. On the first call .csv is converted to .npy file once,
+    after that only .npy file is mapped, so slices of the array don't copy data.
+    Cache is rebuilt if .csv file is newer than .npy file. If there is only .npy file, it is used as is.
+    :param csv_path: path to minute or period candle data file.
+    :return: read-only np.ndarray with CANDLE_DTYPE.
+    """
+    cache_path = candle_cache_path(csv_path)
+    if os.path.exists(csv_path) and (not os.path.exists(cache_path) or
+                                     os.path.getmtime(cache_path) < os.path.getmtime(csv_path)):
+        candles = read_candle_csv(csv_path)
+        # Tmp file of every process is its own, so processes which convert the same file don't break each other.
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, candles)
+        os.replace(tmp_path, cache_path)
+
+    return map_candle_cache(cache_path)
+
+
+def map_candle_cache(cache_path: str) -> np.ndarray:
+    """
+    Memory-map .npy candle cache as read-only array. Header, which np.save wrote for CANDLE_DTYPE, is compared with
+    the expected one, it's a few times faster than header parsing of np.load. Other files are loaded by np.load.
+    """
+    with open(cache_path, "rb") as f:
+        prefix = f.read(len(NPY_PREFIX) + 2)
+        if prefix[:len(NPY_PREFIX)] == NPY_PREFIX:
+            offset = len(prefix) + int.from_bytes(prefix[len(NPY_PREFIX):], "little")
+            count = (os.fstat(f.fileno()).st_size - offset) // CANDLE_DTYPE.itemsize
+            header = f.read(offset - len(prefix)).decode("latin1").strip()
+            if count > 0 and header == CANDLE_HEADER % count:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                return np.frombuffer(buffer, dtype=CANDLE_DTYPE, count=count, offset=offset)
+    return np.load(cache_path, mmap_mode="r")
+
+
+def candle_to_kline(candle) -> list:
+    """
+    Convert candle record into binance kline list [open time, open, high, low, close] with string prices,
+    as BinanceAPIManager returns it. Shortest float repr gives back the price from the original .csv file.
+    """
+    return [int(candle["time"]), repr(float(candle["open"])), repr(float(candle["high"])),
+            repr(float(candle["low"])), repr(float(candle["close"]))]
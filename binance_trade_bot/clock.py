@@ -0,0 +1,42 @@
+import time
+
+
+class Clock:
+    """
+    Real time clock. Trader code sleeps through it, so backtests can replace it with SimulatedClock.
+    """
+    def time(self) -> float:
+        """
+        Current unix time in seconds.
+        """
+        return time.time()
+
+    def sleep(self, seconds: float):
+        """
+        Wait for the specified number of seconds.
+        """
+        time.sleep(seconds)
+
+
+class SimulatedClock(Clock):
+    """
+    Virtual time clock for backtests. Sleep advances virtual time instantly.
+    """
+    def __init__(self, start_time: float = 0.0):
+        self.current_time = start_time
+        # Total virtual time spent in sleep.
+        self.slept = 0.0
+
+    def time(self) -> float:
+        return self.current_time
+
+    def sleep(self, seconds: float):
+        self.current_time += seconds
+        self.slept += seconds
+
+    def set_time(self, unix_time: float):
+        """
+        Move virtual time to the candle time. Time never goes back.
+        :param unix_time: unix time in seconds.
+        """
+        self.current_time = max(self.current_time, unix_time)
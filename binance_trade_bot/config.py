@@ -19,6 +19,9 @@ class Config:  # pylint: disable=too-few-public-methods,too-many-instance-attrib
             "strategy": "default",
             "sell_timeout": "0",
             "buy_timeout": "0",
+            "api_key": "",
+            "api_secret_key": "",
+            "trade_pairs": "",
         }
 
         if not os.path.exists(CFG_FL_NAME):
@@ -69,6 +72,28 @@ class Config:  # pylint: disable=too-few-public-methods,too-many-instance-attrib
         self.TARGET_SPOT_SYMBOL = os.environ.get("TARGET_SYMBOL") or config.get(USER_CFG_SECTION, "target_spot_symbol")
         self.TARGET_MARGIN_SYMBOL = (os.environ.get("TARGET_SYMBOL") or
                                      config.get(USER_CFG_SECTION, "target_margin_symbol"))
+        # Traders of one process: "SPOT:FTM/USDT,MARGIN:OMG/USDT,SPOT:ETH". Empty - traders of MARKET_PLACE for
+        # target and bridge symbols above.
+        self.TRADE_PAIRS = os.environ.get("TRADE_PAIRS") or config.get(USER_CFG_SECTION, "trade_pairs")
+        # Traders of TRADE_PAIRS are split between this number of worker processes, websocket is read in the main
+        # process (0 - traders run in the main process).
+        self.WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES") or 0)
+        # Stream is reconnected after this number of seconds without data.
+        self.STREAM_IDLE_TIMEOUT = 100
+        # Delay before stream reconnect: base, 2 * base, 4 * base ... seconds with jitter, not more than max. Bot
+        # closes positions and stops after RECONNECT_MAX_TRIES failed tries in a row.
+        self.RECONNECT_BASE_DELAY = 5
+        self.RECONNECT_MAX_DELAY = 300
+        self.RECONNECT_MAX_TRIES = 15
+        # Stream messages waiting for event loop. Kline updates of the same symbol and minute are merged in it.
+        self.STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE") or 1000)
+        # Redis tasks come through pub/sub at once. Task list is also checked every TASK_CHECK_INTERVAL seconds for
+        # tasks, which were pushed without pub/sub message.
+        self.TASK_CHECK_INTERVAL = 10
+        # Latency histograms of stream to order path are written to Redis every LATENCY_PUBLISH_INTERVAL seconds.
+        # They are cheap, so tracking is on unless DISABLE_LATENCY_TRACKING is set.
+        self.LATENCY_TRACKING = not os.environ.get("DISABLE_LATENCY_TRACKING")
+        self.LATENCY_PUBLISH_INTERVAL = 10
         self.SPOT_STOP_LOSS = Decimal(os.environ.get("SPOT_STOP_LOSS") or
                                       config.get(USER_CFG_SECTION, "spot_stop_loss"))
         self.MARGIN_STOP_LOSS = Decimal(os.environ.get("MARGIN_STOP_LOSS") or
@@ -80,9 +105,24 @@ class Config:  # pylint: disable=too-few-public-methods,too-many-instance-attrib
         self.WORKING_BALANCE = Decimal(os.environ.get("WORKING_BALANCE") or
                                        config.get(USER_CFG_SECTION, "working_balance"))
         self.STRATEGY_DICT = {"FIRST_STEP": (Decimal(0), Decimal(0))}
+        # Compare minute prices as int tickSize steps. Decimal is used only for balances and orders.
+        self.FIXED_POINT = bool(os.environ.get("FIXED_POINT"))
+        # SPOT balance is kept from order fills and user data stream, account is requested every this number of
+        # seconds (0 - after every order, as before).
+        self.BALANCE_RECONCILE_INTERVAL = int(os.environ.get("BALANCE_RECONCILE_INTERVAL") or 600)
+        # Symbol info of all symbols is saved here and requested again only after EXCHANGE_INFO_TTL seconds.
+        self.EXCHANGE_INFO_CACHE_PATH = os.environ.get("EXCHANGE_INFO_CACHE_PATH") or "cache/exchange_info.json"
+        self.EXCHANGE_INFO_TTL = int(os.environ.get("EXCHANGE_INFO_TTL") or 24 * 3600)
+        # Order requests are retried with exponential delay: base, 2 * base, 4 * base ... seconds, not more than max.
+        self.ORDER_RETRY_BASE_DELAY = 1
+        self.ORDER_RETRY_MAX_DELAY = 30
+        # Tries of one order request, order cancel or sell of not filled rest.
+        self.ORDER_MAX_TRIES = 10
 
         # Backtest configs.
         self.HISTORY_PERIOD_FOR_BACKTEST = 1
+        # EVENT - step through every minute candle with trader, VECTORIZED - bulk numpy engine (SPOT only).
+        self.BACKTEST_ENGINE = os.environ.get("BACKTEST_ENGINE") or "EVENT"
         self.BACKTEST_MINUTE_CANDLE_DATA_PATH = ("backtest_data/{target_symbol}{bridge_symbol}-"
                                                  f"{self.HISTORY_PERIOD_FOR_BACKTEST}_month-minute-data.csv")
         self.BACKTEST_PERIOD_CANDLE_DATA_PATH = ("backtest_data/{target_symbol}{bridge_symbol}-"
@@ -90,6 +130,28 @@ class Config:  # pylint: disable=too-few-public-methods,too-many-instance-attrib
                                                  f"{self.TIME_INTERVAL}-data.csv")
         self.BACKTEST_REPORT_DATA_PATH = ("backtest_data/{target_symbol}{bridge_symbol}-"
                                           f"{self.MARKET_PLACE}_report.csv")
+        self.BACKTEST_SYMBOL_INFO_PATH = "backtest_data/{target_symbol}{bridge_symbol}-symbol-info.json"
+        # Offline backtest never creates binance client and uses only local data from backtest_data folder.
+        self.BACKTEST_OFFLINE = bool(os.environ.get("BACKTEST_OFFLINE"))
+        # Long backtests save checkpoint every BACKTEST_CHECKPOINT_INTERVAL minute candles (0 - never).
+        # Set BACKTEST_RESUME env variable to continue from the last checkpoint.
+        self.BACKTEST_CHECKPOINT_PATH = ("backtest_data/{target_symbol}{bridge_symbol}-"
+                                         f"{self.MARKET_PLACE}_checkpoint.pkl")
+        self.BACKTEST_CHECKPOINT_INTERVAL = 10000
+        self.BACKTEST_RESUME = bool(os.environ.get("BACKTEST_RESUME"))
+        self.BACKTEST_SWEEP_REPORT_PATH = ("backtest_data/{target_symbol}{bridge_symbol}-"
+                                           f"{self.MARKET_PLACE}_sweep.csv")
+        self.BACKTEST_BATCH_REPORT_PATH = "backtest_data/batch_report.csv"
+        # Target coins of batch backtest: "FTM,OMG". Bridge coins are taken from market place configs.
+        self.BATCH_TARGET_SYMBOLS = [symbol.strip() for symbol in
+                                     (os.environ.get("BATCH_TARGET_SYMBOLS") or "FTM,OMG").split(",") if symbol.strip()]
+        # Benchmark results of the current commit. Commit is taken from git.
+        self.BENCHMARK_REPORT_PATH = "backtest_data/benchmark_{commit}.json"
+        # Backtest report: csv or parquet, rows kept in memory before writing, save only rows with order or
+        # changed period indicators.
+        self.BACKTEST_REPORT_FORMAT = os.environ.get("BACKTEST_REPORT_FORMAT") or "csv"
+        self.BACKTEST_REPORT_CHUNK_SIZE = 10000
+        self.BACKTEST_REPORT_ONLY_CHANGES = bool(os.environ.get("BACKTEST_REPORT_ONLY_CHANGES"))
 
         #Database
         self.REDIS_HOST = "redis"
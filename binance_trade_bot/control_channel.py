@@ -0,0 +1,107 @@
+import threading
+import time
+import typing as t
+
+from db.connections import RedisConnection
+from db.models import Task
+from db.schema import TaskSchema
+
+
+# Tasks, which bot executes.
+TASK_NAMES = ("START", "STOP", "PAUSE", "CONTINUE", "CLOSE_POSITION")
+
+# Pop task id from the list, read and delete its hash in one server side step.
+POP_TASK_SCRIPT = """
+local task_id = redis.call('RPOP', KEYS[1])
+if not task_id then
+    return nil
+end
+local hash_key = ARGV[1] .. task_id
+local task = redis.call('HGETALL', hash_key)
+redis.call('DEL', hash_key)
+return {task_id, task}
+"""
+
+
+def push_task(db: RedisConnection, task_name: str, task_id: t.Optional[int] = None) -> int:
+    """
+    Put task for bot to Redis and wake up its control channel. Channel contract: task fields are in hash
+    tasks:hash:{task_id} (field "task" - task name), task_id is pushed to the left of tasks:key:list and published
+    to tasks:channel. Bot pops ids from the right, so tasks are executed in push order.
+    :param db: RedisConnection instance.
+    :param task_name: one of TASK_NAMES.
+    :param task_id: id of the task hash. Current time in ns if None.
+    :return: task_id.
+    """
+    if task_id is None:
+        task_id = time.time_ns()
+    pipeline = db.redis_client.pipeline()
+    pipeline.hset(db.key_schema.task_hash(task_id), mapping={"task": task_name})
+    pipeline.lpush(db.key_schema.tasks_key(), task_id)
+    pipeline.publish(db.key_schema.tasks_channel(), task_id)
+    pipeline.execute()
+    return task_id
+
+
+class ControlChannel:
+    """
+    Takes bot tasks from Redis on its own thread. Thread waits for pub/sub message of push_task and pops all tasks
+    with one script call per task, so idle bot doesn't load Redis. Tasks list is also checked every
+    fallback_interval seconds for producers, which don't publish.
+    """
+    def __init__(self, db: RedisConnection, logger, handler: t.Callable[[Task], None], fallback_interval: float):
+        """
+        :param db: RedisConnection instance.
+        :param logger: Logger instance.
+        :param handler: function, which takes task. It's called in channel thread.
+        :param fallback_interval: seconds between list checks without pub/sub message.
+        """
+        self.db = db
+        self.logger = logger
+        self.handler = handler
+        self.fallback_interval = fallback_interval
+        self.pop_task = self.db.redis_client.register_script(POP_TASK_SCRIPT)
+        self.stopped = threading.Event()
+        self.thread: t.Optional[threading.Thread] = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="control-channel", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        pubsub = None
+        while not self.stopped.is_set():
+            try:
+                if pubsub is None:
+                    pubsub = self.db.redis_client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(self.db.key_schema.tasks_channel())
+                # Tasks, which were pushed before subscription or without message, are taken here too.
+                self.pop_tasks()
+                pubsub.get_message(timeout=self.fallback_interval)
+            except Exception as e:  # pylint: disable=broad-except
+                self.logger.warning("Control channel error.")
+                self.logger.warning(e)
+                pubsub = None
+                self.stopped.wait(5)
+        if pubsub is not None:
+            pubsub.close()
+
+    def pop_tasks(self):
+        """
+        Give all waiting tasks to handler.
+        """
+        prefix = self.db.key_schema.task_hash("")
+        while True:
+            popped = self.pop_task(keys=[self.db.key_schema.tasks_key()], args=[prefix])
+            if popped is None:
+                return
+            task_id, fields = popped
+            if not fields:
+                self.logger.warning("Task %s has no data." % task_id)
+                continue
+            task_hash = dict(zip(fields[::2], fields[1::2]))
+            self.handler(TaskSchema().load(task_hash))
@@ -0,0 +1,147 @@
+from decimal import Decimal
+import json
+import os
+import threading
+import time
+import typing as t
+
+
+def get_filter(symbol_info: dict, filter_type: str) -> t.Optional[dict]:
+    """
+    Find symbol filter by its filterType.
+    :param symbol_info: binance symbol info.
+    :param filter_type: PRICE_FILTER, LOT_SIZE, MIN_NOTIONAL, ...
+    :return: filter dict or None.
+    """
+    for symbol_filter in symbol_info.get("filters", []):
+        if symbol_filter.get("filterType") == filter_type:
+            return symbol_filter
+    return None
+
+
+def get_lot_size(symbol_info: dict) -> Decimal:
+    """
+    :return: LOT_SIZE stepSize of the symbol.
+    """
+    return Decimal(get_filter(symbol_info, "LOT_SIZE")["stepSize"])
+
+
+def get_min_notional(symbol_info: dict) -> Decimal:
+    """
+    :return: minNotional of the symbol. Binance replaces MIN_NOTIONAL filter with NOTIONAL for some symbols.
+    """
+    notional_filter = get_filter(symbol_info, "MIN_NOTIONAL") or get_filter(symbol_info, "NOTIONAL")
+    return Decimal(notional_filter["minNotional"])
+
+
+class ExchangeInfoCache:
+    """
+    Symbol info of all exchange symbols from one exchangeInfo request. It's saved to .json file and is used from it
+    on restart until ttl is over, so starting any number of traders costs one request or none.
+    """
+    def __init__(self, path: str, ttl: float, fetch: t.Callable[[], dict]):
+        """
+        :param path: cache .json file.
+        :param ttl: cache lifetime in seconds.
+        :param fetch: exchangeInfo request, binance_client.get_exchange_info.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.fetch = fetch
+        self.update_time = 0.0
+        self.symbols: t.Dict[str, dict] = {}
+        # {symbol: {filterType: filter}}.
+        self.filters: t.Dict[str, t.Dict[str, dict]] = {}
+        self.refresh_thread: t.Optional[threading.Thread] = None
+        # Background refresh and traders, which find expired cache, don't request and write the file at once.
+        self.refresh_lock = threading.RLock()
+
+    def _set(self, symbols: t.List[dict], update_time: float):
+        # New dicts are built first and replaced at once, so readers never see half updated cache.
+        self.symbols = {symbol_info["symbol"]: symbol_info for symbol_info in symbols}
+        self.filters = {symbol: {symbol_filter["filterType"]: symbol_filter
+                                 for symbol_filter in symbol_info.get("filters", [])}
+                        for symbol, symbol_info in self.symbols.items()}
+        self.update_time = update_time
+
+    def load(self) -> bool:
+        """
+        Load cache from the file, if it isn't expired.
+        :return: True if cache was loaded.
+        """
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            cache = json.load(f)
+        if time.time() - cache["update_time"] >= self.ttl:
+            return False
+        self._set(cache["symbols"], cache["update_time"])
+        return True
+
+    def refresh(self):
+        """
+        Request exchangeInfo and save it to the file.
+        """
+        with self.refresh_lock:
+            update_time = time.time()
+            symbols = self.fetch()["symbols"]
+            self._set(symbols, update_time)
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Worker processes of sharded mode share the cache file, so tmp file is of this process.
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"update_time": update_time, "symbols": symbols}, f)
+            os.replace(tmp_path, self.path)
+
+    def _expired(self) -> bool:
+        return time.time() - self.update_time >= self.ttl
+
+    def _ensure_fresh(self):
+        if not self._expired():
+            return
+        with self.refresh_lock:
+            # Another thread could refresh cache while this one waited for the lock.
+            if self._expired() and not self.load():
+                self.refresh()
+
+    def get_symbol_info(self, symbol: str) -> t.Optional[dict]:
+        """
+        :param symbol: target + bridge assets.
+        :return: symbol info or None, if exchange doesn't have this symbol.
+        """
+        self._ensure_fresh()
+        return self.symbols.get(symbol)
+
+    def get_filter(self, symbol: str, filter_type: str) -> t.Optional[dict]:
+        """
+        :param symbol: target + bridge assets.
+        :param filter_type: PRICE_FILTER, LOT_SIZE, MIN_NOTIONAL, ...
+        :return: filter dict or None.
+        """
+        self._ensure_fresh()
+        return self.filters.get(symbol, {}).get(filter_type)
+
+    def start_refresh(self, logger=None):
+        """
+        Refresh cache in background thread every ttl seconds.
+        :param logger: Logger for refresh errors.
+        """
+        if self.refresh_thread is not None:
+            return
+
+        def refresh_loop():
+            while True:
+                # After failed request update_time is old, so the next try is in a minute.
+                time.sleep(max(self.update_time + self.ttl - time.time(), 60))
+                try:
+                    self.refresh()
+                except Exception as e:  # pylint: disable=broad-except
+                    if logger is not None:
+                        logger.warning("Couldn't refresh exchange info.")
+                        logger.warning(e)
+
+        self.refresh_thread = threading.Thread(target=refresh_loop, name="exchange-info-refresh", daemon=True)
+        self.refresh_thread.start()
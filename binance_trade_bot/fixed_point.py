@@ -0,0 +1,86 @@
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR, localcontext
+import typing as t
+
+from .exchange_info import get_filter
+
+
+# Binance sends prices and quantities with 8 decimal places, so this step is exact for any symbol.
+DEFAULT_STEP = Decimal("0.00000001")
+
+
+class FixedPointScale:
+    """
+    Integer representation of symbol prices. Price is kept as int number of tickSize steps,
+    and converted to Decimal only when it's needed for balance math and orders.
+    """
+    def __init__(self, tick_size: Decimal = DEFAULT_STEP):
+        self.tick_size = tick_size.normalize()
+        exponent = self.tick_size.as_tuple().exponent
+        self.decimals = max(0, -exponent)
+        # Int tick of 1e-decimals units. For example, tickSize 0.0005 with 4 decimals is 5 units.
+        self.tick_units = int(self.tick_size.scaleb(self.decimals))
+
+    @classmethod
+    def from_symbol_info(cls, symbol_info: dict) -> "FixedPointScale":
+        """
+        Build scale from PRICE_FILTER tickSize. Default 8 decimals step is used, if there is no filter.
+        """
+        price_filter = get_filter(symbol_info, "PRICE_FILTER")
+        if price_filter is None or Decimal(price_filter["tickSize"]) == 0:
+            return cls()
+        return cls(Decimal(price_filter["tickSize"]))
+
+    def price_to_ticks(self, price: str) -> t.Optional[int]:
+        """
+        Parse price string without Decimal.
+        :param price: price string like '2.11380000'.
+        :return: int number of ticks, or None if price isn't on the tick grid.
+        """
+        whole, _, fraction = price.partition(".")
+        if len(fraction) > self.decimals:
+            if fraction[self.decimals:].strip("0"):
+                return None
+            fraction = fraction[:self.decimals]
+        try:
+            units = int(whole + fraction) * 10 ** (self.decimals - len(fraction))
+        except ValueError:
+            # Exponent notation like 1e-05.
+            return None
+        if self.tick_units == 1:
+            return units
+        ticks, extra = divmod(units, self.tick_units)
+        if extra:
+            return None
+        return ticks
+
+    def ticks_to_price(self, ticks: int) -> Decimal:
+        """
+        Convert ticks back to Decimal price.
+        """
+        return Decimal(ticks * self.tick_units).scaleb(-self.decimals)
+
+    def _round_ticks(self, price: t.Union[Decimal, float], rounding: str) -> t.Optional[int]:
+        price = Decimal(price)
+        if not price.is_finite():
+            return None
+        with localcontext() as context:
+            context.prec = 60
+            return int((price / self.tick_size).to_integral_value(rounding))
+
+    def floor_ticks(self, price: t.Union[Decimal, float]) -> t.Optional[int]:
+        """
+        The biggest number of ticks with price not more than the given one.
+        For int ticks: ticks <= floor_ticks(price) is the same as tick price <= price,
+        ticks > floor_ticks(price) is the same as tick price > price.
+        :return: int ticks, None for NaN.
+        """
+        return self._round_ticks(price, ROUND_FLOOR)
+
+    def ceil_ticks(self, price: t.Union[Decimal, float]) -> t.Optional[int]:
+        """
+        The smallest number of ticks with price not less than the given one.
+        For int ticks: ticks >= ceil_ticks(price) is the same as tick price >= price,
+        ticks < ceil_ticks(price) is the same as tick price < price.
+        :return: int ticks, None for NaN.
+        """
+        return self._round_ticks(price, ROUND_CEILING)
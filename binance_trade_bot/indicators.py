@@ -0,0 +1,249 @@
+from decimal import Decimal
+import typing as t
+
+from .rolling_window import RollingMax, RollingMean, RollingMin
+
+
+# Period candle fields: (start time, open, low, high, close).
+OPEN = 1
+LOW = 2
+HIGH = 3
+CLOSE = 4
+NAN = float("nan")
+
+
+class Indicator:
+    """
+    Base incremental indicator. It takes period candles one by one, and value is ready after enough candles.
+    Indicators with the same key give the same values, so IndicatorPipeline keeps only one of them.
+    """
+    def __init__(self, period: int, field: int = OPEN):
+        self.period = period
+        self.field = field
+        self.last_time: t.Optional[int] = None
+
+    @property
+    def key(self) -> tuple:
+        return type(self).__name__, self.period, self.field
+
+    def update(self, candle: tuple):
+        """
+        Take new candle. Candle which isn't newer than the last one is skipped, so indicator shared by several traders
+        counts every candle once.
+        :param candle: (start time, open, low, high, close).
+        """
+        if self.last_time is not None and candle[0] <= self.last_time:
+            return
+        self.last_time = candle[0]
+        self._update(candle)
+
+    def _update(self, candle: tuple):
+        raise NotImplementedError
+
+    @property
+    def value(self):
+        """
+        :return: indicator value, float NaN while there are not enough candles.
+        """
+        raise NotImplementedError
+
+
+class SMA(Indicator):
+    """
+    Simple moving average with exact Decimal running sum.
+    """
+    def __init__(self, period: int, field: int = OPEN):
+        super().__init__(period, field)
+        self.mean = RollingMean(period)
+
+    def _update(self, candle: tuple):
+        self.mean.append(candle[self.field])
+
+    @property
+    def value(self) -> t.Union[Decimal, float]:
+        return self.mean.value
+
+
+class MaxPrice(Indicator):
+    """
+    Max price of the last period candles.
+    """
+    rolling_class = RollingMax
+
+    def __init__(self, period: int, field: int = OPEN):
+        super().__init__(period, field)
+        self.extremum = self.rolling_class(period)
+
+    def _update(self, candle: tuple):
+        self.extremum.append(candle[self.field])
+
+    @property
+    def value(self) -> t.Union[Decimal, float]:
+        if not self.extremum.candidates:
+            return NAN
+        return self.extremum.value
+
+
+class MinPrice(MaxPrice):
+    """
+    Min price of the last period candles.
+    """
+    rolling_class = RollingMin
+
+
+class EMA(Indicator):
+    """
+    Exponential moving average. It starts from SMA of the first period candles.
+    """
+    def __init__(self, period: int, field: int = OPEN):
+        super().__init__(period, field)
+        self.alpha = Decimal(2) / (period + 1)
+        self.seed: t.Optional[RollingMean] = RollingMean(period)
+        self.average: t.Optional[Decimal] = None
+
+    def _update(self, candle: tuple):
+        price = candle[self.field]
+        if self.average is None:
+            self.seed.append(price)
+            if len(self.seed.values) == self.period:
+                self.average = self.seed.value
+                self.seed = None
+        else:
+            self.average += self.alpha * (price - self.average)
+
+    @property
+    def value(self) -> t.Union[Decimal, float]:
+        return NAN if self.average is None else self.average
+
+
+class RSI(Indicator):
+    """
+    Relative strength index with Wilder smoothing of gains and losses.
+    """
+    def __init__(self, period: int, field: int = OPEN):
+        super().__init__(period, field)
+        self.previous_price: t.Optional[Decimal] = None
+        self.changes = 0
+        self.gain = Decimal(0)
+        self.loss = Decimal(0)
+
+    def _update(self, candle: tuple):
+        price = candle[self.field]
+        if self.previous_price is not None:
+            change = price - self.previous_price
+            gain = max(change, Decimal(0))
+            loss = max(-change, Decimal(0))
+            self.changes += 1
+            if self.changes <= self.period:
+                self.gain += gain
+                self.loss += loss
+                if self.changes == self.period:
+                    self.gain /= self.period
+                    self.loss /= self.period
+            else:
+                self.gain = (self.gain * (self.period - 1) + gain) / self.period
+                self.loss = (self.loss * (self.period - 1) + loss) / self.period
+        self.previous_price = price
+
+    @property
+    def value(self) -> t.Union[Decimal, float]:
+        if self.changes < self.period:
+            return NAN
+        total = self.gain + self.loss
+        if total == 0:
+            return Decimal(0)
+        return 100 * self.gain / total
+
+
+class BollingerBands(Indicator):
+    """
+    Moving average with bands on deviations number of population standard deviations.
+    """
+    def __init__(self, period: int, deviations: Decimal = Decimal(2), field: int = OPEN):
+        super().__init__(period, field)
+        self.deviations = deviations
+        self.mean = RollingMean(period)
+        self.square_mean = RollingMean(period)
+
+    @property
+    def key(self) -> tuple:
+        return super().key + (self.deviations,)
+
+    def _update(self, candle: tuple):
+        price = candle[self.field]
+        self.mean.append(price)
+        self.square_mean.append(price * price)
+
+    @property
+    def value(self) -> t.Tuple[t.Union[Decimal, float], ...]:
+        """
+        :return: tuple(lower band, moving average, upper band).
+        """
+        middle = self.mean.value
+        if not isinstance(middle, Decimal):
+            return NAN, NAN, NAN
+        deviation = max(self.square_mean.value - middle * middle, Decimal(0)).sqrt() * self.deviations
+        return middle - deviation, middle, middle + deviation
+
+
+class ATR(Indicator):
+    """
+    Average true range with Wilder smoothing. The first candle gives only previous close, it has no true range.
+    """
+    def __init__(self, period: int):
+        super().__init__(period, CLOSE)
+        self.previous_close: t.Optional[Decimal] = None
+        self.ranges = 0
+        self.average = Decimal(0)
+
+    def _update(self, candle: tuple):
+        high, low, close = candle[HIGH], candle[LOW], candle[CLOSE]
+        if self.previous_close is not None:
+            true_range = max(high - low, abs(high - self.previous_close), abs(low - self.previous_close))
+            self.ranges += 1
+            if self.ranges <= self.period:
+                self.average += true_range
+                if self.ranges == self.period:
+                    self.average /= self.period
+            else:
+                self.average = (self.average * (self.period - 1) + true_range) / self.period
+        self.previous_close = close
+
+    @property
+    def value(self) -> t.Union[Decimal, float]:
+        return NAN if self.ranges < self.period else self.average
+
+
+class IndicatorPipeline:
+    """
+    Indicators of one symbol and interval. Every indicator is computed once per candle, however many traders
+    subscribed to it.
+    """
+    def __init__(self):
+        self.indicators: t.Dict[tuple, Indicator] = {}
+
+    def subscribe(self, indicator: Indicator) -> Indicator:
+        """
+        :param indicator: new indicator.
+        :return: already subscribed indicator with the same key, or the given one.
+        """
+        return self.indicators.setdefault(indicator.key, indicator)
+
+    def update(self, candle: tuple):
+        """
+        Put new period candle to all indicators.
+        :param candle: (start time, open, low, high, close).
+        """
+        for indicator in self.indicators.values():
+            indicator.update(candle)
+
+
+class IndicatorRegistry:
+    """
+    Pipelines by (symbol, interval). Traders which get the same registry share indicators.
+    """
+    def __init__(self):
+        self.pipelines: t.Dict[t.Tuple[str, str], IndicatorPipeline] = {}
+
+    def pipeline(self, symbol: str, interval: str) -> IndicatorPipeline:
+        return self.pipelines.setdefault((symbol, interval), IndicatorPipeline())
@@ -0,0 +1,141 @@
+from collections import defaultdict
+import json
+import threading
+import time
+import typing as t
+
+
+# Spans of the stream to order path. Every span is measured by symbol.
+SPANS = (
+    "exchange_to_receive",  # kline event time on exchange -> websocket callback.
+    "queue_wait",  # websocket callback -> consumer took message from the queue.
+    "strategy",  # use_strategy of one trader.
+    "order",  # place order request -> response, in order worker thread.
+    "report",  # make_report of one trader.
+    "save_kline",  # save_kline_data.
+    "receive_to_decision",  # websocket callback -> the last trader made decision.
+)
+
+
+class LatencyHistogram:
+    """
+    HDR-like histogram of latencies in microseconds. Values are put in log buckets with SUB_BUCKET_BITS
+    significant bits, so relative error is below 2% and record() is one index computation and one increment.
+    Percentiles are computed only when they are read.
+    """
+    SUB_BUCKET_BITS = 7
+    # One hour, bigger values are recorded as it.
+    MAX_VALUE = 3600 * 10 ** 6
+
+    def __init__(self):
+        self.half = 1 << (self.SUB_BUCKET_BITS - 1)
+        self.counts = [0] * (self.bucket_index(self.MAX_VALUE) + 1)
+        self.total = 0
+        self.max = 0
+
+    def bucket_index(self, value: int) -> int:
+        # Values below 2 ** SUB_BUCKET_BITS are exact, then every power of two has half of sub buckets.
+        shift = value.bit_length() - self.SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        return shift * self.half + (value >> shift)
+
+    def bucket_value(self, index: int) -> int:
+        """
+        :return: the highest value of the bucket.
+        """
+        if index < 2 * self.half:
+            return index
+        shift = index // self.half - 1
+        return ((index - shift * self.half + 1) << shift) - 1
+
+    def record(self, value: int):
+        """
+        :param value: latency in microseconds.
+        """
+        if value < 0:
+            # Clocks of exchange and bot aren't the same.
+            value = 0
+        elif value > self.MAX_VALUE:
+            value = self.MAX_VALUE
+        self.counts[self.bucket_index(value)] += 1
+        self.total += 1
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent: float) -> int:
+        """
+        :param percent: from 0 to 100.
+        :return: latency in microseconds, 0 if nothing was recorded.
+        """
+        if not self.total:
+            return 0
+        rank = max(1, int(self.total * percent / 100 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bucket_value(index), self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {"count": self.total, "p50_us": self.percentile(50), "p99_us": self.percentile(99),
+                "max_us": self.max}
+
+
+class LatencyRecorder:
+    """
+    Latency histograms by symbol and span of stream processor. It's shared by threads of one process: websocket,
+    event loop and order workers.
+    """
+    def __init__(self):
+        self.enabled = True
+        self.histograms: t.Dict[str, t.Dict[str, LatencyHistogram]] = defaultdict(dict)
+        self.lock = threading.Lock()
+
+    def record(self, symbol: str, span: str, seconds: float):
+        """
+        :param symbol: target + bridge assets.
+        :param span: name from SPANS.
+        :param seconds: duration of the span.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms[symbol].get(span)
+            if histogram is None:
+                histogram = self.histograms[symbol][span] = LatencyHistogram()
+            histogram.record(int(seconds * 10 ** 6))
+
+    def record_since(self, symbol: str, span: str, started: float) -> float:
+        """
+        Record span from started to now.
+        :param started: time.time() of the span start.
+        :return: now, so next span can start from it.
+        """
+        now = time.time()
+        self.record(symbol, span, now - started)
+        return now
+
+    def snapshot(self) -> t.Dict[str, dict]:
+        """
+        :return: {symbol: {span: {count, p50_us, p99_us, max_us}}}.
+        """
+        with self.lock:
+            return {symbol: {span: histogram.snapshot() for span, histogram in spans.items()}
+                    for symbol, spans in self.histograms.items()}
+
+    def publish(self, db, name: str):
+        """
+        Write snapshot to Redis hash, one JSON field per symbol.
+        :param db: RedisConnection instance.
+        :param name: process name, processes of sharded mode write their own hashes.
+        """
+        snapshot = self.snapshot()
+        if snapshot:
+            db.redis_client.hset(db.key_schema.latency_hash(name),
+                                 mapping={symbol: json.dumps(spans) for symbol, spans in snapshot.items()})
+
+
+# Recorder of this process. API manager and stream processor of a process write to it.
+latency_recorder = LatencyRecorder()
@@ -1,6 +1,14 @@
+import multiprocessing
+import queue
+import typing as t
+
 from binance_trade_bot.binance_stream_manager import BinanceConnectionManager
 from binance_trade_bot.binance_api_manager import BinanceAPIManager
-from binance_trade_bot.trader import Trader, GlobalStrategy
+from binance_trade_bot.indicators import IndicatorRegistry
+from binance_trade_bot.order_executor import ThreadOrderExecutor
+from binance_trade_bot.sharded_stream import ShardIngest, ShardWorker, assign_shards
+from binance_trade_bot.trader import GlobalStrategy, Trader
+from binance_trade_bot.trader_registry import TraderRegistry, get_trade_pairs
 from binance_trade_bot.strategy.margin_strategy import MarginTrader
 from binance_trade_bot.strategy.spot_strategy import SpotTrader
 from binance_trade_bot.config import Config
@@ -8,19 +16,75 @@ from binance_trade_bot.logger import Logger
 from db.connections import RedisConnection
 
 
-def get_spot_or_margin_strategy(market_place):
+def get_spot_or_margin_strategy(market_place) -> type:
     """
-    Take name of market as a key and return value: trader and APIManager instances for trading.
-    :param market_place: SPOT or MARGIN. Defines in config.
-    :return: tuple(Trader Instance, APIManager Instance).
+    Take name of market as a key and return trader class for trading.
+    :param market_place: SPOT or MARGIN.
+    :return: Trader subclass.
     """
     dict_of_strategy = {
-        "SPOT":  Trader,
+        "SPOT":  SpotTrader,
         "MARGIN":  MarginTrader
     }
     return dict_of_strategy[market_place]
 
 
+def build_traders(manager: BinanceAPIManager, db: RedisConnection, config: Config, logger: Logger,
+                  pairs: t.List[t.Tuple[str, GlobalStrategy]]) -> TraderRegistry:
+    """
+    Make traders of trade pairs.
+    :param pairs: list of tuple(market place, GlobalStrategy) from get_trade_pairs.
+    :return: TraderRegistry.
+    """
+    traders = TraderRegistry()
+    # Traders compute indicators once, if they trade the same symbol.
+    indicators = IndicatorRegistry()
+    # Every trader has its own order worker, so slow MARGIN loan doesn't hold other orders. Finished orders of all
+    # workers come to one queue, stream processor checks only it.
+    finished_orders = queue.Queue()
+    for market_place, global_strategy in pairs:
+        trader_shell = get_spot_or_margin_strategy(market_place)
+        trader: Trader = trader_shell(manager, db, global_strategy, config, logger, indicators,
+                                      ThreadOrderExecutor(logger, finished_orders))
+        traders.add(trader)
+    return traders
+
+
+def run_shard_worker(index: int, pairs: t.List[t.Tuple[str, GlobalStrategy]], stream_queue):
+    """
+    Worker process of sharded mode: traders of pairs with stream data from ingest process.
+    :param index: worker number, it's used for log file name.
+    :param pairs: trade pairs of the worker.
+    :param stream_queue: multiprocessing queue, which ingest process fills.
+    """
+    logger = Logger(f"crypto_trading_shard_{index}")
+    config = Config()
+    db = RedisConnection()
+    manager = BinanceAPIManager(config, logger)
+    traders = build_traders(manager, db, config, logger, pairs)
+    logger.info("Shard %s trades %s." % (index, ", ".join(
+        "%s %s" % (trader, trader.global_strategy.bid_symbol) for trader in traders)))
+    worker = ShardWorker(config=config, api_manager=manager, logger=logger, traders=traders, db=db,
+                         stream_queue=stream_queue, index=index)
+    worker.initialization()
+
+
+def start_shard_workers(config: Config, pairs: t.List[t.Tuple[str, GlobalStrategy]]) -> list:
+    """
+    Start worker processes for pairs of config WORKER_PROCESSES shards.
+    :return: list of tuple(pairs of worker, worker stream queue).
+    """
+    # Workers are spawned, so they don't inherit websocket and refresh threads of this process.
+    context = multiprocessing.get_context("spawn")
+    shards = []
+    for index, shard_pairs in enumerate(assign_shards(pairs, config.WORKER_PROCESSES)):
+        stream_queue = context.Queue()
+        context.Process(target=run_shard_worker, args=(index, shard_pairs, stream_queue),
+                        name=f"shard-{index}", daemon=True).start()
+        shards.append((shard_pairs, stream_queue))
+    return shards
+
+
 def main():
     logger = Logger()
 
@@ -28,9 +92,6 @@ def main():
     config = Config()
 
     db = RedisConnection()
-    global_spot_strategy = GlobalStrategy(config.BRIDGE_SPOT_SYMBOL, config.TARGET_SPOT_SYMBOL)
-    global_margin_strategy = GlobalStrategy(config.BRIDGE_MARGIN_SYMBOL, config.TARGET_MARGIN_SYMBOL)
-
     manager = BinanceAPIManager(config, logger)
 
     try:
@@ -39,25 +100,25 @@ def main():
         logger.error("Couldn't access Binance API - API keys may be wrong or lack sufficient permissions")
         logger.error(e)
         return
-    
+
+    manager.exchange_info.start_refresh(logger)
     db.redis_client.set("strategy", config.MARKET_PLACE)
-    
-    if config.MARKET_PLACE == "SPOT-MARGIN":
-        db.redis_client.set("MARGIN", global_margin_strategy.bid_symbol)
-        db.redis_client.set("SPOT", global_spot_strategy.bid_symbol)
-        margin_trader = MarginTrader(manager, db, global_margin_strategy, config, logger)
-        spot_trader = SpotTrader(manager, db, global_spot_strategy, config, logger)
-        connection_manager = BinanceConnectionManager(config=config, api_manager=manager, logger=logger, trader=None,
-                                                      spot_trader=spot_trader, margin_trader=margin_trader, both=True,
-                                                      db=db)
+
+    pairs = get_trade_pairs(config)
+    for market_place in ("SPOT", "MARGIN"):
+        # load_to_csv_script reads one symbol per market place, it's the first one.
+        symbols = [global_strategy.bid_symbol for market, global_strategy in pairs if market == market_place]
+        if symbols:
+            db.redis_client.set(market_place, symbols[0])
+
+    if config.WORKER_PROCESSES > 0:
+        shards = start_shard_workers(config, pairs)
+        logger.info("Trading %s pairs in %s worker processes." % (len(pairs), len(shards)))
+        connection_manager = ShardIngest(config=config, api_manager=manager, logger=logger, db=db, shards=shards)
     else:
-        if config.MARKET_PLACE == "SPOT":
-            global_strategy = global_spot_strategy
-        else:
-            global_strategy = global_margin_strategy
-        db.redis_client.set(config.MARKET_PLACE, global_strategy.bid_symbol)
-        trader_shell = get_spot_or_margin_strategy(config.MARKET_PLACE)
-        trader = trader_shell(manager, db, global_strategy, config, logger)
-        connection_manager = BinanceConnectionManager(config=config, api_manager=manager,
-                                                      logger=logger, trader=trader, db=db)
+        traders = build_traders(manager, db, config, logger, pairs)
+        logger.info("Trading %s pairs: %s." % (len(traders), ", ".join(
+            "%s %s" % (trader, trader.global_strategy.bid_symbol) for trader in traders)))
+        connection_manager = BinanceConnectionManager(config=config, api_manager=manager, logger=logger,
+                                                      traders=traders, db=db)
     connection_manager.initialization()
@@ -0,0 +1,88 @@
+import queue
+import threading
+import typing as t
+import uuid
+
+
+def new_client_order_id() -> str:
+    """
+    Client order ID for one trader order. Order is sent with the same ID on every retry, so it can be found on
+    exchange, if request timed out after order was placed.
+    """
+    return "tb-" + uuid.uuid4().hex[:28]
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Exponential delay before retry.
+    :param attempt: retry number, from 1.
+    :param base_delay: delay before the first retry in seconds.
+    :param max_delay: delay limit in seconds.
+    """
+    return min(base_delay * 2 ** (attempt - 1), max_delay)
+
+
+class OrderExecutor:
+    """
+    Runs trader order jobs: buy or sell_all with all their retries. This one runs job at once in the caller thread,
+    so backtests stay minute by minute.
+    """
+    def submit(self, job: t.Callable[[], t.Any], callback: t.Callable[[t.Any], None]):
+        """
+        :param job: order job. Its result (order response or None) is given to callback.
+        :param callback: trader function, which finishes trade with order response.
+        """
+        callback(job())
+
+    def dispatch(self):
+        """
+        Call callbacks of finished jobs. Synchronous executor has nothing to do here.
+        """
+
+
+class ThreadOrderExecutor(OrderExecutor):
+    """
+    Runs order jobs one by one on the worker thread, so stream processor keeps working while order is pending.
+    Callbacks are called from dispatch() in stream processor thread. Job changes trader balance in the worker thread,
+    trader guards it with state_lock.
+    """
+    def __init__(self, logger=None, finished: t.Optional[queue.Queue] = None):
+        """
+        :param logger: Logger for failed jobs.
+        :param finished: queue of finished jobs. Executors of one stream processor can share it, then dispatch() of
+                         any of them finishes orders of all traders.
+        """
+        self.logger = logger
+        self.jobs: queue.Queue = queue.Queue()
+        self.finished: queue.Queue = finished if finished is not None else queue.Queue()
+        # Called from worker thread after job is done, so event loop of stream processor can dispatch at once.
+        self.notify: t.Optional[t.Callable[[], None]] = None
+        self.worker: t.Optional[threading.Thread] = None
+
+    def submit(self, job: t.Callable[[], t.Any], callback: t.Callable[[t.Any], None]):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._work, name="order-executor", daemon=True)
+            self.worker.start()
+        self.jobs.put((job, callback))
+
+    def _work(self):
+        while True:
+            job, callback = self.jobs.get()
+            try:
+                result = job()
+            except Exception as e:  # pylint: disable=broad-except
+                if self.logger is not None:
+                    self.logger.warning("Order job failed.")
+                    self.logger.warning(e)
+                result = None
+            self.finished.put((callback, result))
+            if self.notify is not None:
+                self.notify()
+
+    def dispatch(self):
+        while True:
+            try:
+                callback, result = self.finished.get_nowait()
+            except queue.Empty:
+                return
+            callback(result)
@@ -0,0 +1,89 @@
+from decimal import Decimal
+import itertools
+import multiprocessing
+import os
+import pandas as pd
+import typing as t
+
+from .backtest import MockAPIManager
+from .backtest_runner import get_backtest_strategy, run_event_backtest, run_vectorized_backtest
+from .config import Config
+from .logger import Logger
+
+
+SWEEP_PARAMETERS = {
+    "SMA_PERIOD": int,
+    "SPOT_STOP_LOSS": lambda value: Decimal(str(value)),
+    "MARGIN_STOP_LOSS": lambda value: Decimal(str(value)),
+    "WORKING_BALANCE": lambda value: Decimal(str(value)),
+}
+
+# Worker process state, set by _init_worker once per process.
+_worker_logger: t.Optional[Logger] = None
+_worker_symbol_info: t.Optional[dict] = None
+
+
+def parameter_grid(grid: t.Dict[str, t.Sequence]) -> t.List[dict]:
+    """
+    Make all combinations of parameter values.
+    :param grid: dict {config parameter name: list of values}. Names must be in SWEEP_PARAMETERS.
+    :return: list of dicts {config parameter name: value}.
+    """
+    for name in grid:
+        if name not in SWEEP_PARAMETERS:
+            raise ValueError(f"{name} can't be swept. Use one of {', '.join(SWEEP_PARAMETERS)}.")
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _init_worker(symbol_info: dict):
+    global _worker_logger, _worker_symbol_info
+    _worker_logger = Logger("sweep", enable_notifications=False)
+    _worker_symbol_info = symbol_info
+
+
+def _run_case(case: dict) -> dict:
+    """
+    Run one backtest with config parameters from case. Candle data is memory-mapped from .npy cache,
+    so all workers read the same pages instead of parsing .csv files.
+    """
+    config = Config()
+    for name, value in case.items():
+        setattr(config, name, SWEEP_PARAMETERS[name](value))
+
+    if config.BACKTEST_ENGINE == "VECTORIZED" and config.MARKET_PLACE == "SPOT":
+        result = run_vectorized_backtest(config, _worker_logger, symbol_info=_worker_symbol_info)
+    else:
+        result = run_event_backtest(config, _worker_logger)
+
+    row = dict(case)
+    row.update(final_balance=float(result.portfolio_price),
+               total_profit=float(result.total_profit),
+               trades=len(result.trades),
+               max_drawdown=result.max_drawdown,
+               stop_reason=result.stop_reason)
+    return row
+
+
+def run_sweep(grid: t.Dict[str, t.Sequence], processes: t.Optional[int] = None) -> pd.DataFrame:
+    """
+    Run backtests for all parameter combinations on the process pool, one process per core by default.
+    :param grid: dict {config parameter name: list of values}.
+    :param processes: number of worker processes.
+    :return: DataFrame ranked by final balance.
+    """
+    config = Config()
+    logger = Logger("sweep", enable_notifications=False)
+    global_strategy = get_backtest_strategy(config)
+    # Mock downloads data and converts .csv files to .npy cache once, before workers map it.
+    mock_manager = MockAPIManager(config, logger, global_strategy, history_period=config.HISTORY_PERIOD_FOR_BACKTEST)
+    symbol_info = mock_manager.get_symbol_info(global_strategy.bid_symbol)
+
+    cases = parameter_grid(grid)
+    with multiprocessing.Pool(processes or os.cpu_count(), initializer=_init_worker,
+                              initargs=(symbol_info,)) as pool:
+        rows = list(pool.imap_unordered(_run_case, cases))
+
+    table = pd.DataFrame(rows, columns=list(grid) + ["final_balance", "total_profit", "trades", "max_drawdown",
+                                                     "stop_reason"])
+    return table.sort_values(["final_balance", "max_drawdown"], ascending=[False, True]).reset_index(drop=True)
@@ -0,0 +1,65 @@
+from collections import deque
+from decimal import Decimal
+import typing as t
+
+
+class RollingMean:
+    """
+    Mean of the last size values. Sum is updated on every append and kept in Decimal, so it's exact
+    and doesn't drift however long the window lives.
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self.values: t.Deque[Decimal] = deque()
+        self.total = Decimal(0)
+
+    def append(self, value: Decimal):
+        self.values.append(value)
+        self.total += value
+        if len(self.values) > self.size:
+            self.total -= self.values.popleft()
+
+    @property
+    def value(self) -> t.Union[Decimal, float]:
+        """
+        :return: Decimal mean, float NaN while window isn't full.
+        """
+        if len(self.values) < self.size:
+            return float("nan")
+        return self.total / self.size
+
+
+class RollingMax:
+    """
+    Max of the last size values. Monotonic deque keeps only values which can still become max,
+    so append is O(1) amortized and max is the first value.
+    """
+    def __init__(self, size: int):
+        self.size = size
+        # (value number, value)
+        self.candidates: t.Deque[t.Tuple[int, Decimal]] = deque()
+        self.count = 0
+
+    def _dominates(self, value: Decimal, candidate: Decimal) -> bool:
+        return value >= candidate
+
+    def append(self, value: Decimal):
+        candidates = self.candidates
+        while candidates and self._dominates(value, candidates[-1][1]):
+            candidates.pop()
+        candidates.append((self.count, value))
+        self.count += 1
+        if candidates[0][0] < self.count - self.size:
+            candidates.popleft()
+
+    @property
+    def value(self) -> Decimal:
+        return self.candidates[0][1]
+
+
+class RollingMin(RollingMax):
+    """
+    Min of the last size values.
+    """
+    def _dominates(self, value: Decimal, candidate: Decimal) -> bool:
+        return value <= candidate
@@ -0,0 +1,112 @@
+import threading
+import typing as t
+
+from .binance_api_manager import BinanceAPIManager
+from .binance_stream_manager import BinanceConnectionManager
+from .config import Config
+from .logger import Logger
+from .trader import GlobalStrategy
+from .trader_registry import TraderRegistry
+from db.connections import RedisConnection
+
+
+# Control event from ingest process to workers: close positions of all traders.
+CLOSE_POSITION_EVENT = "shard_close_position"
+USER_DATA_EVENTS = ("outboundAccountPosition", "executionReport")
+
+
+def assign_shards(pairs: t.List[t.Tuple[str, GlobalStrategy]],
+                  workers: int) -> t.List[t.List[t.Tuple[str, GlobalStrategy]]]:
+    """
+    Split trade pairs between worker processes. All traders of a symbol are in one worker, symbols are dealt to
+    workers one by one in config order.
+    :param pairs: list of tuple(market place, GlobalStrategy) from get_trade_pairs.
+    :param workers: number of worker processes.
+    :return: list of pairs for every worker. There are no empty workers, so it can be shorter than workers.
+    """
+    symbols = list(dict.fromkeys(global_strategy.bid_symbol for _, global_strategy in pairs))
+    shards = [[] for _ in range(min(workers, len(symbols)))]
+    shard_index = {symbol: index % workers for index, symbol in enumerate(symbols)}
+    for pair in pairs:
+        shards[shard_index[pair[1].bid_symbol]].append(pair)
+    return shards
+
+
+class ShardIngest(BinanceConnectionManager):
+    """
+    Websocket process of sharded mode. It has no traders: stream klines are put to queue of the worker, which owns
+    the symbol, user data events - to all workers. Redis tasks are taken here too.
+    """
+    latency_name = "ingest"
+
+    def __init__(self, api_manager: BinanceAPIManager, config: Config, logger: Logger, db: RedisConnection,
+                 shards: t.List[t.Tuple[t.List[t.Tuple[str, GlobalStrategy]], t.Any]]):
+        """
+        :param shards: list of tuple(pairs of worker, worker stream queue).
+        """
+        self.shard_queues = [stream_queue for _, stream_queue in shards]
+        self.symbol_queues = {global_strategy.bid_symbol: stream_queue
+                              for pairs, stream_queue in shards for _, global_strategy in pairs}
+        # Empty registry, it only remembers the last kline time of symbols.
+        super().__init__(api_manager, config, logger, TraderRegistry(), db)
+
+    def stream_symbols(self) -> t.List[str]:
+        return list(self.symbol_queues)
+
+    def process_stream_data(self, stream_data: dict):
+        kline_data = stream_data.get("kline", None)
+        if kline_data:
+            stream_queue = self.symbol_queues.get(stream_data["symbol"])
+            # Traders use only the first update of a minute and closed klines, the rest isn't sent between
+            # processes.
+            if stream_queue is not None and (
+                    self.is_new_kline(stream_data["symbol"], kline_data["kline_start_time"]) or
+                    kline_data["is_closed"]):
+                stream_queue.put(stream_data)
+        elif stream_data.get("event_type") in USER_DATA_EVENTS:
+            for stream_queue in self.shard_queues:
+                stream_queue.put(stream_data)
+
+    def close_position(self):
+        for stream_queue in self.shard_queues:
+            stream_queue.put({"event_type": CLOSE_POSITION_EVENT})
+
+
+class ShardWorker(BinanceConnectionManager):
+    """
+    Worker process of sharded mode. It owns traders of its symbols and takes their stream data from ingest process
+    queue instead of websocket, so slow trader holds only symbols of its worker.
+    """
+    def __init__(self, api_manager: BinanceAPIManager, config: Config, logger: Logger, traders: TraderRegistry,
+                 db: RedisConnection, stream_queue, index: int = 0):
+        """
+        :param stream_queue: multiprocessing queue, which ingest process fills.
+        :param index: worker number, it's used for latency hash name.
+        """
+        self.shard_queue = stream_queue
+        self.latency_name = f"shard_{index}"
+        self.reader: t.Optional[threading.Thread] = None
+        super().__init__(api_manager, config, logger, traders, db)
+
+    def _connect_to_stream(self):
+        # Stream data comes from ingest process. Reader thread hands it to the event loop like websocket does.
+        if self.reader is None:
+            self.reader = threading.Thread(target=self._read_queue, name="shard-reader", daemon=True)
+            self.reader.start()
+
+    def _read_queue(self):
+        while True:
+            self._receive_stream_data(self.shard_queue.get())
+
+    def _background_tasks(self) -> list:
+        # Tasks and stream reconnects are handled by ingest process.
+        return [self._report_queue_stats(), self._publish_latency()]
+
+    def close(self):
+        pass
+
+    def process_stream_data(self, stream_data: dict):
+        if stream_data.get("event_type") == CLOSE_POSITION_EVENT:
+            self.close_position()
+        else:
+            super().process_stream_data(stream_data)
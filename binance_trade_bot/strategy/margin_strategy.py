@@ -1,11 +1,15 @@
-import time
 import typing as t
 from decimal import Decimal
 
+from binance_trade_bot.exchange_info import get_lot_size, get_min_notional
+from binance_trade_bot.fixed_point import FixedPointScale
+from binance_trade_bot.strategy_rules import MARGIN_RULES
 from binance_trade_bot.trader import Trader
 
 
 class MarginTrader(Trader):
+    rules = MARGIN_RULES
+
     def __str__(self):
         return "MARGIN"
 
@@ -59,11 +63,14 @@ class MarginTrader(Trader):
         self.portfolio.start_balance = (bridge_coin + (target_coin * self.minute_candle_price) -
                                         (borrowed_coin * self.minute_candle_price))
 
-    def update_stop_loss(self):
+    def update_stop_loss(self, price: t.Optional[Decimal] = None):
         """
         Update sell price for stop loosing money.
+        :param price: price, from which stop loss is counted. Current minute price if None.
         """
-        self.portfolio.stop_loss = self.minute_candle_price * self.config.MARGIN_STOP_LOSS
+        if price is None:
+            price = self.minute_candle_price
+        self.portfolio.stop_loss = price * self.config.MARGIN_STOP_LOSS
 
     def update_balance(self):
         """
@@ -71,8 +78,10 @@ class MarginTrader(Trader):
         """
         bridge_coin = self.global_strategy.bridge_coin
         target_coin = self.global_strategy.target_coin
-        self.portfolio.balance = self.manager.check_margin_balance(bridge_coin, target_coin)
-        self.update_current_portfolio_price()
+        balance = self.manager.check_margin_balance(bridge_coin, target_coin)
+        with self.state_lock:
+            self.portfolio.balance = balance
+            self.update_current_portfolio_price()
 
     def update_account_status(self):
         """
@@ -85,8 +94,10 @@ class MarginTrader(Trader):
         target_borrowed = self.portfolio.balance[target_coin]["borrowed"]
 
         symbol_info = self.manager.get_symbol_info(self.global_strategy.bid_symbol)
-        self.lot_size = Decimal(symbol_info["filters"][2]["stepSize"])
-        self.min_notional = Decimal(symbol_info["filters"][3]["minNotional"])
+        self.lot_size = get_lot_size(symbol_info)
+        self.min_notional = get_min_notional(symbol_info)
+        if self.config.FIXED_POINT:
+            self.fixed_point = FixedPointScale.from_symbol_info(symbol_info)
 
         if self.portfolio.balance[bridge_coin]["free"] == 0 and target_borrowed == 0:
             self.logger.info("No cash on MARGIN balance. You need to put some money here.")
@@ -101,12 +112,37 @@ class MarginTrader(Trader):
             self.logger.info("Something isn't normal. Check balance.")
             self.set_working_balance()
 
-    def update_strategy(self):
+    def update_strategy(self, price: t.Optional[Decimal] = None):
         """
         Get new strategy symbol from generator and update target order.
+        :param price: fill price of the order, which started strategy. Current minute price if None.
         """
         self.current_strategy = next(self.strategy_generator)
-        self.update_stop_loss()
+        self.update_stop_loss(price)
+
+    def fixed_point_thresholds(self):
+        ma_ticks = self.fixed_point.floor_ticks(self.moving_average)
+        if ma_ticks is None:
+            return None
+        return (self.fixed_point.floor_ticks(self.max_period_price), ma_ticks,
+                self.fixed_point.ceil_ticks(self.portfolio.stop_loss))
+
+    def fixed_point_decision(self) -> bool:
+        price = self.minute_candle_ticks
+        thresholds = self.get_fixed_point_thresholds()
+        if price is None or thresholds is None:
+            return True
+        max_ticks, ma_ticks, stop_loss_ticks = thresholds
+
+        if self.current_strategy == "INITIAL":
+            if self.portfolio.current_portfolio_price <= self.config.MIN_PORTFOLIO_PRICE:
+                return True
+            return price > max_ticks
+        if self.current_strategy in self.config.STRATEGY_DICT:
+            if self.portfolio.balance[self.global_strategy.target_coin]["borrowed"] < self.lot_size:
+                return True
+            return price >= stop_loss_ticks or price <= ma_ticks
+        return False
 
     def use_strategy(self, data: dict, current_time: int):
         """
@@ -116,28 +152,30 @@ class MarginTrader(Trader):
         """
         super().use_strategy(data, current_time)
         self.portfolio.profit = 0
-        self.minute_candle_price = Decimal(data["open_price"])
+        self.update_minute_candle_price(data["open_price"])
+        if self.order_pending:
+            return self.default_order
 
         if self.current_strategy is None:
             self.set_strategy()
             self.make_report(order=self.default_order, initial=True)
 
+        if self.fixed_point is not None and not self.fixed_point_decision():
+            return self.default_order
+
         if self.current_strategy == "INITIAL":
             if self.portfolio.current_portfolio_price > self.config.MIN_PORTFOLIO_PRICE:
-                if self.minute_candle_price > self.max_period_price:
+                if self.rules.entry_tick(self):
                     if self.check_for_min_notional() is False:
                         self.logger.warning(f"We don't have enough money in MARGIN working balance. "
                                             f"Working balance is {self.portfolio.working_balance}")
                         return False
-                    order = self.sell_all(self.manager.cancel_margin_order)
-                    if order is None:
-                        self.logger.info("Failed to loan coin.")
-                        return self.default_order
-
-                    self.update_balance()
-                    self.update_strategy()
-                    self.portfolio.last_price = Decimal(order["executedQty"]) * Decimal(order["fills"][0]["price"])
-                    return order
+                    # Loan is taken now, order job doesn't read prices, which stream processor changes.
+                    price = self.minute_candle_price
+                    loan_quantity = self.portfolio.working_balance / price
+                    return self.execute_order(lambda: self.sell_all(self.manager.cancel_margin_order,
+                                                                    loan_quantity=loan_quantity, price=price),
+                                              self.complete_sell)
             else:
                 self.logger.info("You've got not enough money for MARGIN trade. You have only %s" %
                                  self.portfolio.current_portfolio_price)
@@ -150,22 +188,47 @@ class MarginTrader(Trader):
 
                 return self.default_order
 
-            if (self.minute_candle_price >= self.portfolio.stop_loss or
-                    self.minute_candle_price <= self.moving_average):
-                order = self.buy(cancel_func=self.manager.cancel_margin_order,
-                                 quantity=self.portfolio.balance[self.global_strategy.target_coin]["borrowed"])
-                if order is None:
-                    self.logger.info("Failed to repay loan.")
-                    return self.default_order
-
-                self.portfolio.profit = self.portfolio.last_price - (Decimal(order["executedQty"]) *
-                                                                     Decimal(order["fills"][0]["price"]))
-                self.portfolio.total_profit = self.calculate_total_profit()
-                self._reboot_strategy()
-                return order
+            if self.rules.close_tick(self):
+                quantity = self.portfolio.balance[self.global_strategy.target_coin]["borrowed"]
+                return self.execute_order(lambda: self.buy(cancel_func=self.manager.cancel_margin_order,
+                                                           quantity=quantity),
+                                          self.complete_buy)
 
         return self.default_order
 
+    def complete_sell(self, order: t.Optional[dict]) -> dict:
+        """
+        Start strategy after loan and sell order.
+        :param order: sell response or None, if loan or sell failed.
+        :return: response for report.
+        """
+        if order is None:
+            self.logger.info("Failed to loan coin.")
+            return self.default_order
+
+        self.update_balance()
+        # Order is completed later than decision, stop loss is counted from the fill price, not from current price.
+        fill_price = Decimal(order["fills"][0]["price"])
+        self.update_strategy(fill_price)
+        self.portfolio.last_price = Decimal(order["executedQty"]) * fill_price
+        return order
+
+    def complete_buy(self, order: t.Optional[dict]) -> dict:
+        """
+        Count profit and reboot strategy after buy order and loan repay.
+        :param order: buy response or None, if buy or repay failed.
+        :return: response for report.
+        """
+        if order is None:
+            self.logger.info("Failed to repay loan.")
+            return self.default_order
+
+        self.portfolio.profit = self.portfolio.last_price - (Decimal(order["executedQty"]) *
+                                                             Decimal(order["fills"][0]["price"]))
+        self.portfolio.total_profit = self.calculate_total_profit()
+        self._reboot_strategy()
+        return order
+
     def buy(self, cancel_func, quantity: t.Union[Decimal, None] = None, margin: bool = True, *args, **kwarg):
         """
         Buy fixed quantity of coins, update current strategy and portfolio balance.
@@ -179,7 +242,7 @@ class MarginTrader(Trader):
 
         self.update_balance()
         if self.portfolio.balance[self.global_strategy.target_coin]["free"] < self.lot_size:
-            time.sleep(1)
+            self.clock.sleep(1)
             self.logger.info("Margin target was less than lot size. Updating balance.")
             self.update_balance()
         target_coin = self.portfolio.balance[self.global_strategy.target_coin]["free"]
@@ -192,14 +255,14 @@ class MarginTrader(Trader):
             repay = self.manager.repay_loan(symbol=self.global_strategy.target_coin,
                                             quantity=loan_quantity,
                                             lot_size=self.lot_size)
-            time.sleep(1)
+            self.clock.sleep(1)
             self.update_balance()
             if repay is None and borrowed_coin > self.min_notional:
                 count = 0
                 while count < 10:
                     count += 1
                     self.logger.info("Repay is None. Trying to repay loan. Attempt %s/10" % count)
-                    time.sleep(10)
+                    self.clock.sleep(self.retry_delay(count))
                     repay = self.manager.repay_loan(symbol=self.global_strategy.target_coin,
                                                     quantity=loan_quantity,
                                                     lot_size=self.lot_size)
@@ -217,23 +280,29 @@ class MarginTrader(Trader):
 
         return order
 
-    def sell_all(self, cancel_func, margin: bool = True, *args, **kwargs):
+    def sell_all(self, cancel_func, margin: bool = True, loan_quantity: t.Optional[Decimal] = None,
+                 price: t.Optional[Decimal] = None, *args, **kwargs):
         """
-        Sell all coins, and close trade.
+        Loan coins and sell all of them.
+        :param loan_quantity: coins to loan, counted at decision time. Working balance for price if None.
+        :param price: minute price of the decision. Current minute price if None.
         """
+        if price is None:
+            price = self.minute_candle_price
+        if loan_quantity is None:
+            loan_quantity = self.portfolio.working_balance / price
         borrowed_balance = self.portfolio.balance[self.global_strategy.target_coin]["borrowed"]
-        loan_quantity = self.portfolio.working_balance / self.minute_candle_price
         loan = self.manager.get_loan(symbol=self.global_strategy.target_coin,
                                      quantity=loan_quantity,
                                      lot_size=self.lot_size)
-        time.sleep(1)
+        self.clock.sleep(1)
         self.update_balance()
         if loan is None and self.portfolio.balance[self.global_strategy.target_coin]["borrowed"] == 0:
             count = 0
             while loan is None and count < 10:
                 count += 1
                 self.logger.info("Order is None. Trying to resell coin. Attempt %s/10" % count)
-                time.sleep(1)
+                self.clock.sleep(self.retry_delay(count))
                 loan = self.manager.sell(symbol=self.global_strategy.target_coin,
                                          quantity=loan_quantity,
                                          lot_size=self.lot_size)
@@ -245,17 +314,21 @@ class MarginTrader(Trader):
             return None
         order = super().sell_all(cancel_func, margin)
         self.update_balance()
-        if (self.portfolio.balance[self.global_strategy.target_coin]["free"] *
-           self.minute_candle_price) > self.min_notional:
-            time.sleep(1)
+        if self.portfolio.balance[self.global_strategy.target_coin]["free"] * price > self.min_notional:
+            self.clock.sleep(1)
             order = super().sell_all(cancel_func, margin)
         return order
 
-    def close_trades(self):
+    def has_position(self) -> bool:
+        borrowed_coin = self.portfolio.balance[self.global_strategy.target_coin]["borrowed"]
+        return (Decimal(borrowed_coin) * self.minute_candle_price) >= self.min_notional
+
+    def close_position(self) -> t.Optional[dict]:
         """
-        Sell all target coins if they are.
+        Buy borrowed coins and repay loan if there is a loan.
         """
-        borrowed_coin = self.portfolio.balance[self.global_strategy.target_coin]["borrowed"]
-        if (Decimal(borrowed_coin) * self.minute_candle_price) >= self.min_notional:
-            self.logger.info("Closing open MARGIN target coin position.")
-            self.buy(self.manager.cancel_orde, borrowed_coin)
+        if not self.has_position():
+            return None
+        self.logger.info("Closing open MARGIN target coin position.")
+        return self.buy(self.manager.cancel_margin_order,
+                        self.portfolio.balance[self.global_strategy.target_coin]["borrowed"])
@@ -1,9 +1,8 @@
-from operator import itemgetter
 from .spot_strategy import SpotTrader
 from .margin_strategy import MarginTrader
 
 
 class NewMinMaxMarginTrader(SpotTrader):
-    def update_max_and_min_period_price(self):
-        self.max_period_price = max(self.period_candle_price, key=itemgetter(3))[3]
-        self.min_period_price = min(self.period_candle_price, key=itemgetter(2))[2]
+    # Period max is taken from high prices and min from low prices.
+    MAX_PRICE_FIELD = 3
+    MIN_PRICE_FIELD = 2
@@ -1,11 +1,16 @@
-import time
 from decimal import Decimal
+import typing as t
 
 from binance_trade_bot.trader import Trader, GlobalStrategy, Portfolio
 from binance_trade_bot.binance_api_manager import BinanceAPIManager
+from binance_trade_bot.exchange_info import get_lot_size, get_min_notional
+from binance_trade_bot.fixed_point import FixedPointScale
+from binance_trade_bot.strategy_rules import SPOT_RULES
 
 
 class SpotTrader(Trader):
+    rules = SPOT_RULES
+
     def __str__(self):
         return "SPOT"
 
@@ -37,27 +42,52 @@ class SpotTrader(Trader):
             self.portfolio.last_price = target_coin * self.minute_candle_price
             self.update_strategy()
 
-    def update_strategy(self):
+    def update_strategy(self, price: t.Optional[Decimal] = None):
         """
         Get new strategy symbol from generator and update target order.
+        :param price: fill price of the order, which started strategy. Current minute price if None.
         """
         self.current_strategy = next(self.strategy_generator)
-        self.update_stop_loss()
+        self.update_stop_loss(price)
 
-    def update_stop_loss(self):
+    def update_stop_loss(self, price: t.Optional[Decimal] = None):
         """
         Update sell price for stop loosing money.
+        :param price: price, from which stop loss is counted. Current minute price if None.
         """
-        self.portfolio.stop_loss = self.minute_candle_price * self.config.SPOT_STOP_LOSS
+        if price is None:
+            price = self.minute_candle_price
+        self.portfolio.stop_loss = price * self.config.SPOT_STOP_LOSS
 
     def update_balance(self):
         """
-        Update bridge and target coin amount after successful order.
-        """
-        bridge_coin = self.global_strategy.bridge_coin
-        target_coin = self.global_strategy.target_coin
-        self.portfolio.balance = self.manager.check_balance(bridge_coin, target_coin)
-        self.update_current_portfolio_price()
+        Update bridge and target coin amount after successful order. Account is requested only if balance ledger
+        needs reconcile, otherwise ledger already has balance after order fills and stream events.
+        """
+        now = self.clock.time()
+        account_balance = None
+        if self.balance_ledger.needs_reconcile(now):
+            account_balance = self.manager.check_balance(self.global_strategy.bridge_coin,
+                                                         self.global_strategy.target_coin)
+        with self.state_lock:
+            if account_balance is not None:
+                self.balance_ledger.reconcile(account_balance, now)
+            self.portfolio.balance = self.balance_ledger.balance
+            self.update_current_portfolio_price()
+
+    def apply_order(self, order: dict):
+        with self.state_lock:
+            self.balance_ledger.apply_order(order, self.global_strategy.bridge_coin,
+                                            self.global_strategy.target_coin)
+
+    def apply_user_data(self, stream_data: dict):
+        with self.state_lock:
+            if stream_data["event_type"] == "outboundAccountPosition":
+                self.balance_ledger.apply_account_position(stream_data)
+            elif (stream_data["event_type"] == "executionReport" and
+                  stream_data["symbol"] == self.global_strategy.bid_symbol):
+                self.balance_ledger.apply_execution_report(stream_data, self.global_strategy.bridge_coin,
+                                                           self.global_strategy.target_coin)
 
     def update_account_status(self):
         """
@@ -69,8 +99,10 @@ class SpotTrader(Trader):
         target_coin = self.global_strategy.target_coin
 
         symbol_info = self.manager.get_symbol_info(self.global_strategy.bid_symbol)
-        self.lot_size = Decimal(symbol_info["filters"][2]["stepSize"])
-        self.min_notional = Decimal(symbol_info["filters"][3]["minNotional"])
+        self.lot_size = get_lot_size(symbol_info)
+        self.min_notional = get_min_notional(symbol_info)
+        if self.config.FIXED_POINT:
+            self.fixed_point = FixedPointScale.from_symbol_info(symbol_info)
 
         if self.portfolio.balance[bridge_coin]["free"] == 0 and self.portfolio.balance[target_coin]["free"] == 0:
             self.logger.info("No cash on SPOT balance. You need to put some money here.")
@@ -82,6 +114,31 @@ class SpotTrader(Trader):
         else:
             self.logger.info("Something goes wrong: SPOT balance is less then zero.")
 
+    def fixed_point_thresholds(self):
+        ma_ticks = self.fixed_point.floor_ticks(self.moving_average)
+        if ma_ticks is None:
+            return None
+        return (self.fixed_point.ceil_ticks(self.max_period_price), ma_ticks,
+                self.fixed_point.floor_ticks(self.portfolio.stop_loss))
+
+    def fixed_point_decision(self) -> bool:
+        price = self.minute_candle_ticks
+        past_price = self.past_minute_candle_ticks
+        thresholds = self.get_fixed_point_thresholds()
+        if price is None or past_price is None or thresholds is None:
+            return True
+        max_ticks, ma_ticks, stop_loss_ticks = thresholds
+
+        if self.current_strategy == "INITIAL":
+            if self.portfolio.current_portfolio_price <= self.config.MIN_PORTFOLIO_PRICE:
+                return True
+            return max_ticks > past_price > ma_ticks and max_ticks > price > past_price
+        if self.current_strategy in self.config.STRATEGY_DICT:
+            if self.portfolio.balance[self.global_strategy.target_coin]["free"] < self.lot_size:
+                return True
+            return price >= max_ticks or price <= stop_loss_ticks
+        return False
+
     def use_strategy(self, data: dict, current_time: int):
         """
         Make a cell or buy decision based on current data.
@@ -90,34 +147,28 @@ class SpotTrader(Trader):
         """
         super().use_strategy(data, current_time)
         self.portfolio.profit = 0
-        if self.minute_candle_price == 0:
-            self.minute_candle_price = Decimal(data["open_price"])
-            self.past_minute_candle_price = self.minute_candle_price
-        else:
-            self.past_minute_candle_price = self.minute_candle_price
-            self.minute_candle_price = Decimal(data["open_price"])
+        self.update_minute_candle_price(data["open_price"])
+        if self.order_pending:
+            return self.default_order
 
         if self.current_strategy is None:
             self.set_strategy()
             self.make_report(order=self.default_order, initial=True)
 
+        if self.fixed_point is not None and not self.fixed_point_decision():
+            return self.default_order
+
         if self.current_strategy == "INITIAL":
             if self.portfolio.current_portfolio_price > self.config.MIN_PORTFOLIO_PRICE:
-                if ((self.max_period_price > self.past_minute_candle_price > self.moving_average) and
-                        (self.max_period_price > self.minute_candle_price > self.past_minute_candle_price)):
+                if self.rules.entry_tick(self):
                     more_than_min_notional = self.check_for_min_notional()
                     if more_than_min_notional is False:
                         self.logger.warning("We don't have enough money in SPOT working balance.")
                         return False
-                    order = self.buy(self.manager.cancel_order)
-                    if order is None:
-                        self.logger.info("SPOT Failed to buy coin.")
-                        return self.default_order
-
-                    self.update_balance()
-                    self.update_strategy()
-                    self.portfolio.last_price = Decimal(order["executedQty"]) * Decimal(order["fills"][0]["price"])
-                    return order
+                    # Quantity is taken now, order job doesn't read prices, which stream processor changes.
+                    quantity = self.portfolio.working_balance / self.minute_candle_price
+                    return self.execute_order(lambda: self.buy(self.manager.cancel_order, quantity),
+                                              self.complete_buy)
             else:
                 self.logger.info("You've got not enough money for SPOT trade. You have only %s" %
                                  self.portfolio.current_portfolio_price)
@@ -126,30 +177,56 @@ class SpotTrader(Trader):
                 self.logger.info("We have SPOT strategy, but don't have coins. Rebooting strategy.")
                 self._reboot_strategy()
 
-            elif (((self.minute_candle_price >= self.max_period_price) or
-                  (self.minute_candle_price <= self.portfolio.stop_loss)) and
+            elif (self.rules.close_tick(self) and
                     self.portfolio.balance[self.global_strategy.target_coin]["free"] > self.lot_size):
 
-                order = self.sell_all(self.manager.cancel_order)
-                if order is None:
-                    self.logger.info("SPOT Failed to sell coin.")
-                    return self.default_order
-
-                self.portfolio.profit = (Decimal(order["executedQty"]) *
-                                         Decimal(order["fills"][0]["price"])) - self.portfolio.last_price
-                self.portfolio.total_profit = self.calculate_total_profit()
-                self._reboot_strategy()
-                return order
+                return self.execute_order(lambda: self.sell_all(self.manager.cancel_order), self.complete_sell)
 
         return self.default_order
 
-    def close_trades(self):
+    def complete_buy(self, order: t.Optional[dict]) -> dict:
+        """
+        Start strategy after buy order.
+        :param order: buy response or None, if buy failed.
+        :return: response for report.
+        """
+        if order is None:
+            self.logger.info("SPOT Failed to buy coin.")
+            return self.default_order
+
+        self.update_balance()
+        # Order is completed later than decision, stop loss is counted from the fill price, not from current price.
+        fill_price = Decimal(order["fills"][0]["price"])
+        self.update_strategy(fill_price)
+        self.portfolio.last_price = Decimal(order["executedQty"]) * fill_price
+        return order
+
+    def complete_sell(self, order: t.Optional[dict]) -> dict:
+        """
+        Count profit and reboot strategy after sell order.
+        :param order: sell response or None, if sell failed.
+        :return: response for report.
+        """
+        if order is None:
+            self.logger.info("SPOT Failed to sell coin.")
+            return self.default_order
+
+        self.portfolio.profit = (Decimal(order["executedQty"]) *
+                                 Decimal(order["fills"][0]["price"])) - self.portfolio.last_price
+        self.portfolio.total_profit = self.calculate_total_profit()
+        self._reboot_strategy()
+        return order
+
+    def has_position(self) -> bool:
+        return self.portfolio.balance[self.global_strategy.target_coin]["free"] > self.lot_size
+
+    def close_position(self) -> t.Optional[dict]:
         """
         Sell all target coins if they are.
         """
-        if self.portfolio.balance[self.global_strategy.target_coin]["free"] > self.lot_size:
-            self.logger.info("Closing open SPOT target coin position.")
-            time.sleep(1)
-            self.update_balance()
-            order = self.sell_all(self.manager.cancel_order)
-            self.make_report(order)
+        if not self.has_position():
+            return None
+        self.logger.info("Closing open SPOT target coin position.")
+        self.clock.sleep(1)
+        self.update_balance()
+        return self.sell_all(self.manager.cancel_order)
@@ -0,0 +1,212 @@
+from decimal import Decimal
+import operator
+import numpy as np
+import typing as t
+
+
+def _exact(value) -> Decimal:
+    """
+    Return decimal value of the price that was parsed into float from decimal string.
+    """
+    return Decimal(str(value))
+
+
+class SeriesArrays:
+    """
+    Indicator series of backtest: one array value per minute candle, or one Decimal for the whole range (stop loss
+    of the current trade). Exact functions give Decimal value, which float array value was rounded from, if it isn't
+    float of a price string (moving average).
+    Series of a candle range keeps full arrays and slices only arrays, which conditions take, so a short range of
+    a long backtest costs the same as a full one.
+    """
+    def __init__(self, arrays: t.Dict[str, t.Union[np.ndarray, Decimal]],
+                 exact: t.Optional[t.Dict[str, t.Callable[[int], Decimal]]] = None, offset: int = 0,
+                 end: t.Optional[int] = None):
+        """
+        :param arrays: full series by name.
+        :param exact: Decimal value functions by name, they take full series index.
+        :param offset: index of the first candle of the range in full series.
+        :param end: index after the last candle of the range. The end of the shortest array if None.
+        """
+        self.arrays = arrays
+        self.exact_functions = exact or {}
+        self.offset = offset
+        if end is None:
+            end = min(len(value) for value in arrays.values() if not isinstance(value, Decimal))
+        self.end = end
+
+    def values(self, name: str) -> t.Union[np.ndarray, float]:
+        value = self.arrays[name]
+        if isinstance(value, Decimal):
+            return float(value)
+        return value[self.offset:self.end]
+
+    def exact(self, name: str, index: int) -> Decimal:
+        value = self.arrays[name]
+        if isinstance(value, Decimal):
+            return value
+        if name in self.exact_functions:
+            return self.exact_functions[name](self.offset + index)
+        return _exact(value[self.offset + index])
+
+    def rounded(self, name: str) -> bool:
+        """
+        :return: True if float value can be rounded from Decimal value, so equal floats aren't always equal Decimals.
+        Floats of price strings are equal only for equal prices.
+        """
+        return isinstance(self.arrays[name], Decimal) or name in self.exact_functions
+
+    def slice(self, start: int, end: int, **values: Decimal) -> "SeriesArrays":
+        """
+        :param values: more values for the whole range, for example stop loss of a trade.
+        :return: series of candles from start to end index.
+        """
+        arrays = dict(self.arrays, **values) if values else self.arrays
+        return SeriesArrays(arrays, self.exact_functions, self.offset + start, min(self.offset + end, self.end))
+
+    def __len__(self) -> int:
+        return self.end - self.offset
+
+
+class Condition:
+    """
+    Rule condition. It's evaluated on trader for the current minute or on the whole backtest series.
+    """
+    def compile_tick(self) -> t.Callable[[t.Any], bool]:
+        """
+        :return: function, which checks condition on trader state.
+        """
+        raise NotImplementedError
+
+    def evaluate_array(self, series: SeriesArrays) -> np.ndarray:
+        """
+        :return: bool array, condition for every candle of series.
+        """
+        raise NotImplementedError
+
+    def __and__(self, other: "Condition") -> "Condition":
+        return AllOf(self, other)
+
+    def __or__(self, other: "Condition") -> "Condition":
+        return AnyOf(self, other)
+
+
+class Series:
+    """
+    Named indicator. getter takes its Decimal value from trader, name is the key of backtest array.
+    """
+    def __init__(self, name: str, getter: t.Callable[[t.Any], Decimal]):
+        self.name = name
+        self.getter = getter
+
+    def __gt__(self, other: "Series") -> Condition:
+        return Compare(self, operator.gt, other)
+
+    def __ge__(self, other: "Series") -> Condition:
+        return Compare(self, operator.ge, other)
+
+    def __lt__(self, other: "Series") -> Condition:
+        return Compare(self, operator.lt, other)
+
+    def __le__(self, other: "Series") -> Condition:
+        return Compare(self, operator.le, other)
+
+
+class Compare(Condition):
+    """
+    Comparison of two series.
+    """
+    def __init__(self, left: Series, compare: t.Callable[[t.Any, t.Any], t.Any], right: Series):
+        self.left = left
+        self.compare = compare
+        self.right = right
+
+    def compile_tick(self) -> t.Callable[[t.Any], bool]:
+        left, compare, right = self.left.getter, self.compare, self.right.getter
+        return lambda trader: compare(left(trader), right(trader))
+
+    def evaluate_array(self, series: SeriesArrays) -> np.ndarray:
+        left = series.values(self.left.name)
+        right = series.values(self.right.name)
+        if not isinstance(left, np.ndarray) and not isinstance(right, np.ndarray):
+            # Both values are the same for the whole range.
+            return np.full(len(series), self.compare(series.exact(self.left.name, 0),
+                                                     series.exact(self.right.name, 0)))
+        result = self.compare(left, right)
+        if series.rounded(self.left.name) or series.rounded(self.right.name):
+            # Rounding to float keeps order, so float comparison is exact except for equal values. Compare them
+            # with Decimal, as trader does.
+            for index in (left == right).nonzero()[0].tolist():
+                result[index] = self.compare(series.exact(self.left.name, index),
+                                             series.exact(self.right.name, index))
+        return result
+
+
+class AllOf(Condition):
+    """
+    All conditions are true.
+    """
+    def __init__(self, *conditions: Condition):
+        self.conditions = conditions
+
+    def compile_tick(self) -> t.Callable[[t.Any], bool]:
+        checks = [condition.compile_tick() for condition in self.conditions]
+        return lambda trader: all(check(trader) for check in checks)
+
+    def evaluate_array(self, series: SeriesArrays) -> np.ndarray:
+        result = self.conditions[0].evaluate_array(series)
+        for condition in self.conditions[1:]:
+            result &= condition.evaluate_array(series)
+        return result
+
+
+class AnyOf(Condition):
+    """
+    At least one of conditions is true.
+    """
+    def __init__(self, *conditions: Condition):
+        self.conditions = conditions
+
+    def compile_tick(self) -> t.Callable[[t.Any], bool]:
+        checks = [condition.compile_tick() for condition in self.conditions]
+        return lambda trader: any(check(trader) for check in checks)
+
+    def evaluate_array(self, series: SeriesArrays) -> np.ndarray:
+        result = self.conditions[0].evaluate_array(series)
+        for condition in self.conditions[1:]:
+            result |= condition.evaluate_array(series)
+        return result
+
+
+PRICE = Series("price", lambda trader: trader.minute_candle_price)
+PAST_PRICE = Series("past_price", lambda trader: trader.past_minute_candle_price)
+MOVING_AVERAGE = Series("moving_average", lambda trader: trader.moving_average)
+MAX_PRICE = Series("max_price", lambda trader: trader.max_period_price)
+MIN_PRICE = Series("min_price", lambda trader: trader.min_period_price)
+STOP_LOSS = Series("stop_loss", lambda trader: trader.portfolio.stop_loss)
+
+
+class StrategyRules:
+    """
+    Entry, exit and stop conditions of strategy. Trader checks them with compiled tick functions, vectorized
+    backtest - on arrays, so both make the same decisions.
+    """
+    def __init__(self, entry: Condition, exit: Condition, stop: Condition):
+        self.entry = entry
+        self.exit = exit
+        self.stop = stop
+        self.entry_tick = entry.compile_tick()
+        # Position is closed on exit or stop condition.
+        self.close = exit | stop
+        self.close_tick = self.close.compile_tick()
+
+
+# Buy when price grows above moving average under period max. Sell on period max or stop loss.
+SPOT_RULES = StrategyRules(entry=(MAX_PRICE > PAST_PRICE) & (PAST_PRICE > MOVING_AVERAGE) &
+                           (MAX_PRICE > PRICE) & (PRICE > PAST_PRICE),
+                           exit=PRICE >= MAX_PRICE,
+                           stop=PRICE <= STOP_LOSS)
+# Loan and sell when price breaks period max. Buy back on moving average or stop loss.
+MARGIN_RULES = StrategyRules(entry=PRICE > MAX_PRICE,
+                             exit=PRICE <= MOVING_AVERAGE,
+                             stop=PRICE >= STOP_LOSS)
@@ -0,0 +1,135 @@
+import asyncio
+from collections import OrderedDict
+import itertools
+import threading
+import typing as t
+
+
+class CoalescingQueue:
+    """
+    Bounded queue between websocket threads and event loop of stream processor. Kline update replaces waiting update
+    of the same symbol and minute, so a symbol has at most one message per minute in the queue. When the queue is
+    full, the oldest unfinished kline update is dropped. User data events are never replaced or dropped.
+    put() can be called from any thread, get() - only in the event loop.
+    """
+    def __init__(self, maxsize: int, loop: asyncio.AbstractEventLoop):
+        self.maxsize = maxsize
+        self.loop = loop
+        self.items: "OrderedDict[t.Hashable, dict]" = OrderedDict()
+        # Start time of the newest kline, which was put to the queue, by symbol.
+        self.latest_kline_time: t.Dict[str, int] = {}
+        self.coalesced = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.ready = asyncio.Event()
+        # Only one wake up callback waits in the loop, so stalled loop doesn't collect callbacks.
+        self.wake_pending = False
+        self.event_keys = itertools.count()
+
+    def put(self, stream_data: dict):
+        """
+        :param stream_data: UnicornFy stream data.
+        """
+        with self.lock:
+            kline_data = stream_data.get("kline", None)
+            if kline_data:
+                symbol = stream_data["symbol"]
+                key = (symbol, kline_data["kline_start_time"])
+                if kline_data["kline_start_time"] > self.latest_kline_time.get(symbol, 0):
+                    self.latest_kline_time[symbol] = kline_data["kline_start_time"]
+                queued = self.items.get(key)
+                if queued is not None:
+                    self.coalesced += 1
+                    # Closed kline is final, late update of the same minute doesn't replace it.
+                    if not queued["kline"]["is_closed"]:
+                        self.items[key] = stream_data
+                    return
+            else:
+                key = next(self.event_keys)
+
+            if len(self.items) >= self.maxsize:
+                self._drop()
+            self.items[key] = stream_data
+            if self.wake_pending:
+                return
+            self.wake_pending = True
+        try:
+            self.loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            # Loop was closed after shutdown.
+            pass
+
+    def _drop(self):
+        closed_key = None
+        for key, stream_data in self.items.items():
+            kline_data = stream_data.get("kline", None)
+            if kline_data is None:
+                continue
+            if not kline_data["is_closed"]:
+                del self.items[key]
+                self.dropped += 1
+                return
+            if closed_key is None:
+                closed_key = key
+        # Only closed klines and events are waiting. Missing period candle is taken from REST API later.
+        if closed_key is not None:
+            del self.items[closed_key]
+            self.dropped += 1
+
+    def _wake(self):
+        with self.lock:
+            self.wake_pending = False
+        self.ready.set()
+
+    async def get(self) -> dict:
+        """
+        :return: the oldest message of the queue. Waits for it, if the queue is empty.
+        """
+        while True:
+            with self.lock:
+                if self.items:
+                    return self.items.popitem(last=False)[1]
+                self.ready.clear()
+            await self.ready.wait()
+
+    def is_stale(self, symbol: str, kline_start_time: int) -> bool:
+        """
+        Check that newer kline of the symbol came after this one. Stale kline is used only for period candles, so
+        trader continues from current price after stall instead of replaying old minutes.
+        """
+        return kline_start_time < self.latest_kline_time.get(symbol, 0)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+def rest_kline_to_stream_data(symbol: str, interval: str, kline: list) -> dict:
+    """
+    Make closed stream kline from REST kline, so it can be replayed to traders and saved as stream data.
+    Stream data is marked with "backfill" key.
+    :param symbol: target + bridge assets.
+    :param interval: kline interval, for example '1m'.
+    :param kline: binance kline [open time, open, high, low, close, volume, close time, quote volume, trades, ...].
+    :return: UnicornFy-like stream data.
+    """
+    return {"event_type": "kline",
+            "event_time": int(kline[6]),
+            "symbol": symbol,
+            "backfill": True,
+            "kline": {"kline_start_time": int(kline[0]),
+                      "kline_close_time": int(kline[6]),
+                      "symbol": symbol,
+                      "interval": interval,
+                      "first_trade_id": False,
+                      "last_trade_id": False,
+                      "open_price": kline[1],
+                      "close_price": kline[4],
+                      "high_price": kline[2],
+                      "low_price": kline[3],
+                      "base_volume": kline[5],
+                      "number_of_trades": int(kline[8]),
+                      "is_closed": True,
+                      "quote": kline[7],
+                      "taker_by_base_asset_volume": kline[9],
+                      "taker_by_quote_asset_volume": kline[10],
+                      "ignore": kline[11]}}
@@ -1,14 +1,17 @@
 from collections import defaultdict
 from datetime import datetime
 from decimal import Decimal
-from operator import itemgetter
-import numpy as np
+import threading
 import typing as t
-import talib
-import time
 
+from .balance_ledger import BalanceLedger
 from .binance_api_manager import BinanceAPIManager
+from .candle_aggregator import PeriodCandleAggregator
+from .candle_buffer import PeriodCandleBuffer
+from .fixed_point import FixedPointScale
+from .indicators import IndicatorRegistry, MaxPrice, MinPrice, SMA
 from .logger import Logger
+from .order_executor import OrderExecutor, backoff_delay, new_client_order_id
 from .config import Config
 from db.connections import RedisConnection
 from db.models import Report
@@ -62,18 +65,50 @@ class Trader:
     """
     Entity for management trade strategy.
     """
+    # Period candle fields for max and min period price: 1 - open, 2 - low, 3 - high, 4 - close.
+    MAX_PRICE_FIELD = 1
+    MIN_PRICE_FIELD = 1
+
     def __init__(self, api_manager: BinanceAPIManager, db: t.Optional[RedisConnection], global_strategy: GlobalStrategy,
-                 config: Config, logger: Logger):
+                 config: Config, logger: Logger, indicators: t.Optional[IndicatorRegistry] = None,
+                 order_executor: t.Optional[OrderExecutor] = None):
         self.logger = logger
         self.config = config
         self.manager = api_manager
+        # Live manager sleeps for real, backtest mocks advance virtual time.
+        self.clock = api_manager.clock
         self.db = db
         self.global_strategy = global_strategy
         self.portfolio = Portfolio()
-        self.minute_candle_price: Decimal = Decimal(0)
-        self.past_minute_candle_price: Decimal = Decimal(0)
-        self.period_candle_price: t.List[t.Tuple[int, Decimal, Decimal, Decimal]] = []
+        # Balances from order fills and user data stream. Stream has only SPOT account, so only SpotTrader uses it.
+        self.balance_ledger = BalanceLedger((global_strategy.bridge_coin, global_strategy.target_coin),
+                                            config.BALANCE_RECONCILE_INTERVAL)
+        self._minute_candle_price: t.Optional[Decimal] = Decimal(0)
+        self._past_minute_candle_price: t.Optional[Decimal] = Decimal(0)
+        # FIXED_POINT config: minute prices as int number of tickSize steps. None if price isn't on the tick grid.
+        self.fixed_point: t.Optional[FixedPointScale] = None
+        self.minute_candle_ticks: t.Optional[int] = None
+        self.past_minute_candle_ticks: t.Optional[int] = None
+        self._fixed_point_key: tuple = ()
+        self._fixed_point_thresholds: t.Optional[tuple] = None
+        self.period_candle_price = PeriodCandleBuffer(self.config.SMA_PERIOD)
+        # Period candles from closed stream klines, REST is used only if some klines were missed.
+        self.period_candle_aggregator = PeriodCandleAggregator(self.config.UNIX_TIME_INTERVAL)
+        # Traders with the same registry share indicators of the same symbol.
+        self.indicators = indicators if indicators is not None else IndicatorRegistry()
+        self.subscribe_indicators()
         self.period_candle_price_updated: bool = False
+        # Orders run on executor. Live executor has worker thread, trader doesn't make decisions until order is done.
+        self.order_executor = order_executor if order_executor is not None else OrderExecutor()
+        # Number of submitted orders, which aren't completed yet.
+        self.pending_orders: int = 0
+        # Order job changes balance in worker thread, stream processor reads it in its own thread. Both of them take
+        # this lock for that, requests to exchange are made without it.
+        self.state_lock = threading.RLock()
+        self.order_submitting: bool = False
+        self.order_response: t.Optional[dict] = None
+        # User data events, which came while order was pending. Order job changes balance in another thread.
+        self.pending_user_data: t.List[dict] = []
         self.moving_average: Decimal = Decimal(0)
         self.max_period_price = Decimal(0)
         self.min_period_price = Decimal(0)
@@ -82,6 +117,8 @@ class Trader:
         self.current_strategy: t.Union[str, None] = None
         self.strategy_generator = generate_strategy(self.config.STRATEGY_DICT)
         self.current_time: int = 0
+        # Trader doesn't make decisions until this unix time, other traders keep working.
+        self.resume_time: float = 0
         self.default_order = {"side": "-",
                               "executedQty": "-",
                               "origQty": "-",
@@ -92,6 +129,32 @@ class Trader:
     def __str__(self):
         return "Base Trader class."
 
+    @property
+    def order_pending(self) -> bool:
+        return self.pending_orders > 0
+
+    @property
+    def minute_candle_price(self) -> Decimal:
+        if self._minute_candle_price is None:
+            self._minute_candle_price = self.fixed_point.ticks_to_price(self.minute_candle_ticks)
+        return self._minute_candle_price
+
+    @minute_candle_price.setter
+    def minute_candle_price(self, price: Decimal):
+        self._minute_candle_price = price
+        self.minute_candle_ticks = None
+
+    @property
+    def past_minute_candle_price(self) -> Decimal:
+        if self._past_minute_candle_price is None:
+            self._past_minute_candle_price = self.fixed_point.ticks_to_price(self.past_minute_candle_ticks)
+        return self._past_minute_candle_price
+
+    @past_minute_candle_price.setter
+    def past_minute_candle_price(self, price: Decimal):
+        self._past_minute_candle_price = price
+        self.past_minute_candle_ticks = None
+
     def initialization(self):
         """
         Initialize default params for class. Get historical candle data.
@@ -124,10 +187,70 @@ class Trader:
 
     def update_max_and_min_period_price(self):
         """
-        Get max close price from last seven hour candle data.
+        Get max and min price of period candles.
+        """
+        self.max_period_price = self.period_max.value
+        self.min_period_price = self.period_min.value
+
+    def subscribe_indicators(self):
+        """
+        Take indicators of trader symbol from the registry. Strategy which needs more indicators can subscribe them
+        here to period_pipeline, they'll be updated with every period candle.
+        """
+        self.period_pipeline = self.indicators.pipeline(self.global_strategy.bid_symbol, self.config.TIME_INTERVAL)
+        self.period_average = self.period_pipeline.subscribe(SMA(self.config.SMA_PERIOD))
+        self.period_max = self.period_pipeline.subscribe(MaxPrice(self.config.SMA_PERIOD, self.MAX_PRICE_FIELD))
+        self.period_min = self.period_pipeline.subscribe(MinPrice(self.config.SMA_PERIOD, self.MIN_PRICE_FIELD))
+
+    def append_period_candle(self, candle: t.Tuple[int, Decimal, Decimal, Decimal, Decimal]):
+        """
+        Put new period candle to the window and indicators. The oldest one is dropped, if window is full.
+        :param candle: (start time, open, low, high, close).
+        """
+        self.period_candle_price.append(*candle)
+        self.period_pipeline.update(candle)
+
+    def update_minute_candle_price(self, price: str):
+        """
+        Move current minute price to the past one and save the new price. With fixed point price is parsed to int
+        ticks, Decimal is made only when someone asks for minute_candle_price.
+        :param price: stream_data["kline"]["open_price"]
+        """
+        first_price = self.minute_candle_ticks is None and self._minute_candle_price == 0
+        if not first_price:
+            self._past_minute_candle_price = self._minute_candle_price
+            self.past_minute_candle_ticks = self.minute_candle_ticks
+
+        ticks = self.fixed_point.price_to_ticks(price) if self.fixed_point is not None else None
+        self.minute_candle_ticks = ticks
+        self._minute_candle_price = Decimal(price) if ticks is None else None
+
+        if first_price:
+            self._past_minute_candle_price = self._minute_candle_price
+            self.past_minute_candle_ticks = ticks
+
+    def fixed_point_thresholds(self) -> t.Optional[tuple]:
+        """
+        Int tick thresholds of strategy conditions. None if some of them can't be compared in ticks.
+        """
+        return None
+
+    def fixed_point_decision(self) -> bool:
+        """
+        Check in int ticks if use_strategy can do something on this minute candle. If it's False, Decimal
+        conditions are skipped. True doesn't mean order, Decimal conditions make the final decision.
+        """
+        return True
+
+    def get_fixed_point_thresholds(self) -> t.Optional[tuple]:
+        """
+        Thresholds are recalculated only when period prices, moving average or stop loss are changed.
         """
-        self.max_period_price = max(self.period_candle_price, key=itemgetter(1))[1]
-        self.min_period_price = min(self.period_candle_price, key=itemgetter(1))[1]
+        key = (self.max_period_price, self.min_period_price, self.moving_average, self.portfolio.stop_loss)
+        if key != self._fixed_point_key:
+            self._fixed_point_key = key
+            self._fixed_point_thresholds = self.fixed_point_thresholds()
+        return self._fixed_point_thresholds
 
     def update_current_portfolio_price(self):
         """
@@ -153,22 +276,28 @@ class Trader:
         self.portfolio.working_balance = (self.portfolio.balance[self.global_strategy.bridge_coin]["free"] *
                                           self.config.WORKING_BALANCE)
 
-    def update_strategy(self):
+    def update_strategy(self, price: t.Optional[Decimal] = None):
         """
         Get new strategy symbol from generator and update target order.
+        :param price: fill price of the order, which started strategy. Current minute price if None.
         """
+        if price is None:
+            price = self.minute_candle_price
         self.current_strategy = next(self.strategy_generator)
         target_percent, amount_percent = self.target_dict(self.current_strategy)
-        target_price = self.minute_candle_price * Decimal(target_percent)
+        target_price = price * Decimal(target_percent)
         target_amount = self.portfolio.balance[self.global_strategy.target_coin]["free"] * Decimal(amount_percent)
         self.portfolio.target_order = (target_price, target_amount)
-        self.update_stop_loss()
+        self.update_stop_loss(price)
 
-    def update_stop_loss(self):
+    def update_stop_loss(self, price: t.Optional[Decimal] = None):
         """
         Update sell price for stop loosing money.
+        :param price: price, from which stop loss is counted. Current minute price if None.
         """
-        self.portfolio.stop_loss = self.minute_candle_price * self.config.SPOT_STOP_LOSS
+        if price is None:
+            price = self.minute_candle_price
+        self.portfolio.stop_loss = price * self.config.SPOT_STOP_LOSS
 
     def update_balance(self):
         """
@@ -180,14 +309,78 @@ class Trader:
         Update prices and check trading status.
         """
 
+    def apply_order(self, order: dict):
+        """
+        Change local balance by order response, so update_balance doesn't need to request account.
+        :param order: order Response dict.
+        """
+
+    def update_user_data(self, stream_data: dict):
+        """
+        Take user data stream event: balance or order update. While order is pending, event waits for its end.
+        :param stream_data: UnicornFy user data event.
+        """
+        if self.order_pending:
+            self.pending_user_data.append(stream_data)
+        else:
+            self.apply_user_data(stream_data)
+
+    def apply_user_data(self, stream_data: dict):
+        """
+        Change local state by user data stream event.
+        :param stream_data: UnicornFy user data event.
+        """
+
+    def execute_order(self, job: t.Callable[[], t.Optional[dict]],
+                      callback: t.Callable[[t.Optional[dict]], dict]) -> dict:
+        """
+        Run order job (buy or sell_all with all retries) on order executor. Callback finishes trade with job result
+        and returns response for report.
+        :return: callback response, if executor has done the job at once. Otherwise default order, report of order
+                 is made when callback is called.
+        """
+        self.pending_orders += 1
+        self.order_submitting = True
+        self.order_executor.submit(job, lambda order: self._complete_order(callback, order))
+        self.order_submitting = False
+        response, self.order_response = self.order_response, None
+        return response if response is not None else self.default_order
+
+    def _complete_order(self, callback: t.Callable[[t.Optional[dict]], dict], order: t.Optional[dict]):
+        with self.state_lock:
+            self.pending_orders -= 1
+            if not self.order_pending:
+                pending_user_data, self.pending_user_data = self.pending_user_data, []
+                for stream_data in pending_user_data:
+                    self.apply_user_data(stream_data)
+            response = callback(order)
+            if self.order_submitting:
+                self.order_response = response
+            else:
+                self.make_report(response)
+
+    def pause(self, seconds: float):
+        """
+        Skip decisions for some seconds without blocking stream processor.
+        """
+        self.resume_time = self.clock.time() + seconds
+
+    def is_paused(self) -> bool:
+        return self.clock.time() < self.resume_time
+
+    def retry_delay(self, attempt: int) -> float:
+        """
+        Exponential delay before order request retry.
+        :param attempt: retry number, from 1.
+        """
+        return backoff_delay(attempt, self.config.ORDER_RETRY_BASE_DELAY, self.config.ORDER_RETRY_MAX_DELAY)
+
     def update_moving_average(self):
         """
         Get moving average from candle data and save it in self.moving_average.
         :return:
         """
-        ma_list = talib.SMA(np.array([float(candle[1]) for candle in self.period_candle_price]),
-                            self.config.SMA_PERIOD)
-        self.moving_average = ma_list[-1]
+        self.moving_average = self.period_average.value
 
     def calculate_total_profit(self):
         """
@@ -195,19 +388,41 @@ class Trader:
         :return: Decimal difference.
         """
 
+    def add_stream_kline(self, kline: dict):
+        """
+        Put stream kline of trader symbol to the period candle aggregator.
+        :param kline: stream_data["kline"]
+        """
+        self.period_candle_aggregator.add_kline(kline)
+
+    def get_last_period_candle(self, unix_time: int) -> t.Optional[t.Tuple[int, Decimal, Decimal, Decimal, Decimal]]:
+        """
+        Get the last closed period candle. It's built from stream klines, REST request is made only if stream
+        missed some of them.
+        :param unix_time: stream_data["kline"]["kline_start_time"]
+        :return: (start time, open, low, high, close) or None, if REST request failed.
+        """
+        interval = self.period_candle_aggregator.interval
+        candle = self.period_candle_aggregator.get_candle(unix_time - unix_time % interval - interval)
+        if candle is not None:
+            return candle
+        latest_candle = self.manager.get_last_candle(self.global_strategy.bid_symbol, self.config.TIME_INTERVAL)
+        if latest_candle is None:
+            return None
+        return (latest_candle[0], Decimal(latest_candle[1]), Decimal(latest_candle[3]), Decimal(latest_candle[2]),
+                Decimal(latest_candle[4]))
+
     def check_for_hour_kline_update(self, unix_time: int):
         """
         Check that minute candlestick is 1 hour later than las hour candlestick. If it is - update last.
         :param unix_time: stream_data["kline"]["kline_start_time"]
         """
         self.period_candle_price_updated = False
-        if unix_time - (self.config.UNIX_TIME_INTERVAL * 2) >= self.period_candle_price[-1][0]:
-            self.period_candle_price.pop(0)
-            latest_candle = self.manager.get_last_candle(self.global_strategy.bid_symbol, self.config.TIME_INTERVAL)
+        if unix_time - (self.config.UNIX_TIME_INTERVAL * 2) >= self.period_candle_price.last_time:
+            latest_candle = self.get_last_period_candle(unix_time)
             if latest_candle is None:
                 return
-            self.period_candle_price.append((latest_candle[0], Decimal(latest_candle[1]),
-                                             Decimal(latest_candle[3]), Decimal(latest_candle[2])))
+            self.append_period_candle(latest_candle)
             self.update_moving_average()
             self.update_max_and_min_period_price()
             self.period_candle_price_updated = True
@@ -231,10 +446,11 @@ class Trader:
                                                       self.config.SMA_PERIOD,
                                                       self.config.TIME_INTERVAL)
 
-            self.period_candle_price = []
+            self.period_candle_price = PeriodCandleBuffer(self.config.SMA_PERIOD)
             for _ in range(self.config.SMA_PERIOD):
                 candle = next(candles)
-                self.period_candle_price.append((candle[0], Decimal(candle[1]), Decimal(candle[3]), Decimal(candle[2])))
+                self.append_period_candle((candle[0], Decimal(candle[1]), Decimal(candle[3]), Decimal(candle[2]),
+                                           Decimal(candle[4])))
             self.update_moving_average()
             self.update_max_and_min_period_price()
 
@@ -258,82 +474,133 @@ class Trader:
         """
         if quantity is None:
             quantity = self.portfolio.working_balance / self.minute_candle_price
+        client_order_id = new_client_order_id()
         order = self.manager.buy(symbol=self.global_strategy.bid_symbol,
                                  quantity=quantity,
                                  lot_size=self.lot_size,
-                                 margin=margin)
+                                 margin=margin,
+                                 client_order_id=client_order_id)
         if order is None:
             count = 0
-            while count < 10:
+            while count < self.config.ORDER_MAX_TRIES:
                 count += 1
-                self.logger.info("Order is None. Trying to rebuy coin. Attempt %s/10" % count)
-                time.sleep(1)
+                self.logger.info("Order is None. Trying to rebuy coin. Attempt %s/%s" %
+                                 (count, self.config.ORDER_MAX_TRIES))
+                self.clock.sleep(self.retry_delay(count))
                 order = self.manager.buy(symbol=self.global_strategy.bid_symbol,
                                          quantity=quantity,
                                          lot_size=self.lot_size,
-                                         margin=margin)
+                                         margin=margin,
+                                         client_order_id=client_order_id)
                 if order is not None:
                     break
             if order is None:
                 return None
+        self.apply_order(order)
         self.update_balance()
 
         if order["status"] != "FILLED" or order["executedQty"] != order["origQty"]:
-            cancel_order = None
-            while cancel_order is None:
-                time.sleep(2)
-                cancel_order = cancel_func(self.global_strategy.bid_symbol, order["orderID"])
-
+            self.cancel_order(cancel_func, order)
             return None
 
         return order
 
-    def sell_all(self, cancel_func, margin: bool = False, *args, **kwargs):
+    def cancel_order(self, cancel_func, order: dict) -> bool:
         """
-        Sell all coins, and close trade.
+        Cancel not filled order. Order, which exchange doesn't know anymore, is done too.
+        :param cancel_func: cancel_order or cancel_margin_order of api manager.
+        :param order: order Response dict.
+        :return: False, if order wasn't canceled after ORDER_MAX_TRIES tries.
+        """
+        for count in range(1, self.config.ORDER_MAX_TRIES + 1):
+            if cancel_func(self.global_strategy.bid_symbol, order["orderId"]) is not None:
+                return True
+            self.clock.sleep(self.retry_delay(count))
+        self.logger.error("Couldn't cancel %s order %s after %s tries." %
+                          (self.global_strategy.bid_symbol, order["orderId"], self.config.ORDER_MAX_TRIES))
+        return False
+
+    def sell_target(self, margin: bool, client_order_id: str) -> t.Optional[dict]:
         """
+        Sell all free target coins. Request is retried with the same client order ID, so timed out order isn't
+        placed twice.
+        :return: order Response dict or None, if all tries failed.
+        """
+        quantity = self.portfolio.balance[self.global_strategy.target_coin]["free"]
         order = self.manager.sell(symbol=self.global_strategy.bid_symbol,
-                                  quantity=self.portfolio.balance[self.global_strategy.target_coin]["free"],
+                                  quantity=quantity,
                                   lot_size=self.lot_size,
-                                  margin=margin)
+                                  margin=margin,
+                                  client_order_id=client_order_id)
+        count = 0
+        while order is None and count < self.config.ORDER_MAX_TRIES:
+            count += 1
+            self.logger.info("Order is None. Trying to resell coin. Attempt %s/%s" %
+                             (count, self.config.ORDER_MAX_TRIES))
+            self.clock.sleep(self.retry_delay(count))
+            order = self.manager.sell(symbol=self.global_strategy.bid_symbol,
+                                      quantity=quantity,
+                                      lot_size=self.lot_size,
+                                      margin=margin,
+                                      client_order_id=client_order_id)
+        return order
+
+    def sell_all(self, cancel_func, margin: bool = False, *args, **kwargs):
+        """
+        Sell all coins, and close trade. Not filled rest of order is canceled and sold again, not more than
+        ORDER_MAX_TRIES times.
+        """
+        client_order_id = new_client_order_id()
+        order = self.sell_target(margin, client_order_id)
         if order is None:
-            count = 0
-            while order is None and count < 10:
-                count += 1
-                self.logger.info("Order is None. Trying to resell coin. Attempt %s/10" % count)
-                time.sleep(1)
-                order = self.manager.sell(symbol=self.global_strategy.bid_symbol,
-                                          quantity=self.portfolio.balance[self.global_strategy.target_coin]["free"],
-                                          lot_size=self.lot_size,
-                                          margin=margin)
-            if order is None:
-                return None
+            return None
+        self.apply_order(order)
 
-        if order["status"] != "FILLED":
-            cancel_order = None
-            while cancel_order is None:
-                cancel_order = self.manager.cancel_order(self.global_strategy.bid_symbol, order["orderID"])
-            while order["status"] != "FILLED":
-                self.update_balance()
-                order = self.manager.sell(symbol=self.global_strategy.bid_symbol,
-                                          quantity=self.portfolio.balance[self.global_strategy.target_coin]["free"],
-                                          lot_size=self.lot_size,
-                                          margin=margin)
-
-        if float(order["executedQty"]) != float(order["origQty"]):
+        count = 0
+        while order["status"] != "FILLED" or float(order["executedQty"]) != float(order["origQty"]):
+            if count == self.config.ORDER_MAX_TRIES:
+                self.logger.error("%s sell order isn't filled after %s tries." %
+                                  (self.global_strategy.bid_symbol, self.config.ORDER_MAX_TRIES))
+                return None
+            count += 1
+            if order["status"] != "FILLED" and not self.cancel_order(cancel_func, order):
+                return None
             self.update_balance()
-            try:
-                self.sell_all(cancel_func)
-            except RecursionError:
-                self.logger.info("Too many recursion. I'm out.")
+            if self.portfolio.balance[self.global_strategy.target_coin]["free"] < self.lot_size:
+                return order
+            # Sell of the rest is a new order, its retries have their own ID.
+            order = self.sell_target(margin, f"{client_order_id}-{count}")
+            if order is None:
                 return None
+            self.apply_order(order)
 
         return order
 
     def close_trades(self):
         """
-        Sell all target coins if they are.
+        Close open position. Close order goes to order executor after pending order, so position isn't closed twice.
+        """
+        if self.order_pending or self.has_position():
+            self.execute_order(self.close_position, self.complete_close)
+
+    def has_position(self) -> bool:
+        """
+        Check that trader has open position to close.
+        """
+        return False
+
+    def close_position(self) -> t.Optional[dict]:
+        """
+        Order job of close_trades.
+        :return: order Response dict or None, if there was nothing to close or order failed.
+        """
+
+    def complete_close(self, order: t.Optional[dict]) -> dict:
+        """
+        :param order: close order response or None.
+        :return: response for report.
         """
+        return order if order is not None else self.default_order
 
     def make_report(self, order: dict, initial: bool = False):
         """
@@ -0,0 +1,117 @@
+import typing as t
+
+from .config import Config
+from .order_executor import ThreadOrderExecutor
+from .trader import GlobalStrategy, Trader
+
+
+def get_trade_pairs(config: Config) -> t.List[t.Tuple[str, GlobalStrategy]]:
+    """
+    Take market places and coins of traders from config TRADE_PAIRS: "SPOT:FTM/USDT,MARGIN:OMG/USDT". Bridge coin
+    may be skipped ("SPOT:FTM"), then it's taken from the bridge symbol config of the market place. If TRADE_PAIRS
+    is empty, pairs are made from MARKET_PLACE and target/bridge symbol configs, as before.
+    :param config: Config instance.
+    :return: list of tuple(market place, GlobalStrategy).
+    """
+    bridge_symbols = {"SPOT": config.BRIDGE_SPOT_SYMBOL, "MARGIN": config.BRIDGE_MARGIN_SYMBOL}
+    if not config.TRADE_PAIRS:
+        pairs = []
+        if config.MARKET_PLACE in ("SPOT", "SPOT-MARGIN"):
+            pairs.append(("SPOT", GlobalStrategy(config.BRIDGE_SPOT_SYMBOL, config.TARGET_SPOT_SYMBOL)))
+        if config.MARKET_PLACE in ("MARGIN", "SPOT-MARGIN"):
+            pairs.append(("MARGIN", GlobalStrategy(config.BRIDGE_MARGIN_SYMBOL, config.TARGET_MARGIN_SYMBOL)))
+        return pairs
+
+    pairs = []
+    for pair in config.TRADE_PAIRS.split(","):
+        pair = pair.strip()
+        if not pair:
+            continue
+        market_place, _, coins = pair.partition(":")
+        market_place = market_place.strip().upper()
+        if market_place not in bridge_symbols or not coins:
+            raise ValueError(f"Wrong trade pair {pair!r}. Expected MARKET:TARGET/BRIDGE, for example SPOT:FTM/USDT.")
+        target_coin, _, bridge_coin = coins.partition("/")
+        pairs.append((market_place, GlobalStrategy(bridge_coin=bridge_coin.strip() or bridge_symbols[market_place],
+                                                   target_coin=target_coin.strip())))
+    return pairs
+
+
+class TraderRegistry:
+    """
+    All traders of the stream processor by symbol. Stream message is given to traders of its symbol with one dict
+    lookup, so message cost doesn't grow with the number of pairs.
+    """
+    def __init__(self):
+        self.traders: t.List[Trader] = []
+        # {symbol: traders of the symbol}. Tuples are built on add, so routing doesn't allocate.
+        self.by_symbol: t.Dict[str, t.Tuple[Trader, ...]] = {}
+        self.by_market: t.Dict[t.Tuple[str, str], Trader] = {}
+        # Start time of the last minute kline, which was given to traders of the symbol.
+        self.kline_last_time: t.Dict[str, int] = {}
+        # One executor per finished order queue. Executors with shared queue are dispatched once.
+        self.order_dispatchers: list = []
+
+    def add(self, trader: Trader):
+        """
+        :param trader: trader with global strategy. There can be only one trader of a market place per symbol.
+        """
+        symbol = trader.global_strategy.bid_symbol
+        key = (str(trader), symbol)
+        if key in self.by_market:
+            raise ValueError(f"{key[0]} trader of {symbol} is already registered.")
+        self.by_market[key] = trader
+        self.by_symbol[symbol] = self.by_symbol.get(symbol, ()) + (trader,)
+        self.traders.append(trader)
+
+        finished = getattr(trader.order_executor, "finished", None)
+        if finished is not None and all(executor.finished is not finished for executor in self.order_dispatchers):
+            self.order_dispatchers.append(trader.order_executor)
+
+    def get(self, symbol: str) -> t.Tuple[Trader, ...]:
+        """
+        :return: traders of the symbol, empty tuple if there are none.
+        """
+        return self.by_symbol.get(symbol, ())
+
+    def get_trader(self, market_place: str, symbol: str) -> t.Optional[Trader]:
+        """
+        :return: trader of the market place for the symbol or None.
+        """
+        return self.by_market.get((market_place, symbol))
+
+    def symbols(self) -> t.List[str]:
+        """
+        :return: symbols of all traders for stream subscription.
+        """
+        return list(self.by_symbol)
+
+    def is_new_kline(self, symbol: str, kline_start_time: int) -> bool:
+        """
+        Check that it's the first stream message of a new minute for the symbol and remember its time.
+        """
+        if kline_start_time <= self.kline_last_time.get(symbol, 0):
+            return False
+        self.kline_last_time[symbol] = kline_start_time
+        return True
+
+    def set_order_notify(self, notify: t.Callable[[], None]):
+        """
+        :param notify: function, which thread order executors call when an order job is done.
+        """
+        for trader in self.traders:
+            if isinstance(trader.order_executor, ThreadOrderExecutor):
+                trader.order_executor.notify = notify
+
+    def dispatch_orders(self):
+        """
+        Finish trades of traders, which orders were done by order executors.
+        """
+        for executor in self.order_dispatchers:
+            executor.dispatch()
+
+    def __iter__(self) -> t.Iterator[Trader]:
+        return iter(self.traders)
+
+    def __len__(self) -> int:
+        return len(self.traders)
@@ -0,0 +1,246 @@
+from bisect import bisect_left
+from decimal import Decimal
+import numpy as np
+import typing as t
+
+from .backtest_report import BacktestResult, BacktestTrade, max_drawdown
+from .config import Config
+from .rolling_window import RollingMean
+from .strategy_rules import SPOT_RULES, SeriesArrays, StrategyRules, _exact
+
+# Float keeps integers exactly up to 2 ** 53.
+MAX_FLOAT_INTEGER = 2 ** 53
+
+
+def decimal_places(prices: np.ndarray, window: int, max_places: int = 12) -> t.Optional[int]:
+    """
+    Find number of decimal places of prices, which were parsed from decimal strings.
+    :param prices: float prices.
+    :param window: number of prices in one sum, it must fit float integers too.
+    :param max_places: places to try.
+    :return: places or None, if prices have more places or their sums don't fit float integers.
+    """
+    if not len(prices):
+        return None
+    # All scales are checked at once, there is one price per period candle.
+    scales = 10.0 ** np.arange(max_places + 1)
+    exact = (np.round(prices[:, None] * scales) / scales == prices[:, None]).all(axis=0)
+    if not exact.any():
+        return None
+    places = int(exact.argmax())
+    if float(np.abs(prices).max()) * scales[places] * window >= MAX_FLOAT_INTEGER:
+        return None
+    return places
+
+
+class VectorizedSpotBacktest:
+    """
+    Bulk implementation of the SpotTrader rule set over whole candle series. Indicators and entry/exit conditions are
+    calculated with numpy for all candles at once, balances are calculated with Decimal only for trade candles, so the
+    result is the same as MockAPIManager + SpotTrader give trade-for-trade.
+    Conditions are taken from StrategyRules, so any long position rules with these indicators can be backtested.
+    Entry and exit signals are computed once for all candles, stop condition depends on the stop loss of a trade, so
+    it's checked only from the buy to the next exit signal. Decimal is used only for balances on trade candles.
+    """
+    def __init__(self, config: Config, lot_size: Decimal, min_notional: Decimal, use_high_low: bool = False,
+                 bridge_balance: Decimal = Decimal(50), rules: StrategyRules = SPOT_RULES):
+        self.config = config
+        self.rules = rules
+        self.lot_size = lot_size
+        self.min_notional = min_notional
+        # NewMinMaxMarginTrader takes period max and min from high and low prices instead of open prices.
+        self.use_high_low = use_high_low
+        self.start_bridge_balance = bridge_balance
+
+    def period_indicators(self, period_candles: np.ndarray) -> t.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Calculate moving average, max and min price for every window of SMA_PERIOD period candles.
+        Window k is period_candles[k: k + SMA_PERIOD], the same as Trader.period_candle_price after k updates.
+        :param period_candles: candle_cache array of period candles.
+        :return: tuple(moving average, max price, min price) arrays with one value per window.
+        """
+        sma_period = self.config.SMA_PERIOD
+        opens = np.lib.stride_tricks.sliding_window_view(period_candles["open"], sma_period)
+        moving_average = self.moving_average(period_candles["open"])
+        if self.use_high_low:
+            max_price = np.lib.stride_tricks.sliding_window_view(period_candles["high"], sma_period).max(axis=1)
+            min_price = np.lib.stride_tricks.sliding_window_view(period_candles["low"], sma_period).min(axis=1)
+        else:
+            max_price = opens.max(axis=1)
+            min_price = opens.min(axis=1)
+        return moving_average, max_price, min_price
+
+    def moving_average(self, prices: np.ndarray) -> np.ndarray:
+        """
+        Exact moving average of SMA_PERIOD prices rounded to float, one value per window. Rounding keeps order, so
+        float comparison is exact except for equal values.
+        Prices are decimal strings with a few decimal places, so they are summed as exact integers and every window
+        sum is divided once. If prices don't fit float integers, the same Decimal rolling mean as Trader has is used.
+        """
+        sma_period = self.config.SMA_PERIOD
+        places = decimal_places(prices, sma_period)
+        if places is not None:
+            sums = np.cumsum(np.round(prices * 10 ** places).astype(np.int64))
+            window_sums = sums[sma_period - 1:] - np.concatenate(([0], sums[:-sma_period]))
+            return window_sums / (sma_period * 10 ** places)
+
+        period_average = RollingMean(sma_period)
+        moving_average = np.empty(max(len(prices) - sma_period + 1, 0))
+        for index, price in enumerate(prices.tolist()):
+            period_average.append(_exact(price))
+            if index >= sma_period - 1:
+                moving_average[index - sma_period + 1] = float(period_average.value)
+        return moving_average
+
+    def period_schedule(self, minute_time: np.ndarray, period_time: np.ndarray) -> t.Tuple[np.ndarray, int]:
+        """
+        Find the period window index for every minute candle. Repeats Trader.check_for_hour_kline_update rules:
+        window moves when minute is two intervals later than last period candle, and backtest loop checks it
+        twice per minute, so window can move at most two times per minute.
+        :param minute_time: minute candle start times.
+        :param period_time: period candle start times.
+        :return: tuple(window index per minute, number of minutes before period candles are over).
+        """
+        sma_period = self.config.SMA_PERIOD
+        interval = int(self.config.UNIX_TIME_INTERVAL) * 2
+        last_window = len(period_time) - sma_period
+        # Number of windows, which last candle is old enough for each minute. There are much less windows than
+        # minutes, so windows are placed among minutes and counted with cumsum.
+        ready_index = np.searchsorted(minute_time, period_time[sma_period - 1:] + interval, side="left")
+        ready = np.cumsum(np.bincount(ready_index, minlength=len(minute_time) + 1))[:len(minute_time)]
+        # window[i] = min(ready[i], window[i - 1] + 2), window[-1] = 0. Unrolled, it's the least of
+        # ready[j] + 2 * (i - j) for all j <= i and 2 * (i + 1), so it's one running minimum.
+        steps = 2 * np.arange(len(minute_time))
+        windows = steps + np.minimum(np.minimum.accumulate(ready - steps), 2)
+        candles = int(np.searchsorted(windows, last_window, side="right"))
+        return windows[:candles], candles
+
+    def exact_moving_average(self, period_candles: np.ndarray, window: int) -> Decimal:
+        """
+        Decimal moving average of window, the same value as Trader.moving_average.
+        """
+        period_average = RollingMean(self.config.SMA_PERIOD)
+        for price in period_candles["open"][window: window + self.config.SMA_PERIOD].tolist():
+            period_average.append(_exact(price))
+        return period_average.value
+
+    def series(self, price: np.ndarray, moving_average: np.ndarray, max_price: np.ndarray, min_price: np.ndarray,
+               exact_average: t.Callable[[int], Decimal]) -> SeriesArrays:
+        """
+        Indicator series of minute candles for rule conditions.
+        :param exact_average: Decimal moving average for minute candle index. Used only when float values are equal.
+        """
+        past_price = np.empty_like(price)
+        past_price[:1] = price[:1]
+        past_price[1:] = price[:-1]
+        return SeriesArrays({"price": price, "past_price": past_price, "moving_average": moving_average,
+                             "max_price": max_price, "min_price": min_price},
+                            exact={"moving_average": exact_average})
+
+    def _first_close(self, series: SeriesArrays, exits: t.List[int], stop_loss: Decimal, start: int) -> int:
+        """
+        Find the first candle from start, where exit or stop condition is true.
+        :param exits: sorted candle indexes of exit signal. Exit condition mustn't depend on the stop loss.
+        :param stop_loss: stop loss price of the position.
+        :return: candle index or -1, if position isn't closed before the end of data.
+        """
+        position = bisect_left(exits, start)
+        next_exit = exits[position] if position < len(exits) else len(series)
+        if next_exit > start:
+            stop_signal = self.rules.stop.evaluate_array(series.slice(start, next_exit, stop_loss=stop_loss))
+            stop_index = stop_signal.argmax()
+            if stop_signal[stop_index]:
+                return start + int(stop_index)
+        return next_exit if next_exit < len(series) else -1
+
+    def run(self, minute_candles: np.ndarray, period_candles: np.ndarray) -> BacktestResult:
+        """
+        Run backtest on whole minute and period candle series.
+        :param minute_candles: candle_cache array of minute candles from the beginning of the history.
+        :param period_candles: candle_cache array of period candles from the beginning of the history.
+        :return: BacktestResult.
+        """
+        sma_period = self.config.SMA_PERIOD
+        # MockAPIManager skips minutes which are covered by the initial period candle list.
+        minute_candles = minute_candles[sma_period * 60:]
+        windows, candles = self.period_schedule(minute_candles["time"], period_candles["time"])
+        stop_reason = "END_OF_DATA" if candles == len(minute_candles) else "END_OF_PERIOD_DATA"
+        minute_candles = minute_candles[:candles]
+        price = minute_candles["open"]
+        minute_time = minute_candles["time"]
+
+        moving_average, max_price, min_price = self.period_indicators(period_candles)
+        series = self.series(price, moving_average[windows], max_price[windows], min_price[windows],
+                             lambda index: self.exact_moving_average(period_candles, int(windows[index])))
+        # Sorted candle indexes of signals, the next signal after a candle is found by bisect.
+        entries = np.flatnonzero(self.rules.entry.evaluate_array(series)).tolist()
+        exits = np.flatnonzero(self.rules.exit.evaluate_array(series)).tolist()
+
+        bridge_balance = self.start_bridge_balance
+        target_balance = Decimal(0)
+        total_profit = Decimal(0)
+        working_balance = bridge_balance * self.config.WORKING_BALANCE
+        trades = []
+        # Portfolio price is bridge balance + target balance * price, balances change only on trade candles.
+        change_index = [0]
+        bridge_values = [float(bridge_balance)]
+        target_values = [0.0]
+        index = 0
+        while index < candles:
+            if bridge_balance <= self.config.MIN_PORTFOLIO_PRICE:
+                stop_reason = "MIN_PORTFOLIO_PRICE"
+                break
+            position = bisect_left(entries, index)
+            if position == len(entries):
+                break
+            buy_index = entries[position]
+            if working_balance < self.min_notional:
+                stop_reason = "MIN_NOTIONAL"
+                break
+
+            buy_price = _exact(price.item(buy_index))
+            quantity = working_balance / buy_price
+            quantity -= quantity % self.lot_size
+            last_price = buy_price * quantity
+            bridge_balance -= last_price
+            target_balance += quantity
+            trades.append(BacktestTrade(buy_index, int(minute_time[buy_index]), "BUY", buy_price, quantity))
+            change_index.append(buy_index)
+            bridge_values.append(float(bridge_balance))
+            target_values.append(float(target_balance))
+
+            if target_balance < self.lot_size:
+                # Trader reboots strategy on the next candle without a trade.
+                working_balance = bridge_balance * self.config.WORKING_BALANCE
+                index = buy_index + 2
+                continue
+            if target_balance == self.lot_size:
+                stop_reason = "POSITION_EQUAL_TO_LOT_SIZE"
+                break
+
+            sell_index = self._first_close(series, exits, buy_price * self.config.SPOT_STOP_LOSS, buy_index + 1)
+            if sell_index == -1:
+                break
+            sell_price = _exact(price.item(sell_index))
+            bridge_balance += sell_price * target_balance
+            trades.append(BacktestTrade(sell_index, int(minute_time[sell_index]), "SELL", sell_price,
+                                        target_balance))
+            target_balance -= target_balance
+            change_index.append(sell_index)
+            bridge_values.append(float(bridge_balance))
+            target_values.append(float(target_balance))
+            total_profit = bridge_balance - self.start_bridge_balance
+            working_balance = bridge_balance * self.config.WORKING_BALANCE
+            index = sell_index + 1
+
+        counts = np.diff(change_index + [candles])
+        portfolio_prices = np.repeat(bridge_values, counts) + np.repeat(target_values, counts) * price
+        last_price = _exact(price.item(-1)) if candles else Decimal(0)
+        return BacktestResult(bridge_balance=bridge_balance,
+                              target_balance=target_balance,
+                              portfolio_price=bridge_balance + target_balance * last_price,
+                              total_profit=total_profit,
+                              candles=candles,
+                              trades=trades,
+                              stop_reason=stop_reason,
+                              max_drawdown=max_drawdown(portfolio_prices))
@@ -64,6 +64,14 @@ class KeySchema:
         """
         return 'tasks:key:list'
 
+    @prefixed_key
+    def tasks_channel(self) -> str:
+        """
+        tasks:channel
+        Redis type pub/sub channel
+        """
+        return 'tasks:channel'
+
     @prefixed_key
     def task_hash(self, task_id) -> str:
         """
@@ -73,6 +81,15 @@ class KeySchema:
         """
         return f'tasks:hash:{task_id}'
 
+    @prefixed_key
+    def latency_hash(self, name: str) -> str:
+        """
+        latency:{name}:hash
+        name: process of stream processor
+        Redis type hash
+        """
+        return f'latency:{name}:hash'
+
     @prefixed_key
     def report_key(self, symbol_key: str) -> str:
         """
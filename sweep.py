@@ -0,0 +1,34 @@
+import time
+
+from binance_trade_bot.config import Config
+from binance_trade_bot.backtest_runner import get_backtest_strategy
+from binance_trade_bot.parameter_sweep import run_sweep
+
+
+SWEEP_GRID = {
+    "SMA_PERIOD": [5, 7, 10, 14, 20],
+    "WORKING_BALANCE": [0.2, 0.5],
+}
+# Trader reads only stop loss of its market place, so only that one is swept.
+STOP_LOSS_GRID = {
+    "SPOT": {"SPOT_STOP_LOSS": [0.98, 0.99, 0.995]},
+    "MARGIN": {"MARGIN_STOP_LOSS": [1.005, 1.01, 1.02]},
+}
+
+
+def sweep():
+    start = time.time()
+    config = Config()
+    if config.MARKET_PLACE not in STOP_LOSS_GRID:
+        raise ValueError(f"Sweep backtests one market place, MARKET_PLACE must be one of "
+                         f"{', '.join(STOP_LOSS_GRID)}, not {config.MARKET_PLACE}.")
+    global_strategy = get_backtest_strategy(config)
+    table = run_sweep({**SWEEP_GRID, **STOP_LOSS_GRID[config.MARKET_PLACE]})
+    table.to_csv(config.BACKTEST_SWEEP_REPORT_PATH.format(target_symbol=global_strategy.target_coin,
+                                                          bridge_symbol=global_strategy.bridge_coin))
+    print(table.head(20).to_string())
+    print("Sweep time: %s сек." % (time.time() - start))
+
+
+if __name__ == "__main__":
+    sweep()